@@ -5,7 +5,7 @@ import logging
 import time
 from random import choice, randint
 from threading import Thread
-from queue import Empty, Queue
+from typing import Callable, Optional
 
 import cozmo
 from cozmo import event
@@ -13,7 +13,7 @@ from cozmo.util import degrees
 
 from .game_cubes import BlinkyCube
 from .cozmo_world import Robot, EvtRobotMovedBish
-from ..common import Feel
+from ..common import Feel, ReactionScheduler
 
 
 cozmo.world.World.light_cube_factory = BlinkyCube
@@ -27,7 +27,9 @@ class CozmoPlayerActions(Thread):
     def __init__(self) -> None:
         """Initialize CozmoPlayerActions."""
         super().__init__()
-        self._queue = Queue()
+        self._reactions = ReactionScheduler()
+        self._running_animation = None
+        self._idle = False
 
     def start(self, game_robot: Robot):
         """Start thread.
@@ -38,7 +40,6 @@ class CozmoPlayerActions(Thread):
         self._robot = game_robot
         self._face = None
         self._last_head_position = cozmo.robot.MAX_HEAD_ANGLE
-        self._running_animation = None
         self._running = True
         self._logger = logging.getLogger(name=__name__)
         super().start()
@@ -60,12 +61,17 @@ class CozmoPlayerActions(Thread):
                 except asyncio.TimeoutError:
                     self._logger.warning("Didn't find any face.")
 
-            try:
-                f = self._queue.get(timeout=self.QUEUE_TIMEOUT)
-            except Empty:
+            reaction = self._reactions.next(timeout=self.QUEUE_TIMEOUT)
+            if reaction is None:
+                self._idle = True
                 self._do_listen()
+                self._idle = False
                 continue
 
+            f, on_start = reaction
+            if on_start is not None:
+                on_start()
+
             if f == Feel.HAPPY:
                 self._be_happy()
             elif f == Feel.SAD:
@@ -81,11 +87,20 @@ class CozmoPlayerActions(Thread):
             elif f == Feel.END:
                 self.do_fist_bump()
 
-    def do_feel(self, feel: Feel):
-        """Execute feeling animation."""
-        self._queue.put(feel)
-        if self._running_animation is not None:
-            self._running_animation.abort()
+    def do_feel(self, feel: Feel, on_start: Optional[Callable[[], None]] = None) -> bool:
+        """Execute feeling animation, interrupting the idle animations.
+
+        :param feel: Feeling to express.
+        :param on_start: Function called when the animation starts.
+        :return: True if the animation will be played, False if it was dropped.
+        """
+        if not self._reactions.submit(feel, (feel, on_start)):
+            return False
+        if self._idle:
+            animation = self._running_animation
+            if animation is not None:
+                animation.abort()
+        return True
 
     def _be_sad(self):
         """Execute sad emotion."""
@@ -137,7 +152,9 @@ class CozmoPlayerActions(Thread):
         self.play_anim(choice(["anim_speedtap_wingame_intensity03_01", "anim_codelab_chicken_01"]))
 
     def _do_listen(self):
-        """Do little look down/up nods."""
+        """Do little look down/up nods, unless a reaction is waiting."""
+        if self._reactions.pending:
+            return
         play_wait = randint(0, 3)
         if play_wait == 0:
             self._logger.debug("Looking away")
@@ -161,7 +178,7 @@ class CozmoPlayerActions(Thread):
                 self._robot.turn_towards_face(self._face).wait_for_completed()
                 self._last_head_position = self._robot.head_angle
 
-            time.sleep(0.5)
+            self._reactions.wait(0.5)
 
     def play_anim(self, anim: str):
         """Execute given animation.
@@ -3,12 +3,13 @@
 """
 
 import copy
+import functools
 import logging
 import time
 from typing import Optional
 from cozmo.util import degrees
 
-from ..common import Feel, FeelingReaction, MQTTManager
+from ..common import Feel, FeelingReaction, LocalBus, MQTTManager
 from .constants import END_CUBE
 from .cozmo_listener import CozmoPlayerActions
 from .cozmo_world import Robot
@@ -17,19 +18,37 @@ from .cozmo_world import Robot
 class ReadEngine:
     """Manager for reading with robot interaction."""
 
-    def __init__(self, game_robot: Robot, mqtt_ip: Optional[str] = None, timeout: int = 20):
-        """Initialize engine."""
+    def __init__(
+        self,
+        game_robot: Robot,
+        mqtt_ip: Optional[str] = None,
+        timeout: int = 20,
+        latency_file: Optional[str] = None,
+        transport: Optional[LocalBus] = None,
+        max_capture_age: Optional[float] = None,
+    ):
+        """Initialize engine.
+
+        :param game_robot: Cozmo robot.
+        :param mqtt_ip: IP address of the MQTT server.
+        :param timeout: MQTT client connection timeout.
+        :param latency_file: File the reaction latency histograms are written to.
+        :param transport: Bus replacing the MQTT server, when the speech service runs in this process.
+        :param max_capture_age: Maximum time between the capture of the audio of a command and its reaction.
+        """
         self._robot = game_robot
         self._robot_proxy = CozmoPlayerActions()
         self._robot_cubes = []
         self._my_position = None
         self._feel = Feel.NEUTRAL
         self._logger = logging.getLogger(name=__name__)
-        self._feel_control = FeelingReaction(self)
+        self._feel_control = FeelingReaction(
+            self, latency_file, max_capture_age=max_capture_age, queued_animations=True
+        )
 
         # Connection to command server
         self._mqtt_client = MQTTManager(
-            "cozmo", self._robot_proxy.stop, self._feel_control.process_text, timeout, mqtt_ip
+            "cozmo", self._robot_proxy.stop, self._feel_control.process_text, timeout, mqtt_ip, transport=transport
         )
 
     def end_session(self):
@@ -44,7 +63,7 @@ class ReadEngine:
 
     def cozmo_setup_game(self):
         """Set up experiment."""
-        # Wait for mqtt connection
+        # Connect to the mqtt server in the background
         self._mqtt_client.start()
 
         self._my_position = self._robot.world.create_custom_fixed_object(
@@ -54,9 +73,13 @@ class ReadEngine:
         self._robot.move_lift(-3)
         time.sleep(0.5)
 
-    def do_feel(self, feel: Feel):
-        """Execute feeling animation."""
-        self._robot_proxy.do_feel(feel)
+    def do_feel(self, feel: Feel) -> bool:
+        """Execute feeling animation.
+
+        :param feel: Feeling to express.
+        :return: True if the animation will be played, False if it was dropped.
+        """
+        return self._robot_proxy.do_feel(feel, functools.partial(self._feel_control.animation_started, feel))
 
     def listen_to_story(self):
         """Run experiment."""
@@ -7,6 +7,8 @@ from random import choice
 
 from miro2.core import node
 
+from ..common import ReactionScheduler
+
 
 class Trajectory:
     """Defines the trajectory of a single joint."""
@@ -367,20 +369,29 @@ class NodeAnimationPlayer(node.Node):
         :type app: RobotManager
         """
         super(NodeAnimationPlayer, self).__init__(app, "AnimationPlayer")
-        self._playing_animations = []
+        self._reactions = ReactionScheduler()
         self._current_animation = None
         # Kinematics target joint positions (config in the MDK)
         self._config = [0.0] * 4
         self._cmd_vel = [0.0] * 2  # normally, for miro we'll only need +/-x (fwd/bwd) and +/- z (rotation)
         self._emotion = self.output.animal_state.emotion
 
-    def play_animation(self, anim):
-        """Execute the required animation.
+    def play_animation(self, anim, feeling=None, created_at=None, on_start=None):
+        """Execute the required animation, once the current one finishes.
 
         :param anim: The specified animation.
-        :type anim: str
+        :type anim: Animation
+        :param feeling: The feeling expressed by the animation, for its cooldown and priority (see
+            `ReactionScheduler`). By default, the animation itself.
+        :type feeling: Optional[Feel]
+        :param created_at: Time at which the animation was triggered, from which its age is counted (now if None).
+        :type created_at: Optional[float]
+        :param on_start: Function called when the animation starts.
+        :type on_start: Optional[Callable[[], None]]
+        :return: True if the animation has been queued.
+        :rtype: bool
         """
-        self._playing_animations.append(anim)
+        return self._reactions.submit(anim if feeling is None else feeling, (anim, on_start), created_at=created_at)
 
     def get_config(self):
         """Return the current robot kinematic joints.
@@ -401,14 +412,17 @@ class NodeAnimationPlayer(node.Node):
     def tick(self):
         """Calculate next step in the animation."""
         if not self._current_animation:
-            if self._playing_animations:
-                self._current_animation = self._playing_animations.pop(0)
+            reaction = self._reactions.next()
+            if reaction is not None:
+                self._current_animation, on_start = reaction
                 self._config = self.kc_m.getConfig()
                 self._current_animation.initialize(
                     cosmetic=self.output.cosmetic_joints.tolist(),
                     kinematic=self._config,
                     emotion=(self._emotion.valence, self._emotion.arousal),
                 )
+                if on_start is not None:
+                    on_start()
         else:
             cmds = self._current_animation.get_commands(self._config, self.output.cosmetic_joints)
             if cmds:
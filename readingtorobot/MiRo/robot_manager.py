@@ -1,5 +1,6 @@
 """MiRo Robot behaviour manager."""
 import copy
+import functools
 import logging
 import os
 import time
@@ -30,7 +31,17 @@ class RobotManager(Thread):
     Highly inspired by the MiRo SDK's robot demo.
     """
 
-    def __init__(self, animation_dir=None, mqtt_ip=None, timeout=20):
+    # Name of the animations of each feeling.
+    ANIMATION_KEYS = {
+        Feel.HAPPY: "happy",
+        Feel.SAD: "sad",
+        Feel.ANNOYED: "annoyed",
+        Feel.EXCITED: "excited",
+        Feel.START: "start",
+        Feel.END: "end",
+    }
+
+    def __init__(self, animation_dir=None, mqtt_ip=None, timeout=20, latency_file=None, max_capture_age=None):
         """Initialize RobotManager.
 
         :param animation_dir: Directory containing the available robot animations.
@@ -39,6 +50,10 @@ class RobotManager(Thread):
         :type mqtt_ip: Optional[str]
         :param timeout: Connection timeout for mqtt client.
         :type timeout: Optional[int]
+        :param latency_file: File the reaction latency histograms are written to.
+        :type latency_file: Optional[str]
+        :param max_capture_age: Maximum time between the capture of the audio of a command and its reaction.
+        :type max_capture_age: Optional[float]
         """
         super().__init__()
         # logger
@@ -57,7 +72,7 @@ class RobotManager(Thread):
         self._bridge = CvBridge()
 
         # emotion expression management
-        self._emotion = FeelingReaction(self)
+        self._emotion = FeelingReaction(self, latency_file, max_capture_age=max_capture_age, queued_animations=True)
 
         # Connection to command server
         self._mqtt_client = MQTTManager("miro", self.stop, self._emotion.process_text, timeout, mqtt_ip)
@@ -210,28 +225,21 @@ class RobotManager(Thread):
 
         :param feeling: Feeling to execute.
         :type feeling: Feel
+        :return: True if the animation will be played, False if it was dropped or there is none for the feeling.
+        :rtype: bool
         """
         self.state.user_touch = 2.0
-        if feeling == Feel.HAPPY:
-            # self.state.emotion.valence = 1.0
-            # self.state.emotion.arousal = 1.0
-            self.nodes.animation.play_animation(self._animations[choose_animation(self._animations.keys(), "happy")])
-            self._logger.debug("Feeling happy")
-        elif feeling == Feel.SAD:
-            self.nodes.animation.play_animation(self._animations[choose_animation(self._animations.keys(), "sad")])
-            self._logger.debug("Feeling sad")
-        elif feeling == Feel.ANNOYED:
-            self.nodes.animation.play_animation(self._animations[choose_animation(self._animations.keys(), "annoyed")])
-            self._logger.debug("Feeling annoyed")
-        elif feeling == Feel.EXCITED:
-            self.nodes.animation.play_animation(self._animations[choose_animation(self._animations.keys(), "excited")])
-            self._logger.debug("Feeling excited")
-        elif feeling == Feel.START:
-            self.nodes.animation.play_animation(self._animations[choose_animation(self._animations.keys(), "start")])
-            self._logger.debug("Starting interaction")
-        elif feeling == Feel.END:
-            self.nodes.animation.play_animation(self._animations[choose_animation(self._animations.keys(), "end")])
-            self._logger.debug("Finishing interaction")
+        key = self.ANIMATION_KEYS.get(feeling)
+        if key is None:
+            return False
+        # self.state.emotion.valence = 1.0
+        # self.state.emotion.arousal = 1.0
+        animation = self._animations[choose_animation(self._animations.keys(), key)]
+        on_start = functools.partial(self._emotion.animation_started, feeling)
+        if not self.nodes.animation.play_animation(animation, feeling, on_start=on_start):
+            return False
+        self._logger.debug("Feeling {}".format(key))
+        return True
 
     def _callback_config_command(self, msg):
         """Update State of the robot configuration."""
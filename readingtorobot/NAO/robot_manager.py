@@ -5,7 +5,7 @@ import random
 import time
 import threading
 
-from ..common import Feel, FeelingReaction, MQTTManager
+from ..common import Feel, FeelingReaction, MQTTManager, ReactionScheduler
 from .nao_base import NAOBase
 from .nao_expression import (
     get_scared_movement,
@@ -24,7 +24,7 @@ from .nao_expression import (
 class RobotManager(NAOBase):
     """Class managing the movement of NAO, adding expressions when listening."""
 
-    def __init__(self, app, mqtt_ip=None, timeout=20):
+    def __init__(self, app, mqtt_ip=None, timeout=20, latency_file=None, max_capture_age=None):
         """Initialise qi framework and event detection."""
         super(RobotManager, self).__init__(app)
 
@@ -33,10 +33,13 @@ class RobotManager(NAOBase):
         # Autonomous habilities
         self.autonomousblinking.setEnabled(True)
         self._background_thread = threading.Thread(target=self._do_background)
+        # Joints moved by the current background movement
+        self._background_names = None
 
         # Expressions
         self._feel_lock = threading.Lock()
-        self._feel_control = FeelingReaction(self)
+        self._reactions = ReactionScheduler()
+        self._feel_control = FeelingReaction(self, latency_file, max_capture_age=max_capture_age)
 
         # Tracking
         self.tracker.registerTarget("Face", 0.3)
@@ -71,8 +74,26 @@ class RobotManager(NAOBase):
         self._background_thread.join()
 
     def do_feel(self, feeling=Feel.NEUTRAL):
-        """Call robot movement based on current feeling."""
+        """Call robot movement based on current feeling, interrupting the background movements.
+
+        :param feeling: Feeling to express.
+        :type feeling: Feel
+        :return: True if the movement was played.
+        :rtype: bool
+        """
+        if not self._reactions.submit(feeling):
+            return False
+        names = self._background_names
+        if names:
+            self.movement.killTasksUsingResources(names)
+
         with self._feel_lock:
+            # The reaction is dropped if it waited too long, or was replaced by a more important one.
+            feeling = self._reactions.next()
+            if feeling is None:
+                return False
+            # Movements block until they finish.
+            self._feel_control.animation_started()
             if feeling == Feel.ANNOYED:
                 self._be_annoyed()
 
@@ -93,6 +114,7 @@ class RobotManager(NAOBase):
 
             elif feeling == Feel.END:
                 self._run_end_anim()
+        return True
 
     def _get_back_to_target(self, ret_time=0.7):
         head_pitch = self.movement.getAngles("HeadPitch", True)
@@ -118,29 +140,39 @@ class RobotManager(NAOBase):
         """Move the robot randomly to different positions."""
         while self._running:
             with self._feel_lock:
-                lot = random.randint(0, 4)
-                if lot == 0:
-                    self.do_action(*get_background_A())
-                elif lot == 1:
-                    self.do_action(*get_background_B())
-                elif lot == 2:
-                    self.do_action(*get_background_C())
-                if lot >= 2:
-                    self._toogle_face_book_tracking()
+                # Reactions waiting for the lock go first.
+                if not self._reactions.pending:
+                    lot = random.randint(0, 4)
+                    if lot == 0:
+                        self._do_background_action(*get_background_A())
+                    elif lot == 1:
+                        self._do_background_action(*get_background_B())
+                    elif lot == 2:
+                        self._do_background_action(*get_background_C())
+                    if lot >= 2 and not self._reactions.pending:
+                        self._toogle_face_book_tracking()
 
             time.sleep(5)
         # At the end of the loop, go back to sitting position
         self.posture.goToPosture("Sit", 0.2)
 
+    def _do_background_action(self, names, keys, times):
+        """Execute a background movement, that reactions can interrupt (see `do_action`)."""
+        self._background_names = names
+        try:
+            self.do_action(names, keys, times)
+        finally:
+            self._background_names = None
+
     def _toogle_face_book_tracking(self):
         if self._tracking_face:
             self.last_track = self._get_back_to_target()
             self.tracker.stopTracker()
-            self.do_action(*get_looking_down())
+            self._do_background_action(*get_looking_down())
             self._tracking_face = False
         else:
             self.tracker.track("Face")
-            self.do_action(*self.last_track)
+            self._do_background_action(*self.last_track)
             self._tracking_face = True
 
     def _be_annoyed(self):
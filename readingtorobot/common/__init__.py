@@ -1,7 +1,10 @@
 """Common functionality for all robots."""
 from .configuration_loader import load_book, load_config_file, module_file, resource_file
-from .feeling_expression import Feel, FeelingReaction
+from .feeling_expression import FeelingReaction
+from .feelings import Feel
+from .local_bus import LocalBus
 from .mqtt_manager import MQTTManager
+from .reaction_scheduler import ReactionScheduler
 
 
 __all__ = [
@@ -9,7 +12,9 @@ __all__ = [
     "FeelingReaction",
     "load_book",
     "load_config_file",
+    "LocalBus",
     "module_file",
     "MQTTManager",
+    "ReactionScheduler",
     "resource_file",
 ]
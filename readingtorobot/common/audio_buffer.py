@@ -0,0 +1,111 @@
+"""Preallocated audio storage used by the speech pipeline."""
+
+from typing import Tuple, Union
+
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Circular buffer of fixed-size int16 audio frames.
+
+    Every frame is written twice (at its slot and at slot + capacity), so the most recent frames can always be
+    returned as one contiguous, zero-copy view of the storage, oldest frame first.
+
+    Views are windows into the shared storage: they stay valid until `reserve` more frames have been appended after
+    the view was taken, as the slots beyond the logical length are only reused once that headroom is consumed.
+    """
+
+    def __init__(self, max_frames: int, frame_size: int, reserve: int = 0) -> None:
+        """Initialize AudioRingBuffer.
+
+        :param max_frames: Maximum number of frames kept in the buffer.
+        :param frame_size: Number of samples per frame.
+        :param reserve: Extra slots allocated so that views outlive further appends.
+        """
+        self._max_frames = max_frames
+        self._frame_size = frame_size
+        self._capacity = max_frames + reserve
+        self._storage = np.zeros(2 * self._capacity * frame_size, dtype=np.int16)
+        # Raw frames are copied through a byte view, without wrapping each of them in an array first.
+        self._bytes = memoryview(self._storage).cast("B")
+        self._end = 0  # Slot where the next frame will be written
+        self._count = 0
+        self._total = 0  # Number of frames appended since creation
+
+    def __len__(self) -> int:
+        """Return the number of frames currently held."""
+        return self._count
+
+    @property
+    def frame_size(self) -> int:
+        """Return the number of samples per frame."""
+        return self._frame_size
+
+    @property
+    def max_frames(self) -> int:
+        """Return the maximum number of frames kept in the buffer."""
+        return self._max_frames
+
+    @property
+    def total(self) -> int:
+        """Return the number of frames appended since the buffer was created."""
+        return self._total
+
+    def append(self, frame: Union[bytes, np.ndarray]) -> None:
+        """Add a frame at the end of the buffer, dropping the oldest one if the buffer is full.
+
+        :param frame: Raw int16 audio (any bytes-like object) or array of `frame_size` samples.
+        """
+        start = self._end * self._frame_size
+        mirror = start + self._capacity * self._frame_size
+        if isinstance(frame, np.ndarray):
+            self._storage[start : start + self._frame_size] = frame
+            self._storage[mirror : mirror + self._frame_size] = frame
+        else:
+            self._bytes[2 * start : 2 * (start + self._frame_size)] = frame
+            self._bytes[2 * mirror : 2 * (mirror + self._frame_size)] = frame
+        self._end = (self._end + 1) % self._capacity
+        self._count = min(self._count + 1, self._max_frames)
+        self._total += 1
+
+    def view(self, frames: int = -1) -> np.ndarray:
+        """Return the newest frames as a contiguous view, oldest sample first.
+
+        :param frames: Number of frames to return. Negative values return the whole buffer.
+        :return: Read-only int16 view of `frames * frame_size` samples.
+        """
+        frames = self._count if frames < 0 else min(frames, self._count)
+        start = (self._end - frames) % self._capacity
+        out = self._storage[start * self._frame_size : (start + frames) * self._frame_size]
+        out.flags.writeable = False
+        return out
+
+    def since(self, start: int, stop: int = -1) -> Tuple[np.ndarray, int]:
+        """Return the frames appended since a given position of the stream.
+
+        Frames dropped from the window (but not yet overwritten) are still returned, so a consumer reading the stream
+        incrementally does not lose frames when the window is trimmed or cleared.
+
+        :param start: Stream index (see `total`) of the first frame to return.
+        :param stop: Stream index after the last frame to return. Negative values return up to the newest frame.
+        :return: Contiguous int16 view of the frames, and the stream index after the last returned frame.
+        """
+        stop = self._total if stop < 0 else min(stop, self._total)
+        start = min(max(start, self._total - self._capacity), stop)
+        first = (self._end - (self._total - start)) % self._capacity
+        out = self._storage[first * self._frame_size : (first + stop - start) * self._frame_size]
+        out.flags.writeable = False
+        return out, stop
+
+    def discard_oldest(self, frames: int) -> None:
+        """Drop the given number of frames from the start of the buffer."""
+        self._count = max(0, self._count - frames)
+
+    def keep_newest(self, frames: int) -> None:
+        """Drop all but the newest `frames` frames."""
+        self._count = min(self._count, max(0, frames))
+
+    def clear(self) -> None:
+        """Drop all frames."""
+        self._count = 0
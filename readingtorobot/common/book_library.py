@@ -0,0 +1,149 @@
+"""Collection of books that can be read to the robots."""
+
+import glob
+import hashlib
+import logging
+import os
+import pickle
+from threading import Lock
+from typing import Dict, List, Optional
+
+from .book_reactions import Book, book_sentencelist, sentencelist
+from .configuration_loader import module_file
+
+DEFAULT_BOOK = "the_teeny_tree_literal"
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "readingtorobot", "books.pickle")
+
+
+class BookLibrary:
+    """
+    Load all the books in a folder, and keep track of the one being read.
+
+    Each book is matched with its own reaction sentences (see `book_sentences`), so that the sentences of one book
+    never trigger reactions while another is read.
+
+    The preprocessed tables of each book are stored in a cache file, keyed by the hash of the book file and its
+    reaction sentences, so that books are only parsed again when they change.
+    """
+
+    CACHE_VERSION = 4
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        sentences: Dict[str, List[str]] = sentencelist,
+        book_sentences: Dict[str, Dict[str, List[str]]] = book_sentencelist,
+        cache_file: Optional[str] = DEFAULT_CACHE_FILE,
+        active: str = DEFAULT_BOOK,
+        track_position: bool = False,
+        max_edit_distance: int = 0,
+    ) -> None:
+        """Initialize BookLibrary.
+
+        :param directory: Folder containing the books (`*.txt` files). Defaults to the package resources.
+        :param sentences: Sentences to be detected in the books without their own sentences, and their corresponding
+            reactions.
+        :param book_sentences: Sentences to be detected in each book and their corresponding reactions, by book name.
+        :param cache_file: Path to the cache of preprocessed books. If None, books are always parsed.
+        :param active: Name (file name without extension) of the book being read.
+        :param track_position: Follow the reading position in the books (see `Book`).
+        :param max_edit_distance: Tolerance for near-miss words when matching text (see `Book`).
+        """
+        self._logger = logging.getLogger(name=__name__)
+        self._lock = Lock()
+        self._cache_file = cache_file
+        self._books: Dict[str, Book] = {}
+
+        cache = self._load_cache()
+        compiled = {}
+        for path in sorted(glob.glob(os.path.join(directory or module_file("resources"), "*.txt"))):
+            name = os.path.splitext(os.path.basename(path))[0]
+            reactions = book_sentences.get(name, sentences)
+            with open(path, "rb") as f:
+                data = f.read()
+            sentences_key = repr(sorted(reactions.items())).encode("utf-8") if reactions is not None else b""
+            key = hashlib.sha1(data + sentences_key).hexdigest()
+            tables = cache.get(key)
+            if tables is None:
+                tables = Book.compile_tables(data.decode("utf-8").splitlines(), reactions)
+            compiled[key] = tables
+            self._books[name] = Book(
+                tables=tables, track_position=track_position, max_edit_distance=max_edit_distance
+            )
+
+        if compiled.keys() != cache.keys():
+            self._save_cache(compiled)
+
+        if not self._books:
+            raise ValueError("No books found in: {}".format(directory))
+        self._active = active if active in self._books else self.names[0]
+        if self._active != active:
+            self._logger.warning("Book '{}' not found, reading '{}'.".format(active, self._active))
+
+    def __len__(self) -> int:
+        """Return the number of books in the library."""
+        return len(self._books)
+
+    def __contains__(self, name: str) -> bool:
+        """Check if a book is in the library."""
+        return name in self._books
+
+    def __getitem__(self, name: str) -> Book:
+        """Return the book with the given name."""
+        return self._books[name]
+
+    @property
+    def names(self) -> List[str]:
+        """Return the names of all the books in the library."""
+        return sorted(self._books)
+
+    @property
+    def active(self) -> Book:
+        """Return the book being read."""
+        return self._books[self._active]
+
+    @property
+    def active_name(self) -> str:
+        """Return the name of the book being read."""
+        return self._active
+
+    def select(self, name: str) -> bool:
+        """Change the book being read.
+
+        :param name: Name of the book.
+        :return: True if the book was found.
+        """
+        name = name.strip()
+        with self._lock:
+            if name not in self._books:
+                self._logger.warning("Unknown book: '{}'".format(name))
+                return False
+            self._active = name
+        self._logger.info("Reading '{}'".format(name))
+        return True
+
+    def _load_cache(self) -> Dict[str, dict]:
+        """Load the preprocessed books from the cache file."""
+        if not self._cache_file or not os.path.isfile(self._cache_file):
+            return {}
+        try:
+            with open(self._cache_file, "rb") as f:
+                cache = pickle.load(f)
+            if cache.get("version") == self.CACHE_VERSION:
+                return cache["books"]
+        except Exception as e:
+            self._logger.warning("Could not load book cache '{}': {}".format(self._cache_file, e))
+        return {}
+
+    def _save_cache(self, books: Dict[str, dict]) -> None:
+        """Store the preprocessed books in the cache file."""
+        if not self._cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._cache_file), exist_ok=True)
+            tmp_file = "{}.{}.tmp".format(self._cache_file, os.getpid())
+            with open(tmp_file, "wb") as f:
+                pickle.dump({"version": self.CACHE_VERSION, "books": books}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self._cache_file)
+        except OSError as e:
+            self._logger.warning("Could not write book cache '{}': {}".format(self._cache_file, e))
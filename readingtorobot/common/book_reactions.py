@@ -2,53 +2,253 @@
 
 import logging
 import re
-import time
-from typing import Dict, List, Tuple
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
-from .configuration_loader import resource_file, load_book
-
-
-class NoMatchFound(Exception):
-    """To mark when there is no matches."""
-
-    pass
+import numpy as np
 
+from .configuration_loader import resource_file, load_book
 
 ##
-# Generation of list containing sentences that can be matched to specific emotions
+# Sentences that can be matched to specific emotions, by book (file name without extension)
+book_sentencelist: Dict[str, Dict[str, List[str]]] = {}
 
-# The teeny tree
-sentencelist = {
+book_sentencelist["the_teeny_tree"] = {
     "happy": ["pip saw a teeny green stem peeping out of the pot", "keep them wet and wait"],
     "groan": ["but for one very long week the pots just sat there", "there was no tree to be seen", "this is silly"],
     "excited": ["yippee said Pip and Molly", "and molly saw a soft green leaf", "you have a tree said mr beam"],
     "sad": ["molly was very sad", "oh dear she said and a little tear fell down her cheek"],
     "scared": ["and if we look X molly was screaming", "three fat snails were sneaking along mr mister beams feet"],
 }
+book_sentencelist["the_teeny_tree_literal"] = book_sentencelist["the_teeny_tree"]
+
+book_sentencelist["at_the_fun_run"] = {
+    "happy": ["at the end mum and I hug", "we met my dad", "we hug him too"],
+    "groan": ["the sun is hot", "we get hot", "I fan my mum"],
+    "excited": ["we run to the hut and on to the dam", "we run on and on"],
+    "scared": ["I cut my leg", "mum got the man"],
+}
+
+book_sentencelist["mud"] = {
+    "happy": ["we had buns and cans of pop yum", "we dig it up and it hops on the bud"],
+    "groan": ["it can hop", "it is not in my net"],
+}
+
+book_sentencelist["in_the_log_hut"] = {
+    "happy": ["the hut is set up", "we had jam buns in it", "the hut is fun"],
+}
+
+book_sentencelist["on_the_bus"] = {
+    "happy": ["his dog had six pups", "kaz and her pups nap in the box"],
+    "groan": ["she got on it", "she can not sit"],
+    "scared": ["the man has his pet dog kaz on the bus", "she is in her box"],
+}
+
+book_sentencelist["the_big_red_box"] = {
+    "happy": ["in the box is his sax and his wig for his job at the pub"],
+    "excited": ["dad is lots of fun"],
+    "scared": ["sam runs at the box", "he rips at the lid"],
+}
+
+# Sentences of all the books, for books without their own list
+sentencelist: Dict[str, List[str]] = {}
+for _name, _sentences in book_sentencelist.items():
+    if _name == "the_teeny_tree_literal":
+        continue
+    for _feeling, _lines in _sentences.items():
+        sentencelist.setdefault(_feeling, []).extend(_lines)
 
-# At the fun run
-sentencelist["happy"] += ["at the end mum and I hug", "we met my dad", "we hug him too"]
-sentencelist["groan"] += ["the sun is hot", "we get hot", "I fan my mum"]
-sentencelist["excited"] += ["we run to the hut and on to the dam", "we run on and on"]
-sentencelist["scared"] += ["I cut my leg", "mum got the man"]
 
-# Mud
-sentencelist["happy"] += ["we had buns and cans of pop yum", "we dig it up and it hops on the bud"]
-sentencelist["groan"] += ["it can hop", "it is not in my net"]
+# Spellings of the same word that ASR engines commonly swap, accepted as near misses.
+word_aliases = [("mr", "mister"), ("mrs", "missus"), ("ok", "okay")]
 
-# In the log hut
-sentencelist["happy"] += ["the hut is set up", "we had jam buns in it", "the hut is fun"]
+# Shortest word that can be matched to a different word within the edit distance tolerance.
+MIN_FUZZY_WORD_LENGTH = 4
 
-# On the bus
-sentencelist["happy"] += ["his dog had six pups", "kaz and her pups nap in the box"]
-sentencelist["groan"] += ["she got on it", "she can not sit"]
-sentencelist["scared"] += ["the man has his pet dog kaz on the bus", "she is in her box"]
+# Fewest candidate word hits scored in one NumPy batch. Below it, building the arrays costs more than counting the
+# hits of each alignment in Python (see tools/benchmark_book_matching.py).
+BATCH_MIN_HITS = 200
 
 
-# The big red box
-sentencelist["happy"] += ["in the box is his sax and his wig for his job at the pub"]
-sentencelist["excited"] += ["dad is lots of fun"]
-sentencelist["scared"] += ["sam runs at the box", "he rips at the lid"]
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Compute the Levenshtein distance between two words, stopping once it is known to exceed `limit`.
+
+    :param a: First word.
+    :param b: Second word.
+    :param limit: Maximum distance of interest.
+    :return: The distance, or `limit + 1` if it is larger than `limit`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class SentenceIndex:
+    """
+    Inverted index from words to the sentences (and positions in them) where they appear.
+
+    Words are mapped to integer identifiers. A word of a text hits the alignments (sentence, offset between text and
+    sentence) placing it on an equal word of a sentence, so the score of an alignment is its number of hits. Texts
+    with many hits are counted in one NumPy batch, others in Python.
+    """
+
+    def __init__(self, sentences: List[List[str]]) -> None:
+        """Initialize index.
+
+        :param sentences: Indexed sentences, as lists of words.
+        """
+        self._vocabulary: Dict[str, int] = {}
+        for words in sentences:
+            for word in words:
+                self._vocabulary.setdefault(word, len(self._vocabulary))
+
+        self._lengths = np.array([len(words) for words in sentences], dtype=np.int32)
+        self._max_length = int(max(self._lengths, default=0))
+        postings: Dict[int, List[Tuple[int, int]]] = {}
+        for sentence_id, words in enumerate(sentences):
+            for position, word in enumerate(words):
+                postings.setdefault(self._vocabulary[word], []).append((sentence_id, position))
+
+        # Sentence identifiers and positions where each word appears, sorted by sentence, as arrays and as lists.
+        self._postings = {word_id: np.array(p, dtype=np.int32).T for word_id, p in postings.items()}
+        self._posting_lists = {word_id: tuple(map(list, zip(*p))) for word_id, p in postings.items()}
+        self._length_list = self._lengths.tolist()
+        self._near_words: Dict[Tuple[str, int], List[int]] = {}
+
+    def __len__(self) -> int:
+        """Return the number of indexed sentences."""
+        return len(self._lengths)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state to pickle, without the near words found so far."""
+        return dict(self.__dict__, _near_words={})
+
+    def best_match(
+        self,
+        words: List[str],
+        threshold: float,
+        exclude: Iterable[int] = (),
+        window: Optional[Tuple[int, int]] = None,
+        max_edit_distance: int = 0,
+    ) -> Tuple[Optional[int], float]:
+        """Find the sentence that best matches a list of words.
+
+        The candidate alignments (sentence, offset between text and sentence) are the ones placing a word of the text
+        on an equal word of the sentence. The score of an alignment is the number of matching words, normalised by the
+        length of the sentence. With at least `BATCH_MIN_HITS` word hits, they are counted in one NumPy batch.
+
+        :param words: Words to match.
+        :param threshold: Minimum score (excluded) of a valid match.
+        :param exclude: Identifiers of the sentences that should not be matched.
+        :param window: If given, only sentences with identifiers in [window[0], window[1]) are considered.
+        :param max_edit_distance: If positive, words of at least `MIN_FUZZY_WORD_LENGTH` letters also match the
+            words within this edit distance, and `word_aliases` are considered equal.
+        :return: Identifier of the best matching sentence (None if no match was found) and its score.
+        """
+        accepted = [self._accepted_ids(word, max_edit_distance) for word in words]
+
+        # Postings of the text words, as (text position, word, first posting, last posting).
+        hits = []
+        hit_count = 0
+        for i, word_ids in enumerate(accepted):
+            for word_id in word_ids:
+                sentence_ids = self._posting_lists[word_id][0]
+                first, last = 0, len(sentence_ids)
+                if window is not None:
+                    # Postings are sorted by sentence, so the ones inside the window are found by bisection.
+                    first, last = bisect_left(sentence_ids, window[0]), bisect_left(sentence_ids, window[1])
+                if last > first:
+                    hits.append((i, word_id, first, last))
+                    hit_count += last - first
+        if not hits:
+            return None, threshold
+        if hit_count < BATCH_MIN_HITS:
+            return self._count_matches(hits, threshold, exclude)
+
+        candidate_ids = []
+        candidate_offsets = []
+        for i, word_id, first, last in hits:
+            sentence_ids, positions = self._postings[word_id]
+            candidate_ids.append(sentence_ids[first:last])
+            candidate_offsets.append(i - positions[first:last])
+
+        # Count the hits of each alignment, which are its matching words, then remove the excluded sentences.
+        shift = self._max_length  # Offsets are in (-shift, len(words))
+        width = len(words) + shift
+        keys, matches = np.unique(
+            np.concatenate(candidate_ids).astype(np.int64) * width + np.concatenate(candidate_offsets) + shift,
+            return_counts=True,
+        )
+        sentence_ids = (keys // width).astype(np.int32)
+        excluded = np.fromiter(exclude, dtype=np.int32)
+        if len(excluded):
+            keep = ~np.isin(sentence_ids, excluded)
+            sentence_ids, matches = sentence_ids[keep], matches[keep]
+        if not len(sentence_ids):
+            return None, threshold
+        scores = matches / self._lengths[sentence_ids]
+
+        # Best score, and on ties, the first sentence.
+        best = np.lexsort((sentence_ids, -scores))[0]
+        if scores[best] <= threshold:
+            return None, threshold
+        return int(sentence_ids[best]), float(scores[best])
+
+    def _count_matches(
+        self, hits: List[Tuple[int, int, int, int]], threshold: float, exclude: Iterable[int]
+    ) -> Tuple[Optional[int], float]:
+        """Find the best alignment by counting the word hits of each one in Python.
+
+        A text word has at most one hit per alignment (sentences have a single word at each position), so the number
+        of hits of an alignment is its number of matching words.
+        """
+        excluded = set(exclude)
+        matches: Dict[Tuple[int, int], int] = {}
+        for i, word_id, first, last in hits:
+            sentence_ids, positions = self._posting_lists[word_id]
+            for k in range(first, last):
+                if sentence_ids[k] not in excluded:
+                    key = (sentence_ids[k], i - positions[k])
+                    matches[key] = matches.get(key, 0) + 1
+
+        # Best score, and on ties, the first sentence.
+        best, best_score = None, threshold
+        for (sentence_id, _), count in matches.items():
+            score = count / self._length_list[sentence_id]
+            if score > best_score or (score == best_score and best is not None and sentence_id < best):
+                best, best_score = sentence_id, score
+        if best is None:
+            return None, threshold
+        return best, best_score
+
+    def _accepted_ids(self, word: str, max_edit_distance: int) -> List[int]:
+        """Return the identifiers of the indexed words that match a given word."""
+        exact = [self._vocabulary[word]] if word in self._vocabulary else []
+        if max_edit_distance <= 0:
+            return exact
+
+        key = (word, max_edit_distance)
+        if key not in self._near_words:
+            near = [alias for pair in word_aliases if word in pair for alias in pair if alias != word]
+            if len(word) >= MIN_FUZZY_WORD_LENGTH:
+                near += [
+                    w
+                    for w in self._vocabulary
+                    if w != word
+                    and len(w) >= MIN_FUZZY_WORD_LENGTH
+                    and edit_distance(word, w, max_edit_distance) <= max_edit_distance
+                ]
+            self._near_words[key] = [self._vocabulary[w] for w in near if w in self._vocabulary]
+        return exact + self._near_words[key]
 
 
 class Book:
@@ -58,99 +258,165 @@ class Book:
         self,
         source: str = "the_teeny_tree_literal.txt",
         sentences: Dict[str, List[str]] = sentencelist,
+        tables: Optional[Dict[str, Any]] = None,
+        track_position: bool = False,
+        max_edit_distance: int = 0,
     ) -> None:
         """Initialize book.
 
         :param source: Path to file containing reference sentences.
         :param sentences: Sentences to be detected and their corresponding reactions.
+        :param tables: Precompiled tables (see `compile_tables`). If given, `source` and `sentences` are not used.
+        :param track_position: If True, `evaluate` follows the reading position in the book, and reacts to the lines
+            marked with an emotion (`[emotion] text`). Otherwise, it looks for the reaction `sentences` in the text.
+        :param max_edit_distance: Tolerance for near-miss words (see `SentenceIndex.best_match`). 0 disables it.
         """
-        self._text = load_book(resource_file(source))
+        if tables is None:
+            tables = self.compile_tables(load_book(resource_file(source)), sentences)
+
+        self._text = tables["text"]
         self._window = (0, len(self._text))  # This window covers the possible pages where we are reading
-        self._sentence = [
-            {"text": list(dict.fromkeys(line.lower().split(" "))), "score": 0}
-            for line in self.extract_keywords(self._text)
-        ]
-        self._reactions = [
-            {"idx": i, "action": line.split(" ")[0]}
-            for i, line in enumerate(self._text)
-            if re.search(r"^\[(.+)\]", line)
-        ]
+        self._sentence = tables["keywords"]
+        self._reactions = tables["reactions"]
         self._reaction_idx = 0
         self._match_thresh = 3
         self._win_size = 2
-        self._expression_cooldown = 10
-        self._last_expression_time = time.perf_counter()
 
         self._logger = logging.getLogger(name=__name__)
 
-        self._sentences = (
-            [{"sentence": sen.split(" "), "emotion": em} for em in sentences for sen in sentences[em]]
-            if sentences is not None
-            else []
-        )
+        self._sentences = tables["sentences"]
+        self._sentence_index = tables["sentence_index"]
+        self._emotion_sentences = tables["emotion_sentences"]
+
+        # Reading position tracking
+        self._track_position = track_position
+        self._line_index = tables["line_index"]
+        self._line_emotions = tables["line_emotions"]
+        self._position = 0  # Last line read
+        self._missed_matches = 0
+        self._max_missed_matches = 3
+        self._last_reaction_line = None
+        self._move_window(0)
 
         self._match_score_thresh = 0.5
+        self._max_edit_distance = max_edit_distance
         self._last_matched_emotion = None
+        # Identifier (line, or reaction sentence) and score of the match behind the last reaction.
+        self.last_match: Optional[Tuple[int, float]] = None
+
+    def evaluate(self, text: str) -> Optional[str]:
+        """Return the emotion triggered by the detected text, if any.
+
+        :param text: detected text to process.
+        :return: evaluated feeling, or None if there is no reaction to this text.
+        """
+        self.last_match = None
+        if self._track_position:
+            return self.evaluate_reading_position(text)
+        return self.evaluate_static_sentence_validity(text)
+
+    def evaluate_reading_position(self, text: str) -> Optional[str]:
+        """Update the reading position with a detected text, and return the emotion of the line being read if any.
+
+        The text is only compared with the lines in the current window (the last line read and the next
+        `_win_size` lines). After `_max_missed_matches` consecutive texts without any match in the window, the
+        position is considered lost, and the text is compared with the whole book instead.
 
-    def evaluate_static_sentence_validity(self, text: str) -> str:
+        :param text: detected text to process.
+        :return: emotion of the matched line, or None if the line has no reaction (or was already reacted to).
+        """
+        words = text.lower().split(" ")
+        line, score = self._line_index.best_match(
+            words, self._match_score_thresh, window=self._window, max_edit_distance=self._max_edit_distance
+        )
+        if line is None:
+            self._missed_matches += 1
+            if self._missed_matches < self._max_missed_matches:
+                return None
+            line, score = self._line_index.best_match(
+                words, self._match_score_thresh, max_edit_distance=self._max_edit_distance
+            )
+            if line is None:
+                return None
+            self._logger.debug("Reading position lost, found again at line {}".format(line))
+
+        self._missed_matches = 0
+        self._logger.debug("Reading line {}: '{}' (score {:.2f})".format(line, self._text[line], score))
+        self._move_window(line)
+
+        emotion = self._line_emotions[line]
+        if emotion is None or line == self._last_reaction_line:
+            return None
+        self._last_reaction_line = line
+        self.last_match = (line, score)
+        return emotion
+
+    def _move_window(self, line: int) -> None:
+        """Set the reading position and the window of lines that can be read next."""
+        self._position = line
+        self._window = (line, min(len(self._text), line + self._win_size + 1))
+
+    def evaluate_static_sentence_validity(self, text: str) -> Optional[str]:
         """Compare a sentence with the reference emotion dict `self.sentences` and return the matched emotion if any.
 
+        A template matches when, aligned with the text, more than `_match_score_thresh` of its words are found in the
+        text. Templates corresponding to the last matched emotion are skipped, as it is unlikely that we process
+        twice the same sentence.
+
         :param text: detected text to process.
-        :return: evaluated feeling.
+        :return: evaluated feeling, or None if no sentence matches.
         """
-        text_list = text.split(" ")
-        matching_sentences = {}
-        # For all evaluated sentences, check if any of the words in it match to the given text. Then, find the position
-        # where the match occurs, and get the length of the possible matching sentence.
-        for i, s in enumerate(self._sentences):
-            # Skip this sentence if it corresponds to the last match (it is unlikely that we process twice the same)
-            if s["emotion"] == self._last_matched_emotion:
-                continue
-
-            try:
-                match_loc = -1
-                # Run until no match is found
-                while True:
-                    # 1. Find first word match
-                    first_match_text, first_match_sentence, match_loc = self.find_match_start_point(
-                        text_list, s["sentence"], match_loc + 1
-                    )
-                    # 2. Find last word match
-                    matched_sentence_length = min(
-                        len(text_list[first_match_text:]), len(s["sentence"][first_match_sentence:])
-                    )
-                    if matched_sentence_length / len(s["sentence"]) > self._match_score_thresh:
-                        entry = {
-                            "first_id_text": first_match_text,
-                            "first_id_sentence": first_match_sentence,
-                            "lenght": matched_sentence_length,
-                        }
-                        matching_sentences[i] = matching_sentences[i] + [entry] if i in matching_sentences else [entry]
-            except NoMatchFound:
-                continue
-
-        # Once we have the matches, compare word by word the elements in the possible matches.
-        best_score = self._match_score_thresh
-        best_em = None
-        for i in matching_sentences:
-            for entry in matching_sentences[i]:
-                recorded = text_list[entry["first_id_text"] : (entry["first_id_text"] + entry["lenght"])]
-                template = self._sentences[i]["sentence"][
-                    entry["first_id_sentence"] : (entry["first_id_sentence"] + entry["lenght"])
-                ]
-                score = 0
-                self._logger.debug("slen: {}\nrec: {}\ntem: {}".format(entry["lenght"], recorded, template))
-                for rec, tem in zip(recorded, template):
-                    if rec == tem:
-                        score += 1
-                norm_score = score / len(self._sentences[i]["sentence"])
-                if norm_score > best_score:
-                    best_score = norm_score
-                    best_em = self._sentences[i]["emotion"]
-                    self._last_matched_emotion = best_em
-
-        # Return the best matching emotion
-        return best_em or ""
+        match, score = self._sentence_index.best_match(
+            text.split(" "),
+            self._match_score_thresh,
+            exclude=self._emotion_sentences.get(self._last_matched_emotion, ()),
+            max_edit_distance=self._max_edit_distance,
+        )
+        if match is None:
+            return None
+
+        self._logger.debug("Matched '{}' with score {:.2f}".format(" ".join(self._sentences[match]["sentence"]), score))
+        self._last_matched_emotion = self._sentences[match]["emotion"]
+        self.last_match = (match, score)
+        return self._last_matched_emotion
+
+    @classmethod
+    def compile_tables(cls, text: List[str], sentences: Optional[Dict[str, List[str]]]) -> Dict[str, Any]:
+        """Preprocess a book and its reaction sentences.
+
+        The result only contains built-in types and indexes, so it can be cached to skip this step on startup.
+
+        :param text: Lines of the book.
+        :param sentences: Sentences to be detected and their corresponding reactions.
+        :return: Tables used by the Book.
+        """
+        templates = (
+            [{"sentence": sen.split(" "), "emotion": em} for em in sentences for sen in sentences[em]]
+            if sentences is not None
+            else []
+        )
+        emotion_sentences: Dict[str, Set[int]] = {}
+        for i, s in enumerate(templates):
+            emotion_sentences.setdefault(s["emotion"], set()).add(i)
+
+        # Book lines, without their reaction marks
+        lines = [re.match(r"^(?:\[(.+?)\])?\s*(.*)$", line) for line in text]
+
+        return {
+            "text": text,
+            "keywords": [
+                {"text": list(dict.fromkeys(line.lower().split(" "))), "score": 0}
+                for line in cls.extract_keywords(text)
+            ],
+            "reactions": [
+                {"idx": i, "action": line.split(" ")[0]} for i, line in enumerate(text) if re.search(r"^\[(.+)\]", line)
+            ],
+            "sentences": templates,
+            "sentence_index": SentenceIndex([s["sentence"] for s in templates]),
+            "emotion_sentences": emotion_sentences,
+            "line_index": SentenceIndex([line.group(2).lower().split(" ") for line in lines]),
+            "line_emotions": [line.group(1) for line in lines],
+        }
 
     @staticmethod
     def extract_keywords(text: List[str]) -> List[str]:
@@ -159,22 +425,13 @@ class Book:
         :param text: raw text.
         :return: cleaned up word list.
         """
-        all_keys = []
-        for sentence in text:
-            for word in sentence.split(" "):
-                all_keys.append(word)
-
         # Find repeated keys
-        repeats = []
-        for i in range(len(all_keys)):
-            for j in range(i + 1, len(all_keys)):
-                if all_keys[j] == all_keys[i]:
-                    repeats.append(all_keys[j])
-        repeats = list(set(repeats))
+        counts = Counter(word for sentence in text for word in sentence.split(" "))
+        repeats = {word for word, count in counts.items() if count > 1}
 
         # Reasemble each line with all non-repeated keys. If a line contains only one element, pass
         filtered = []
-        for i, sentence in enumerate(text):
+        for sentence in text:
             words = sentence.split(" ")
             if len(words) > 1 and "[" not in sentence:
                 filtered.append(" ".join([w for w in words if w not in repeats]))
@@ -182,25 +439,3 @@ class Book:
                 filtered.append(sentence)
 
         return filtered
-
-    @staticmethod
-    def find_match_start_point(rec: List[str], template: List[str], start_point: int = 0) -> Tuple[int, int, int]:
-        """Find first match after `start_point`.
-
-        :param rec: List of recorded words in order.
-        :param template: Template sentence to be matched.
-        :raises NoMatchFound: No matches were found.
-        :return: The index for the start point of the recorded stream and matched sentence, plus current search index.
-        """
-        for k in range(start_point, len(template)):
-            word = template[k]
-            for text_word in rec:
-                if text_word == word:
-                    if rec.index(text_word) - k >= 0:
-                        first_idx_rec = rec.index(text_word) - k
-                        first_idx_tem = 0
-                    else:
-                        first_idx_rec = 0
-                        first_idx_tem = k - rec.index(text_word)
-                    return (first_idx_rec, first_idx_tem, k)
-        raise NoMatchFound
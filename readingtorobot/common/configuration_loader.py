@@ -4,17 +4,25 @@ Methods to load configuration files.
 [Requires Python 2.7 compatibility]
 """
 
+import copy
 import json
+import logging
 import os
+import threading
 
 
 __all__ = [
+    "ConfigWatcher",
     "load_book",
     "load_config_file",
     "module_file",
     "resource_file",
 ]
 
+# Absolute path -> (modification time, size, parsed JSON data)
+_config_cache = {}
+_config_cache_lock = threading.Lock()
+
 
 def load_book(path):
     """Open text file in given path.
@@ -34,16 +42,101 @@ def load_book(path):
 def load_config_file(path):
     """Open JSON file in given path.
 
+    The file is parsed once, and again only when its modification time or size change.
+
     :param path: Path to the JSON file.
     :type path: str
-    :return: Dictionary with loaded JSON data.
+    :return: Dictionary with loaded JSON data, a copy that the caller can modify.
     :rtype: Dict|List
     """
-    if os.path.isfile(path) and path.endswith("json"):
-        with open(path, "r") as f:
-            return json.load(f)
-    else:
+    if not (os.path.isfile(path) and path.endswith("json")):
         raise ValueError("Wrong file path: {}".format(path))
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    with _config_cache_lock:
+        cached = _config_cache.get(path)
+        if cached is None or cached[:2] != (stat.st_mtime, stat.st_size):
+            with open(path, "r") as f:
+                cached = _config_cache[path] = (stat.st_mtime, stat.st_size, json.load(f))
+        return copy.deepcopy(cached[2])
+
+
+class ConfigWatcher(object):
+    """
+    Watch a JSON configuration file, executing a method with its data whenever it changes.
+
+    The modification time of the file is polled every `interval` seconds by a daemon thread (see `start`), or by
+    calling `check`. Files that cannot be read or parsed (e.g. while being written) are skipped until they change
+    again.
+    """
+
+    def __init__(self, path, callback, interval=1.0):
+        """Initialize ConfigWatcher.
+
+        :param path: Path to the JSON file.
+        :type path: str
+        :param callback: Method executed with the data of the file when it changes.
+        :type callback: Callable[[Dict|List], Any]
+        :param interval: Time between two checks, in seconds.
+        :type interval: float
+        """
+        self._path = path
+        self._callback = callback
+        self._interval = interval
+        self._logger = logging.getLogger(name=__name__)
+        self._stamp = self._read_stamp()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _read_stamp(self):
+        """Return the modification time and size of the file (None if it does not exist)."""
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def check(self):
+        """Execute the method with the data of the file if it changed since the last check.
+
+        :return: True if the file changed and was loaded.
+        :rtype: bool
+        """
+        stamp = self._read_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            data = load_config_file(self._path)
+        except ValueError as e:
+            # Includes JSON decoding errors.
+            self._logger.error("Could not reload {}: {}".format(self._path, e))
+            return False
+        self._logger.info("Reloading {}".format(self._path))
+        self._callback(data)
+        return True
+
+    def start(self):
+        """Start checking the file in a daemon thread."""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ConfigWatcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop checking the file."""
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        """Check the file until stopped."""
+        while not self._stop_event.wait(self._interval):
+            try:
+                self.check()
+            except Exception as e:
+                self._logger.error("Error while reloading {}: {}".format(self._path, e))
 
 
 def module_file(filename):
@@ -1,37 +1,128 @@
 """Methods to manage audio recording."""
 
 import collections
-import io
 import logging
 import queue
-from typing import BinaryIO, ByteString, Callable, Optional
+import time
+from typing import BinaryIO, ByteString, Callable, List, NamedTuple, Optional, Tuple
 
 import numpy as np
-import pyaudio
-import webrtcvad
 import wave
 
-from threading import Thread, Lock
+try:
+    import pyaudio
+except ImportError:
+    # Audio can still be read from files.
+    pyaudio = None
+
+from threading import Condition, Thread, Lock
 
-from scipy import signal
 from speech_recognition import AudioData
 
+from .audio_buffer import AudioRingBuffer
+from .resampling import StreamingResampler, resample_block
+from .vad import BatchVad
+
 DEFAULT_SAMPLE_RATE = 16000
 
+# Audio parameters that `ContinuousSpeech.apply_config` changes while running.
+RUNTIME_AUDIO_PARAMETERS = (
+    "processing_interval",
+    "silence_threshold",
+    "vad_aggressiveness",
+    "vad_batch",
+    "energy_threshold",
+)
+
+_NUMBER = (int, float)
+# Parameter of `AudioConfig` -> (accepted types, validity check, description of the valid values)
+_AUDIO_CONFIG_CHECKS = {
+    "device": ((int, type(None)), lambda v: v is None or v >= 0, "a device index or null"),
+    "file": ((str, type(None)), lambda v: True, "a WAV file path or null"),
+    "sample_rate": (int, lambda v: v > 0, "a positive integer"),
+    "resampler": (str, lambda v: v in ("fft", "poly"), "'fft' or 'poly'"),
+    "replay_speed": (_NUMBER, lambda v: v >= 0, "a number >= 0"),
+    "max_seconds": (_NUMBER, lambda v: v > 0, "a positive number"),
+    "min_seconds": (_NUMBER, lambda v: v >= 0, "a number >= 0"),
+    "max_queued_utterances": (int, lambda v: v >= 1, "a positive integer"),
+    "vad_aggressiveness": (int, lambda v: 0 <= v <= 3, "an integer from 0 to 3"),
+    "vad_batch": (int, lambda v: v >= 1, "a positive integer"),
+    "energy_threshold": (_NUMBER, lambda v: v >= 0, "a number >= 0"),
+    "silence_threshold": (int, lambda v: v >= 0, "an integer >= 0"),
+    "processing_interval": (_NUMBER, lambda v: v > 0, "a positive number"),
+}
+
+
+class Utterance(NamedTuple):
+    """Audio of an utterance detected by the VAD."""
+
+    # int16 samples of the utterance: a read-only view of the capture buffer, valid until `max_queued_utterances` + 1
+    # more utterances are captured.
+    samples: np.ndarray
+    # Stream indices of the first frame of the utterance, and of the frame after the last one.
+    start: int
+    end: int
+    # Time (`time.perf_counter`) at which the end of the utterance was detected.
+    captured_at: float
+
+
+class AudioConfig(NamedTuple):
+    """Audio parameters of `ContinuousSpeech`, named as in the configuration file of the speech service."""
+
+    device: Optional[int] = None
+    file: Optional[str] = None
+    sample_rate: int = DEFAULT_SAMPLE_RATE
+    resampler: str = "fft"
+    replay_speed: float = 1.0
+    max_seconds: float = 10
+    min_seconds: float = 4
+    # 'utterance' if `recognition_mode` is 'utterance', 'window' otherwise.
+    capture_mode: str = "window"
+    max_queued_utterances: int = 2
+    vad_aggressiveness: int = 3
+    vad_batch: int = 1
+    energy_threshold: float = 30
+    silence_threshold: int = 200
+    processing_interval: float = 0.5
+
+    @classmethod
+    def from_json(cls, data: dict) -> "AudioConfig":
+        """Read and validate the audio parameters of a configuration.
+
+        :param data: Configuration of the speech service. Missing parameters take their default value.
+        :raises ValueError: If parameters have a wrong type or value, listing all of them.
+        """
+        values = {name: data[name] for name in _AUDIO_CONFIG_CHECKS if name in data}
+        values["capture_mode"] = "utterance" if data.get("recognition_mode") == "utterance" else "window"
+        config = cls(**values)
+        errors = []
+        for name, (types, valid, expected) in _AUDIO_CONFIG_CHECKS.items():
+            value = getattr(config, name)
+            if isinstance(value, bool) or not isinstance(value, types) or not valid(value):
+                errors.append("{} is {!r}, expected {}".format(name, value, expected))
+        if not errors and config.min_seconds >= config.max_seconds:
+            errors.append("min_seconds must be lower than max_seconds")
+        if errors:
+            raise ValueError("Invalid audio configuration: {}".format("; ".join(errors)))
+        return config
+
 
 class Audio(object):
     """
     Streams raw audio from microphone.
 
     Data is received in a separate thread, and stored in a buffer.
+
+    Audio can also be read from a mono 16 bit WAV file instead, without PyAudio. The file is streamed at
+    `replay_speed` times real time (0 for as fast as it is read).
     """
 
-    FORMAT = pyaudio.paInt16
+    FORMAT = pyaudio.paInt16 if pyaudio is not None else None
     # Network/VAD rate-space
     RATE_PROCESS = 16000
     CHANNELS = 1
     BLOCKS_PER_SECOND = 50
-    frame_duration_ms = property(lambda self: 1000 * self.block_size // self.sample_rate)
+    frame_duration_ms = property(lambda self: 1000 * self._block_size // self._sample_rate)
 
     def __init__(
         self,
@@ -39,36 +130,73 @@ class Audio(object):
         device: Optional[int] = None,
         input_rate: int = RATE_PROCESS,
         file: Optional[str] = None,
+        resampler: str = "fft",
+        max_buffered_blocks: int = 0,
+        replay_speed: float = 1.0,
     ):
         """Initialize Audio.
 
         :param callback: Callback executed when a sentence is detected.
         :param device: The recording device (index) to use.
-        :param input_rate: Recording sampling rate.
-        :param file: File to write the recorded audio.
+        :param input_rate: Recording sampling rate (ignored when reading a file).
+        :param file: WAV file to read the audio from, when no device is given.
+        :param resampler: 'fft' to resample each block independently, 'poly' for a streaming polyphase filter.
+        :param max_buffered_blocks: Maximum number of recorded blocks waiting to be read (0 for no limit). When the
+            reader falls behind, new blocks are dropped.
+        :param replay_speed: Speed at which a file is read, relative to real time (0 for no waiting).
         """
+        self._logger = logging.getLogger(name=__name__)
 
         def proxy_callback(in_data, frame_count, time_info, status):
             del frame_count, time_info, status
-            if self._chunk is not None:
-                in_data = self._wf.readframes(self._chunk)
             self.callback(in_data)
             return (None, pyaudio.paContinue)
 
         if callback is None:
 
             def default_callback(in_data):
-                self._buffer_queue.put(in_data)
+                try:
+                    self._buffer_queue.put_nowait(in_data)
+                    self._dropped_blocks = 0
+                except queue.Full:
+                    if not self._dropped_blocks:
+                        self._logger.warning("Audio reader is falling behind, dropping recorded audio.")
+                    self._dropped_blocks += 1
 
             self.callback = default_callback
         else:
             self.callback = callback
 
-        self._buffer_queue = queue.Queue()
+        self._buffer_queue = queue.Queue(maxsize=max_buffered_blocks)
+        self._dropped_blocks = 0
+
+        self._wf = None
+        self._replay_speed = replay_speed
+        self._replay_start: Optional[float] = None
+        self._replay_position = 0
+        self.end_of_stream = False
+        if file is not None and not device:
+            self._wf = wave.open(file, "rb")
+            if self._wf.getnchannels() != self.CHANNELS or self._wf.getsampwidth() != 2:
+                raise ValueError("Only mono 16 bit WAV files are supported: {}".format(file))
+            input_rate = self._wf.getframerate()
+
         self._input_rate = input_rate
         self._sample_rate = self.RATE_PROCESS
         self._block_size = int(self.RATE_PROCESS / float(self.BLOCKS_PER_SECOND))
         self._block_size_input = int(self._input_rate / float(self.BLOCKS_PER_SECOND))
+        if resampler not in ("poly", "fft"):
+            raise ValueError("Unknown resampler: {}".format(resampler))
+        self._poly_resampler = None
+        if resampler == "poly" and self._input_rate != self.RATE_PROCESS:
+            self._poly_resampler = StreamingResampler(self._input_rate, self.RATE_PROCESS)
+
+        self._pa = None
+        self._stream = None
+        if self._wf is not None:
+            return
+        if pyaudio is None:
+            raise ImportError("PyAudio is required to record audio.")
         self._pa = pyaudio.PyAudio()
 
         kwargs = {
@@ -80,19 +208,13 @@ class Audio(object):
             "stream_callback": proxy_callback,
         }
 
-        self._chunk = None
         # if not default device
         if device:
             kwargs["input_device_index"] = device
-        elif file is not None:
-            self._chunk = 320
-            self._wf = wave.open(file, "rb")
 
         self._stream = self._pa.open(**kwargs)
         self._stream.start_stream()
 
-        self._logger = logging.getLogger(name=__name__)
-
     def _resample(self, data: bytes, input_rate: int):
         """
         Resample from input_rate to RATE_PROCESS for webrtcvad.
@@ -103,24 +225,61 @@ class Audio(object):
         :param input_rate: Input audio rate to resample from
         """
         data16 = np.frombuffer(data, dtype=np.int16)
-        resample_size = int(len(data16) / input_rate * self.RATE_PROCESS)
-        resample = signal.resample(data16, resample_size)
+        resample = resample_block(data16, input_rate, self.RATE_PROCESS)
         resample16 = np.array(resample, dtype=np.int16)
-        return resample16.tobytes()
+        return memoryview(resample16).cast("B")
+
+    def _resample_stream(self, data: bytes):
+        """
+        Resample the next block of the input stream to RATE_PROCESS, keeping the filter state between blocks.
+
+        :param data: Input audio stream
+        """
+        resample = self._poly_resampler.process(np.frombuffer(data, dtype=np.int16))
+        return memoryview(np.clip(np.round(resample), -32768, 32767).astype(np.int16)).cast("B")
 
     def _read_resampled(self):
         """Return a block of audio data resampled to 16000hz, blocking if necessary."""
-        return self._resample(data=self._buffer_queue.get(), input_rate=self._input_rate)
+        data = self._read()
+        if data is None:
+            return None
+        if self._poly_resampler is not None:
+            return self._resample_stream(data)
+        return self._resample(data=data, input_rate=self._input_rate)
 
     def _read(self):
-        """Return a block of audio data, blocking if necessary."""
+        """Return a block of audio data, blocking if necessary. Return None at the end of an audio file."""
+        if self._wf is not None:
+            return self._read_file()
         return self._buffer_queue.get()
 
+    def _read_file(self):
+        """Return the next block of the audio file, waiting to keep the replay speed. Return None at the end."""
+        data = self._wf.readframes(self._block_size_input)
+        if len(data) < 2 * self._block_size_input:
+            self.end_of_stream = True
+            return None
+        if self._replay_speed:
+            if self._replay_start is None:
+                self._replay_start = time.perf_counter()
+            self._replay_position += self._block_size_input
+            delay = (
+                self._replay_start
+                + self._replay_position / (self._input_rate * self._replay_speed)
+                - time.perf_counter()
+            )
+            if delay > 0:
+                time.sleep(delay)
+        return data
+
     def stop(self):
         """Stop audio stream."""
-        self._stream.stop_stream()
-        self._stream.close()
-        self._pa.terminate()
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._pa.terminate()
+        if self._wf is not None:
+            self._wf.close()
 
     def write_wav(self, filename: str, data: bytes):
         """Write recorded audio to provided data file."""
@@ -128,7 +287,7 @@ class Audio(object):
         wf = wave.open(filename, "wb")
         wf.setnchannels(self.CHANNELS)
         # wf.setsampwidth(self.pa.get_sample_size(FORMAT))
-        assert self.FORMAT == pyaudio.paInt16
+        assert pyaudio is None or self.FORMAT == pyaudio.paInt16
         wf.setsampwidth(2)
         wf.setframerate(self._sample_rate)
         wf.writeframes(data)
@@ -141,6 +300,19 @@ class ContinuousSpeech(Thread, Audio):
 
     To do this, a thread keeps storing audio in a buffer of size 1 to 5s.
     Meanwhile, the model processes a previous buffer. Once the processing is done, we swap buffers.
+
+    Capture modes:
+    - 'window' : Keep the voiced audio in a sliding window, read with `get_audio`/`get_audio_since` (default).
+    - 'utterance' : Segment the audio into utterances with `_vad_collector`, read once each with `get_utterance`.
+      At most `max_queued_utterances` utterances wait to be read; capture blocks beyond that, and recorded audio is
+      dropped once `max_seconds` of it are waiting.
+
+    Frames are classified by the VAD in batches of `vad_batch` frames, skipping those quieter than
+    `energy_threshold`. Each frame of a batch waits for the last one, so batches larger than 1 delay the detection of
+    speech by 20 ms per extra frame and are meant for replaying files. The decisions of the latest `max_seconds` of
+    audio are available in `vad_decisions`, indexed like the frames of `Utterance`.
+
+    The parameters in `RUNTIME_AUDIO_PARAMETERS` can be changed while running, with `apply_config`.
     """
 
     def __init__(
@@ -152,20 +324,74 @@ class ContinuousSpeech(Thread, Audio):
         processing_interval=0.5,
         silence_threshold=200,
         input_rate=None,
+        resampler="fft",
+        capture_mode="window",
+        max_queued_utterances=2,
+        file=None,
+        replay_speed=1.0,
+        vad_batch=1,
+        energy_threshold=30,
     ):
         """Initialize ContinuousSpeech."""
         super().__init__()
-        super(Audio, self).__init__(device=device, input_rate=input_rate)
-        self._vad = webrtcvad.Vad(aggressiveness)
+        if capture_mode not in ("window", "utterance"):
+            raise ValueError("Unknown capture mode: {}".format(capture_mode))
+        Audio.__init__(
+            self,
+            device=device,
+            input_rate=input_rate,
+            file=file,
+            replay_speed=replay_speed,
+            resampler=resampler,
+            max_buffered_blocks=int(round(self.BLOCKS_PER_SECOND * max_seconds)),
+        )
         self._lock = Lock()
+        # Signalled whenever voiced audio is stored or an utterance ends, with the lock of the audio buffer.
+        self._new_audio = Condition(self._lock)
+        self._audio_seq = 0
         self._min_seconds = min_seconds
-        self._time_window = (max_seconds - min_seconds) * self.BLOCKS_PER_SECOND
+        self._time_window = int(round((max_seconds - min_seconds) * self.BLOCKS_PER_SECOND))
         self.wait_time = processing_interval
-        self._main_buffer_size = self.BLOCKS_PER_SECOND * max_seconds
+        self._main_buffer_size = int(round(self.BLOCKS_PER_SECOND * max_seconds))
+        self._vad = BatchVad(aggressiveness, self.RATE_PROCESS, energy_threshold, history=self._main_buffer_size)
+        self._vad_batch = max(1, vad_batch)
 
-        self._main_audio_buffer = []
+        # Keep a full window of headroom, so views returned by `get_audio` survive while the recogniser uses them.
+        self._main_audio_buffer = AudioRingBuffer(
+            self._main_buffer_size, self._block_size, reserve=self._main_buffer_size
+        )
+        self._utterance_end = 0
+        self._last_audio_at = time.perf_counter()
         self._running = False
         self._unvoiced_threshold = silence_threshold
+        self._capture_mode = capture_mode
+        self._utterances: "queue.Queue[Optional[Utterance]]" = queue.Queue(maxsize=max_queued_utterances)
+        # In 'utterance' mode, utterances are views of this buffer. Besides the one being decoded, it holds the queued
+        # utterances and the one being captured, so its frames are only overwritten once the reader has moved on.
+        self._utterance_buffer = None
+        if capture_mode == "utterance":
+            self._utterance_buffer = AudioRingBuffer(
+                self._main_buffer_size, self._block_size, reserve=(max_queued_utterances + 1) * self._main_buffer_size
+            )
+        self._frames_read = 0
+        # Frames read ahead for the VAD batch are not counted until they are classified.
+        self._frames_classified = 0
+        self._config = AudioConfig(
+            device=device,
+            file=file,
+            sample_rate=input_rate,
+            resampler=resampler,
+            replay_speed=replay_speed,
+            max_seconds=max_seconds,
+            min_seconds=min_seconds,
+            capture_mode=capture_mode,
+            max_queued_utterances=max_queued_utterances,
+            vad_aggressiveness=aggressiveness,
+            vad_batch=vad_batch,
+            energy_threshold=energy_threshold,
+            silence_threshold=silence_threshold,
+            processing_interval=processing_interval,
+        )
 
     def start(self):
         """Start thread."""
@@ -175,74 +401,240 @@ class ContinuousSpeech(Thread, Audio):
     def stop(self):
         """Stop thread."""
         self._running = False
+        self.wake()
         self.join()
 
+    def wake(self):
+        """Wake up the threads waiting for audio, e.g. to let them stop."""
+        with self._new_audio:
+            self._audio_seq += 1
+            self._new_audio.notify_all()
+        try:
+            self._utterances.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def wait_for_audio(self, seq: int, timeout: Optional[float] = None) -> int:
+        """Block until new voiced audio is stored or an utterance ends.
+
+        :param seq: Audio sequence number returned by the previous call (0 on the first call).
+        :param timeout: Maximum time to wait, in seconds. If None, wait until there is new audio.
+        :return: Current audio sequence number, equal to `seq` if the wait timed out.
+        """
+        with self._new_audio:
+            self._new_audio.wait_for(lambda: self._audio_seq != seq, timeout)
+            return self._audio_seq
+
     def _frame_generator(self):
-        """Yield all audio frames from microphone."""
-        if self._input_rate == self.RATE_PROCESS:
-            while self._running:
-                yield self._read()
-        else:
-            while self._running:
-                yield self._read_resampled()
+        """Yield all audio frames from microphone (or file, until its end)."""
+        read = self._read if self._input_rate == self.RATE_PROCESS else self._read_resampled
+        while self._running:
+            frame = read()
+            if frame is None:
+                return
+            self._frames_read += 1
+            yield frame
+
+    def _classified_frames(self, frames=None):
+        """Yield (frame, is_speech) pairs, classifying frames in batches.
+
+        :param frames: Frames to classify. If None, frames are read from the audio stream.
+        """
+        if frames is None:
+            frames = self._frame_generator()
+        batch = []
+        for frame in frames:
+            batch.append(frame)
+            if len(batch) < self._vad_batch:
+                continue
+            yield from self._classify_batch(batch)
+            batch = []
+        if batch:
+            yield from self._classify_batch(batch)
+
+    def _classify_batch(self, batch):
+        """Yield (frame, is_speech) pairs of a batch, counting the frames handed over."""
+        for pair in zip(batch, self._vad.classify(batch)):
+            self._frames_classified += 1
+            yield pair
+
+    @property
+    def config(self) -> AudioConfig:
+        """Return the audio parameters in use."""
+        return self._config
+
+    def apply_config(self, config: AudioConfig) -> List[str]:
+        """Change the audio parameters while running.
+
+        Only the parameters in `RUNTIME_AUDIO_PARAMETERS` are applied. The others (audio input, buffer sizes...)
+        require a restart, and their changes are ignored with a warning.
+
+        :param config: New audio parameters.
+        :return: Names of the parameters that changed but could not be applied.
+        """
+        changed = [name for name in config._fields if getattr(config, name) != getattr(self._config, name)]
+        ignored = [name for name in changed if name not in RUNTIME_AUDIO_PARAMETERS]
+        with self._lock:
+            self.wait_time = config.processing_interval
+            self._unvoiced_threshold = config.silence_threshold
+            self._vad_batch = max(1, config.vad_batch)
+            self._vad.configure(config.vad_aggressiveness, config.energy_threshold)
+            self._config = config._replace(**{name: getattr(self._config, name) for name in ignored})
+        applied = [name for name in changed if name not in ignored]
+        if applied:
+            self._logger.info("Audio parameters changed: {}".format(", ".join(applied)))
+        if ignored:
+            self._logger.warning("Restart to change the audio parameters: {}".format(", ".join(ignored)))
+        return ignored
+
+    @property
+    def vad_decisions(self):
+        """Return the bitmap of the VAD decisions of the latest frames, which can be read from any thread."""
+        return self._vad.decisions
 
     def run(self):
         """Manage audio buffers."""
-        while self._running:
+        if self._capture_mode == "utterance":
+            while self._running and not self.end_of_stream:
+                self._collect_utterances()
+            # Let readers know that no more utterances will come.
+            self._put_utterance(None)
+            return
+
+        while self._running and not self.end_of_stream:
             triggered = False
             num_unvoiced = 0
-            for frame in self._frame_generator():
+            for frame, is_speech in self._classified_frames():
                 # Check for speech around the robot. If there is speech, increase the translation rate.
-                if not self._vad.is_speech(frame, self._sample_rate):
+                if not is_speech:
                     if triggered:
                         num_unvoiced += 1
                         if num_unvoiced > self._unvoiced_threshold:
-                            with self._lock:
-                                del self._main_audio_buffer[:]
+                            with self._new_audio:
+                                self._main_audio_buffer.clear()
+                                self._utterance_end = self._main_audio_buffer.total
+                                self._audio_seq += 1
+                                self._new_audio.notify_all()
                             triggered = False
                             num_unvoiced = 0
                     continue
 
                 triggered = True
                 # Put a new element in buffer.
-                with self._lock:
+                with self._new_audio:
                     # If buffer is full, extract audio of the first n seconds until buffer size is the minimum again
-                    if len(self._main_audio_buffer) > self._main_buffer_size:
-                        del self._main_audio_buffer[self._time_window :]
-                    self._main_audio_buffer.insert(0, frame)
-
-    def get_audio(self, time_diff: int = 0):
-        """Clear part of the time buffer corresponding to the elapsed time (time_diff (seconds))."""
-        output = None
-        to_clear = int(
-            self.BLOCKS_PER_SECOND
-            * max(0, (len(self._main_audio_buffer) / self.BLOCKS_PER_SECOND - self._min_seconds - time_diff))
-        )
-        self._logger.debug("Clearing: {}, of a total of {}".format(to_clear, len(self._main_audio_buffer)))
+                    if len(self._main_audio_buffer) >= self._main_buffer_size:
+                        self._main_audio_buffer.keep_newest(self._time_window)
+                    self._main_audio_buffer.append(frame)
+                    self._last_audio_at = time.perf_counter()
+                    self._audio_seq += 1
+                    self._new_audio.notify_all()
+
+        if self.end_of_stream:
+            # The last utterance ends with the file.
+            with self._new_audio:
+                self._utterance_end = self._main_audio_buffer.total
+                self._audio_seq += 1
+                self._new_audio.notify_all()
+
+    def _collect_utterances(self):
+        """Queue the utterances detected by `_vad_collector`, splitting those longer than `max_seconds`.
+
+        Frames are copied once, into the utterance buffer, and each utterance is queued as one contiguous view of it.
+        """
+        buffer = self._utterance_buffer
+        start = buffer.total
+        for frame in self._vad_collector():
+            if frame is not None:
+                buffer.append(frame)
+                if buffer.total - start < self._main_buffer_size:
+                    continue
+            if buffer.total > start:
+                self._queue_frames(buffer.since(start)[0])
+                start = buffer.total
+        if buffer.total > start:
+            self._queue_frames(buffer.since(start)[0])
+
+    def _queue_frames(self, samples):
+        """Queue the samples of an utterance ending with the last frame read."""
+        frames = len(samples) // self._block_size
+        end = self._frames_classified
+        self._put_utterance(Utterance(samples, end - frames, end, time.perf_counter()))
+
+    def _put_utterance(self, utterance: Optional[Utterance]):
+        """Queue an utterance, waiting while the queue is full unless the thread is stopped."""
+        while self._running:
+            try:
+                self._utterances.put(utterance, timeout=self.wait_time)
+                return
+            except queue.Full:
+                continue
+
+    def get_utterance(self, timeout: Optional[float] = None) -> Optional[Utterance]:
+        """Return the next utterance, blocking until one is detected (requires 'utterance' capture mode).
+
+        :param timeout: Maximum time to wait, in seconds. If None, wait until an utterance is detected.
+        :return: The utterance, or None on timeout, when `wake` is called, or after the end of an audio file.
+        """
+        try:
+            return self._utterances.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get_audio(self, time_diff: int = 0) -> np.ndarray:
+        """Clear the part of the audio window corresponding to the elapsed time (seconds) and return the rest.
 
+        Only the newest `min_seconds + time_diff` seconds are kept, so each step decodes the audio heard since the
+        last call plus `min_seconds` of context rather than the whole window.
+
+        :param time_diff: Time elapsed since the last call, in seconds.
+        :return: Zero-copy int16 view of the remaining window, oldest sample first.
+        """
         with self._lock:
-            output = self._main_audio_buffer
-            if to_clear:
-                del self._main_audio_buffer[-to_clear:]
+            to_clear = int(
+                self.BLOCKS_PER_SECOND
+                * max(0, (len(self._main_audio_buffer) / self.BLOCKS_PER_SECOND - self._min_seconds - time_diff))
+            )
+            self._logger.debug("Clearing: {}, of a total of {}".format(to_clear, len(self._main_audio_buffer)))
+            self._main_audio_buffer.discard_oldest(to_clear)
+            output = self._main_audio_buffer.view()
+
+        return output
+
+    @property
+    def last_audio_at(self) -> float:
+        """Return the time (`time.perf_counter`) at which the newest voiced frame was stored ('window' mode)."""
+        return self._last_audio_at
+
+    @property
+    def utterance_end(self) -> int:
+        """Return the stream index after the last frame of the last finished utterance."""
+        return self._utterance_end
+
+    def get_audio_since(self, start: int, stop: int = -1) -> Tuple[np.ndarray, int]:
+        """Return the voiced audio recorded since a given position of the stream.
+
+        :param start: Stream index of the first frame to return (the index returned by the previous call).
+        :param stop: Stream index after the last frame to return. Negative values return up to the newest frame.
+        :return: Zero-copy int16 view of the audio, and the stream index after its last frame.
+        """
+        with self._lock:
+            return self._main_audio_buffer.since(start, stop)
 
-        return reversed(output)
+    def frames_to_SR(self, frames: np.ndarray) -> AudioData:
+        """Convert an audio window into an AudioData object (to use with Speech Recognition).
 
-    def frames_to_SR(self, frames):
-        """Convert frames into an AudioData object (to use with Speech Recognition)."""
-        byte_frames = io.BytesIO()
-        for frame in frames:
-            byte_frames.write(frame)
-        frame_data = byte_frames.getvalue()
-        byte_frames.close()
-        return AudioData(frame_data, self._sample_rate, 2)
+        The AudioData object shares the memory of the window, which must not be overwritten while it is used.
+        """
+        return AudioData(memoryview(frames).cast("B"), self._sample_rate, 2)
 
     def clear_audio(self, clear_all=False):
         """Clean up the current window."""
         with self._lock:
             if clear_all:
-                del self._main_audio_buffer[:]
+                self._main_audio_buffer.clear()
             else:
-                del self._main_audio_buffer[self._time_window :]
+                self._main_audio_buffer.keep_newest(self._time_window)
 
     def _vad_collector(self, padding_ms=300, ratio=0.75, frames=None):
         """Yield a series of consecutive audio frames comprising each utterence.
@@ -252,18 +644,14 @@ class ContinuousSpeech(Thread, Audio):
         Example: (frame, ..., frame, None, frame, ..., frame, None, ...)
                   |---utterence---|        |---utterence---|
         """
-        if frames is None:
-            frames = self._frame_generator()
         num_padding_frames = padding_ms // self.frame_duration_ms
         ring_buffer = collections.deque(maxlen=num_padding_frames)
         triggered = False
 
-        for frame in frames:
+        for frame, is_speech in self._classified_frames(frames):
             if len(frame) < 640:
                 return
 
-            is_speech = self._vad.is_speech(frame, self._sample_rate)
-
             if not triggered:
                 ring_buffer.append((frame, is_speech))
                 num_voiced = len([f for f, speech in ring_buffer if speech])
@@ -284,13 +672,28 @@ class ContinuousSpeech(Thread, Audio):
 
     @classmethod
     def from_json(cls, data):
-        """Initialize using JSON description."""
-        return ContinuousSpeech(
-            max_seconds=data.get("max_seconds", 10),
-            min_seconds=data.get("min_seconds", 4),
-            aggressiveness=data.get("vad_aggressiveness", 3),
-            silence_threshold=data.get("silence_threshold", 200),
-            device=data.get("device", None),
-            processing_interval=data.get("processing_interval", 0.5),
-            input_rate=data.get("sample_rate", DEFAULT_SAMPLE_RATE),
+        """Initialize using JSON description.
+
+        :raises ValueError: If the audio parameters are not valid (see `AudioConfig.from_json`).
+        """
+        return cls.from_config(AudioConfig.from_json(data))
+
+    @classmethod
+    def from_config(cls, config: AudioConfig):
+        """Initialize with the given audio parameters."""
+        return cls(
+            max_seconds=config.max_seconds,
+            min_seconds=config.min_seconds,
+            aggressiveness=config.vad_aggressiveness,
+            vad_batch=config.vad_batch,
+            energy_threshold=config.energy_threshold,
+            silence_threshold=config.silence_threshold,
+            device=config.device,
+            processing_interval=config.processing_interval,
+            input_rate=config.sample_rate,
+            resampler=config.resampler,
+            capture_mode=config.capture_mode,
+            max_queued_utterances=config.max_queued_utterances,
+            file=config.file,
+            replay_speed=config.replay_speed,
         )
@@ -2,32 +2,92 @@
 
 import logging
 import os
+from threading import Lock
+from typing import Dict, Tuple
 
 import deepspeech
 
+# Models already loaded in this process, keyed by model path, scorer path and hot-words.
+_model_cache: Dict[Tuple, deepspeech.Model] = {}
+_model_cache_lock = Lock()
+# Lock of each cached model (by identity), held while it decodes: models are not safe for concurrent use.
+_model_locks: Dict[int, Lock] = {}
 
-def load_deepspeech_model(configuration: dict) -> deepspeech.Model:
-    """Initialize a deepspeech model with a specific configuration."""
-    ds = None
-    if "model" in configuration:
-        path = configuration["model"].format(DEEPSPEECH_DIR=os.getenv("DEEPSPEECH_DIR", default="."))
-        logging.info("model: %s", path)
-        ds = deepspeech.Model(path)
-    else:
+
+def _model_paths(configuration: dict) -> Tuple[str, str]:
+    """Return the paths of the model and scorer files of a configuration."""
+    if "model" not in configuration:
         logging.error("Please provide model via Config file or model address.")
         raise Exception("No detection model provided.")
+    model = configuration["model"].format(DEEPSPEECH_DIR=os.getenv("DEEPSPEECH_DIR", default="."))
 
     if "scorer" in configuration:
-        path = configuration["scorer"].format(DEEPSPEECH_DIR=os.getenv("DEEPSPEECH_DIR", "."))
-        logging.info("scorer: %s", path)
+        scorer = configuration["scorer"].format(DEEPSPEECH_DIR=os.getenv("DEEPSPEECH_DIR", "."))
     else:
-        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources/kenlm.scorer")
-        logging.info("scorer: %s", path)
+        scorer = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources/kenlm.scorer")
+    return os.path.abspath(model), os.path.abspath(scorer)
+
+
+def read_ahead(path: str) -> None:
+    """Ask the kernel to start reading a file into the page cache, where available.
+
+    DeepSpeech (and kenlm, for the scorer) open and map the file themselves: this only starts the disk reads earlier,
+    without keeping the file open or mapped.
+
+    :param path: Path to the file.
+    """
+    if not hasattr(os, "posix_fadvise") or not os.path.isfile(path):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def load_deepspeech_model(configuration: dict) -> deepspeech.Model:
+    """Initialize a deepspeech model with a specific configuration.
+
+    Models are cached: recognisers created with the same model, scorer and hot-words share a single model.
+    """
+    model_path, scorer_path = _model_paths(configuration)
+    hot_words = tuple(sorted((w, float(b)) for w, b in configuration.get("hot_words", {}).items()))
+    key = (model_path, scorer_path, hot_words)
+
+    with _model_cache_lock:
+        ds = _model_cache.get(key)
+        if ds is not None:
+            logging.info("Using loaded model: %s", model_path)
+            return ds
+
+        logging.info("model: %s", model_path)
+        read_ahead(model_path)
+        ds = deepspeech.Model(model_path)
+
+        logging.info("scorer: %s", scorer_path)
+        read_ahead(scorer_path)
+        ds.enableExternalScorer(scorer_path)
+
+        if hot_words:
+            logging.info("Adding hot-words %s", configuration["hot_words"])
+            for word, boost in hot_words:
+                ds.addHotWord(word, boost)
+
+        _model_cache[key] = ds
+        return ds
+
+
+def model_lock(model: deepspeech.Model) -> Lock:
+    """Return the lock serialising the use of a model, shared by all the recognisers using it.
+
+    :param model: Model returned by `load_deepspeech_model`.
+    """
+    with _model_cache_lock:
+        return _model_locks.setdefault(id(model), Lock())
 
-    ds.enableExternalScorer(path)
 
-    if "hot_words" in configuration:
-        logging.info("Adding hot-words %s", configuration["hot_words"])
-        for word in configuration["hot_words"]:
-            ds.addHotWord(word, float(configuration["hot_words"][word]))
-    return ds
+def clear_model_cache() -> None:
+    """Release the cached models."""
+    with _model_cache_lock:
+        _model_cache.clear()
+        _model_locks.clear()
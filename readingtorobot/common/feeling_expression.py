@@ -1,65 +1,229 @@
 """
-Available feelings and reaction management.
+Reaction management.
 
 [Requires Python 2.7 compatibility]
 """
+import functools
 import logging
+import threading
+import time
 
+from .feelings import Feel
+from .latency import LatencyHistograms
+from .messages import Command
+from .reaction_scheduler import ReactionScheduler
 
-class Feel:
-    """Enum for available emotional states."""
 
-    NEUTRAL = 0
-    HAPPY = 1
-    SAD = 2
-    ANNOYED = 3
-    SCARED = 4
-    EXCITED = 5
-    START = 6
-    END = 7
+class FeelingReaction:
+    """
+    Class triggering the emotional responses in the robot.
 
+    Commands are looked up in a dispatch table (see `register`) and executed one at a time by a worker thread, so
+    that the thread receiving them (e.g. the MQTT network loop) never waits for the robot to move. Commands arriving
+    while a reaction is executed wait in a `ReactionScheduler` holding a single command: only the latest one is kept,
+    unless it has a lower priority than the one already waiting (see `DEFAULT_PRIORITIES`).
 
-class FeelingReaction:
-    """Class triggering the emotional responses in the robot."""
+    When a command carries a latency trace, the times it is received and its animation starts are added to the trace,
+    and the trace is recorded in `latency`. The animation is considered started when `do_feel` returns, unless the
+    robot calls `animation_started` before. Robots whose `do_feel` only queues the animation are created with
+    `queued_animations`, and call `animation_started(feel)` when they start playing it. Reactions the robot reports as
+    not played are not recorded.
+
+    Commands waiting more than `max_age` seconds after they were received, or matched with the book with a confidence
+    below `min_confidence`, are dropped (commands without confidence are always accepted). Commands whose audio was
+    captured more than `max_capture_age` seconds before their execution are only dropped if it is given, since the
+    capture time comes from the clock of the speech service and includes the decoding time.
+    """
 
-    def __init__(self, read_game):
+    # Feelings expressed for the commands of the speech service.
+    FEELINGS = {
+        "happy": Feel.HAPPY,
+        "sad": Feel.SAD,
+        "groan": Feel.ANNOYED,
+        "excited": Feel.EXCITED,
+        "scared": Feel.SCARED,
+        "start": Feel.START,
+        "end": Feel.END,
+    }
+
+    def __init__(
+        self,
+        read_game,
+        latency_file=None,
+        max_age=10.0,
+        min_confidence=0.0,
+        max_capture_age=None,
+        queued_animations=False,
+    ):
         """Initialize feeling reaction.
 
-        :param read_game: An object implementing the 'do_feel' method.
+        :param read_game: An object implementing the method `do_feel(feel)`, returning False if the reaction was not
+            played.
         :type read_game: Any
+        :param latency_file: File the latency histograms are written to (Prometheus text format).
+        :type latency_file: Optional[str]
+        :param max_age: Maximum time a command waits after being received, in seconds (None to wait forever).
+        :type max_age: Optional[float]
+        :param min_confidence: Minimum match confidence of a command.
+        :type min_confidence: float
+        :param max_capture_age: Maximum time between the capture of the audio of a command and its execution, in
+            seconds (None to accept any). The clocks of the speech service and the robot must be synchronised.
+        :type max_capture_age: Optional[float]
+        :param queued_animations: True if `do_feel` returns before the animation starts, in which case the robot calls
+            `animation_started(feel)` when it does.
+        :type queued_animations: bool
         """
         self._game = read_game
         self._logger = logging.getLogger(name=__name__)
+        self._min_confidence = min_confidence
+        self._max_capture_age = max_capture_age
+        self.latency = LatencyHistograms(latency_file)
+        self._trace = None
+        self._queued_animations = queued_animations
+        # Feel -> trace of the last command expressing it, until its queued animation starts.
+        self._waiting_traces = {}
+        self._trace_lock = threading.Lock()
+
+        self._handlers = {}
+        for name, feel in self.FEELINGS.items():
+            self.register(name, functools.partial(self._feel, feel))
+
+        # Commands waiting to be executed, as (command, handler). Cooldowns are left to the robots.
+        self._commands = ReactionScheduler(cooldown=0.0, cooldowns={}, max_queued=1, max_age=max_age)
+        self._busy = False
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(target=self._execute, name="FeelingReaction")
+        self._worker.daemon = True
+        self._worker.start()
+
+    def register(self, command, handler, priority=None):
+        """Set the method executed for a command.
+
+        :param command: The command, e.g. 'sad'.
+        :type command: str
+        :param handler: Method executed with the `Command` received. It returns False if the reaction was not played.
+        :type handler: Callable[[Command], Optional[bool]]
+        :param priority: A waiting command is only replaced by commands of the same or higher priority. If None, the
+            priority of the feeling of the command (see `DEFAULT_PRIORITIES`), 0 for other commands.
+        :type priority: Optional[int]
+        """
+        self._handlers[command] = (handler, self.FEELINGS.get(command, command), priority)
 
     def process_text(self, s):
-        """Check an input string and execute a feeling animation in the robot.
+        """Check an input command and schedule its feeling animation in the robot.
+
+        :param s: The action to execute: 'happy', 'sad', 'groan', 'excited', 'scared', 'start', 'end' or any other
+            registered command, as a `Command` or a text payload.
+        :type s: Union[Command, str]
+        """
+        command = s if isinstance(s, Command) else Command.decode(s)
+        if command.trace is not None:
+            command.trace.mark("received")
+        self._logger.debug("\033[93mRecognized: {}\033[0m".format(command.command))
+        if command.confidence is not None and command.confidence < self._min_confidence:
+            self._logger.debug("Dropping command '{}' (confidence {:.2f}).".format(command.command, command.confidence))
+            return
+        entry = self._handlers.get(command.command)
+        if entry is None:
+            self._logger.warning("Unknown command '{}'.".format(command.command))
+            return
+        handler, kind, priority = entry
+        # Aged from now, on the clock of the robot.
+        self._commands.submit(kind, (command, handler), priority=priority)
+
+    def wait_idle(self, timeout=None):
+        """Wait until all the scheduled commands have been executed.
 
-        :param s: The action to execute: 'happy', 'sad', 'groan', 'excited', 'scared', 'start' or 'end'
-        :type s: str
+        :param timeout: Maximum time to wait, in seconds. If None, wait until the robot is idle.
+        :type timeout: Optional[float]
+        :return: True if the robot is idle.
+        :rtype: bool
         """
-        self._logger.debug("\033[93mRecognized: {}\033[0m".format(s))
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while self._busy or self._commands.pending:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def stop(self):
+        """Stop executing commands, after the current one."""
+        self._commands.close()
+        if self._worker is not threading.current_thread():
+            self._worker.join()
+
+    def _execute(self):
+        """Execute the scheduled commands until stopped."""
+        while self._commands.wait():
+            with self._condition:
+                # None if the command waited too long.
+                entry = self._commands.next()
+                self._busy = entry is not None
+                self._condition.notify_all()
+            if entry is None:
+                continue
+            try:
+                self._run(*entry)
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _run(self, command, handler):
+        """Execute a command, recording its latency trace."""
+        if self._max_capture_age is not None and command.captured_at is not None:
+            age = time.time() - command.captured_at
+            if age > self._max_capture_age:
+                self._logger.warning("Dropping command '{}', captured {:.1f} s ago.".format(command.command, age))
+                return
+        trace = command.trace
+        kind = self.FEELINGS.get(command.command)
+        # Recorded by the robot once the animation starts, which may happen before the handler returns.
+        waiting = self._queued_animations and kind is not None and trace is not None
+        with self._trace_lock:
+            self._trace = trace
+            if waiting:
+                self._waiting_traces[kind] = trace
         try:
-            if s == "happy":
-                self._game.do_feel(Feel.HAPPY)
-                self._logger.debug("Feeling {}".format("Happy"))
-            elif s == "sad":
-                self._game.do_feel(Feel.SAD)
-                self._logger.debug("Feeling {}".format("Sad"))
-            elif s == "groan":
-                self._game.do_feel(Feel.ANNOYED)
-                self._logger.debug("Feeling {}".format("Groan"))
-            elif s == "excited":
-                self._game.do_feel(Feel.EXCITED)
-                self._logger.debug("Feeling {}".format("Excited"))
-            elif s == "scared":
-                self._game.do_feel(Feel.SCARED)
-                self._logger.debug("Feeling {}".format("Scared"))
-            elif s == "start":
-                self._game.do_feel(Feel.START)
-                self._logger.debug("Running interaction starting animation.")
-            elif s == "end":
-                self._game.do_feel(Feel.END)
-                self._logger.debug("Running interaction final animation.")
+            played = handler(command) is not False
+            self._logger.debug("Feeling {}".format(command.command) if played else "Skipped {}".format(command.command))
         except Exception as e:
             self._logger.warning(e)
-            pass
+            played = False
+        with self._trace_lock:
+            self._trace = None
+            if waiting and not played and self._waiting_traces.get(kind) is trace:
+                del self._waiting_traces[kind]
+        if played and trace is not None and not waiting:
+            if "animated" not in trace:
+                trace.mark("animated")
+            self.latency.observe(trace)
+
+    def _feel(self, feel, command):
+        """Express a feeling in the robot, for a command."""
+        del command
+        return self._game.do_feel(feel)
+
+    def animation_started(self, feel=None):
+        """Record the start of an animation.
+
+        To be called from `do_feel` by robots whose `do_feel` only returns once the animation is finished, for the
+        command being processed, or with the feeling expressed by robots with `queued_animations`, when they start
+        playing a reaction.
+
+        :param feel: Feeling of the animation, if queued.
+        :type feel: Optional[Feel]
+        """
+        with self._trace_lock:
+            if feel is not None:
+                trace = self._waiting_traces.pop(feel, None)
+                if trace is None:
+                    return
+                trace.mark("animated")
+            else:
+                if self._trace is not None and "animated" not in self._trace:
+                    self._trace.mark("animated")
+                return
+        self.latency.observe(trace)
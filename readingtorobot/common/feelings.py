@@ -0,0 +1,18 @@
+"""
+Feelings expressed by the robots.
+
+[Requires Python 2.7 compatibility]
+"""
+
+
+class Feel:
+    """Enum for available emotional states."""
+
+    NEUTRAL = 0
+    HAPPY = 1
+    SAD = 2
+    ANNOYED = 3
+    SCARED = 4
+    EXCITED = 5
+    START = 6
+    END = 7
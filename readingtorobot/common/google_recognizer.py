@@ -0,0 +1,97 @@
+"""Concurrent requests to the Google Speech Recognition API."""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock, local
+from typing import Callable, Optional
+
+import numpy as np
+
+from .recognizers import GoogleBackend, RecognitionMetrics
+
+
+class GoogleRecognizerPool:
+    """
+    Send audio to the Google Speech Recognition API from a pool of worker threads.
+
+    Up to `workers` requests are kept in flight, so that a slow network round trip does not delay the following
+    audio. Each request is tagged with the timestamp of its audio, and results are delivered in timestamp order:
+    a result that arrives after the result of newer audio is dropped.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[str, float], None],
+        workers: int = 2,
+        language: str = "en-AU",
+        endpoint: Optional[str] = None,
+        timeout: Optional[float] = 10,
+        metrics: Optional[RecognitionMetrics] = None,
+    ) -> None:
+        """Initialize GoogleRecognizerPool.
+
+        :param callback: Function called with each recognised text and its timestamp, from the worker threads.
+        :param workers: Maximum number of requests in flight.
+        :param language: Language of the speech.
+        :param endpoint: URL of the speech API. If None, the default of the speech_recognition package is used.
+        :param timeout: Maximum duration of a request, in seconds.
+        :param metrics: Object receiving the measurements of all the workers.
+        """
+        self._logger = logging.getLogger(name=__name__)
+        self._callback = callback
+        self._language = language
+        self._endpoint = endpoint
+        self._timeout = timeout
+        self.metrics = metrics if metrics is not None else RecognitionMetrics()
+        # One backend per worker thread.
+        self._backends = local()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="GoogleRecognizer")
+        self._in_flight = BoundedSemaphore(workers)
+        self._lock = Lock()
+        self._last_delivered = float("-inf")
+
+    def submit(self, frames: np.ndarray, timestamp: float, block: bool = True) -> bool:
+        """Send audio to be recognised.
+
+        :param frames: int16 audio samples of an utterance (copied, so views of a recording buffer can be given).
+        :param timestamp: Time at which the audio was captured. Results are delivered in increasing timestamp order.
+        :param block: Wait for a free worker if all of them are busy. If False, the audio is skipped instead.
+        :return: True if the audio was sent.
+        """
+        if not self._in_flight.acquire(blocking=block):
+            self._logger.debug("All recognisers are busy, skipping audio at {:.3f}".format(timestamp))
+            return False
+        try:
+            self._executor.submit(self._recognize, np.array(frames, dtype=np.int16), timestamp)
+        except RuntimeError:
+            # The pool has been shut down.
+            self._in_flight.release()
+            return False
+        return True
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting audio, and optionally wait for the requests in flight."""
+        self._executor.shutdown(wait=wait)
+
+    def _recognize(self, frames: np.ndarray, timestamp: float) -> None:
+        """Recognise audio and deliver the result, unless the result of newer audio has already been delivered."""
+        try:
+            backend = getattr(self._backends, "backend", None)
+            if backend is None:
+                backend = GoogleBackend(self._language, self._endpoint, self._timeout, metrics=self.metrics)
+                self._backends.backend = backend
+            text = backend.recognize(frames)
+
+            with self._lock:
+                if timestamp <= self._last_delivered:
+                    self._logger.debug("Dropping stale result: '{}'".format(text))
+                    return
+                if text:
+                    self._last_delivered = timestamp
+                    try:
+                        self._callback(text, timestamp)
+                    except Exception:
+                        self._logger.exception("Could not process text: '{}'".format(text))
+        finally:
+            # Released once the result is delivered, so that a blocking callback also holds back new requests.
+            self._in_flight.release()
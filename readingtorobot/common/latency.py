@@ -0,0 +1,180 @@
+"""
+Latency measurement of the robot reactions, from the end of a sentence to the robot motion.
+
+[Requires Python 2.7 compatibility]
+"""
+import os
+import threading
+import time
+
+# Stages of a reaction, in order:
+# - captured: last audio of the sentence recorded (speech service).
+# - decoded: text of the audio recognised.
+# - matched: text matched with the book.
+# - published: command sent to the robot. No longer recorded, since it always followed "matched" immediately; kept so
+#   that the stage indices of binary commands (see `messages.Command`) do not change.
+# - received: command received by the robot.
+# - animated: robot animation started.
+STAGES = ("captured", "decoded", "matched", "published", "received", "animated")
+
+# Upper bounds (seconds) of the histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyTrace(object):
+    """
+    Timestamps of the stages of a reaction.
+
+    Timestamps are wall-clock times (`time.time`), so that stages recorded on different hosts can be compared as long
+    as their clocks are synchronised. A trace travels with its command as text: 'sad;captured=<t>;decoded=<t>...'.
+    """
+
+    SEPARATOR = ";"
+
+    def __init__(self, stamps=None):
+        """Initialize LatencyTrace.
+
+        :param stamps: (stage, timestamp) pairs already recorded, in order.
+        :type stamps: Optional[List[Tuple[str, float]]]
+        """
+        self.stamps = list(stamps or [])
+
+    def __contains__(self, stage):
+        """Check if a stage has been recorded."""
+        return any(name == stage for name, _ in self.stamps)
+
+    def mark(self, stage, timestamp=None):
+        """Record the time of a stage.
+
+        :param stage: Name of the stage (see `STAGES`).
+        :type stage: str
+        :param timestamp: Wall-clock time of the stage. If None, the current time is used.
+        :type timestamp: Optional[float]
+        """
+        self.stamps.append((stage, time.time() if timestamp is None else timestamp))
+
+    def durations(self):
+        """Return the time spent between consecutive stages, and from the first stage to the last one.
+
+        :return: (since, stage, seconds) tuples.
+        :rtype: List[Tuple[str, str, float]]
+        """
+        durations = [(a, b, tb - ta) for (a, ta), (b, tb) in zip(self.stamps, self.stamps[1:])]
+        if len(self.stamps) > 2:
+            (first, t_first), (last, t_last) = self.stamps[0], self.stamps[-1]
+            durations.append((first, last, t_last - t_first))
+        return durations
+
+    def encode(self, command):
+        """Return a command followed by the trace, as sent to the robots.
+
+        :param command: The command, e.g. 'sad'.
+        :type command: str
+        :rtype: str
+        """
+        return self.SEPARATOR.join([command] + ["{}={:.6f}".format(stage, t) for stage, t in self.stamps])
+
+    @classmethod
+    def decode(cls, payload):
+        """Split a payload into its command and its trace.
+
+        :param payload: A bare command ('sad') or a command with its trace (see `encode`).
+        :type payload: str
+        :return: The command, and its trace (None if the payload has none).
+        :rtype: Tuple[str, Optional[LatencyTrace]]
+        """
+        fields = payload.split(cls.SEPARATOR)
+        if len(fields) == 1:
+            return payload, None
+        stamps = []
+        for field in fields[1:]:
+            stage, _, timestamp = field.partition("=")
+            try:
+                stamps.append((stage, float(timestamp)))
+            except ValueError:
+                continue
+        return fields[0], cls(stamps)
+
+
+class LatencyHistograms(object):
+    """
+    Histograms of the time spent between the stages of the reactions, thread-safe.
+
+    The histograms are written in the Prometheus text format, to a file that can be read by the textfile collector
+    of the Prometheus node exporter.
+    """
+
+    NAME = "readingtorobot_reaction_latency_seconds"
+
+    def __init__(self, path=None, buckets=DEFAULT_BUCKETS):
+        """Initialize LatencyHistograms.
+
+        :param path: File the histograms are written to after each trace. If None, they are only kept in memory.
+        :type path: Optional[str]
+        :param buckets: Upper bounds of the buckets, in seconds, in increasing order.
+        :type buckets: Sequence[float]
+        """
+        self._path = path
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # (since, stage) -> [bucket counts, sum, count]
+        self._histograms = {}
+
+    def observe(self, trace):
+        """Add the durations of a trace, and write the histograms to the file.
+
+        :param trace: Trace of a reaction.
+        :type trace: LatencyTrace
+        """
+        with self._lock:
+            for since, stage, seconds in trace.durations():
+                self._add(since, stage, seconds)
+        if self._path is not None:
+            self.export(self._path)
+
+    def _add(self, since, stage, seconds):
+        """Add a duration to its histogram (with the lock held)."""
+        histogram = self._histograms.get((since, stage))
+        if histogram is None:
+            histogram = self._histograms[(since, stage)] = [[0] * len(self._buckets), 0.0, 0]
+        for i, bound in enumerate(self._buckets):
+            if seconds <= bound:
+                histogram[0][i] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+    def count(self, since, stage):
+        """Return the number of durations recorded between two stages."""
+        with self._lock:
+            histogram = self._histograms.get((since, stage))
+            return histogram[2] if histogram is not None else 0
+
+    def to_prometheus(self):
+        """Return the histograms in the Prometheus text format.
+
+        :rtype: str
+        """
+        lines = [
+            "# HELP {} Time between two stages of the robot reactions.".format(self.NAME),
+            "# TYPE {} histogram".format(self.NAME),
+        ]
+        with self._lock:
+            for (since, stage), (buckets, total, count) in sorted(self._histograms.items()):
+                labels = 'since="{}",stage="{}"'.format(since, stage)
+                for bound, bucket in zip(self._buckets, buckets):
+                    lines.append('{}_bucket{{{},le="{}"}} {}'.format(self.NAME, labels, bound, bucket))
+                lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(self.NAME, labels, count))
+                lines.append("{}_sum{{{}}} {:.6f}".format(self.NAME, labels, total))
+                lines.append("{}_count{{{}}} {}".format(self.NAME, labels, count))
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Write the histograms to a file, replacing it atomically.
+
+        :param path: Path to the file.
+        :type path: str
+        """
+        tmp = "{}.tmp".format(path)
+        with open(tmp, "w") as f:
+            f.write(self.to_prometheus())
+        os.rename(tmp, path)
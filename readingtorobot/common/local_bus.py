@@ -0,0 +1,248 @@
+"""
+In-process message bus, replacing the MQTT broker when all the clients run in the same process.
+
+[Requires Python 2.7 compatibility]
+"""
+import logging
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import paho.mqtt.client as mqtt
+
+
+class LocalBus(object):
+    """
+    Message bus with the topic semantics of an MQTT broker, for clients of the same process.
+
+    Messages are delivered to the clients subscribed to a matching topic filter ('+' and '#' wildcards), and retained
+    messages to the clients subscribing after them. Each client receives its messages in its own thread, as with a
+    network connection, so publishing never waits for the subscribers. QoS levels are accepted and ignored, since
+    messages cannot be lost, and expired messages (MQTT v5 message expiry) are discarded before delivery.
+
+    Pass a bus as the `transport` of `MQTTManager` to use it instead of a broker (see `client`). Clients connected
+    to different buses do not see each other.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self):
+        """Initialize LocalBus."""
+        self._lock = threading.Lock()
+        self._clients = []
+        # Topic -> last retained message.
+        self._retained = {}
+
+    @classmethod
+    def default(cls):
+        """Return the bus shared by the whole process."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def client(self, client_id, **kwargs):
+        """Create a client of the bus, with the methods of `paho.mqtt.client.Client` used by `MQTTManager`.
+
+        :param client_id: Identifier of the client.
+        :type client_id: str
+        :param kwargs: Options of the MQTT client (clean session, protocol...), ignored.
+        :rtype: LocalClient
+        """
+        del kwargs
+        return LocalClient(self, client_id)
+
+    def _connect(self, client):
+        """Add a client to the bus."""
+        with self._lock:
+            if client not in self._clients:
+                self._clients.append(client)
+
+    def _disconnect(self, client):
+        """Remove a client from the bus."""
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def _publish(self, message, expires_at):
+        """Deliver a message to the subscribed clients, and retain it if requested."""
+        with self._lock:
+            if message.retain:
+                if message.payload:
+                    self._retained[message.topic] = (message, expires_at)
+                else:
+                    self._retained.pop(message.topic, None)
+            clients = list(self._clients)
+        for client in clients:
+            client._deliver(message, expires_at)
+
+    def _retained_messages(self, topic_filter):
+        """Return the retained messages matching a topic filter."""
+        with self._lock:
+            return [entry for topic, entry in self._retained.items() if mqtt.topic_matches_sub(topic_filter, topic)]
+
+
+class LocalClient(object):
+    """Client of a `LocalBus`, behaving as a `paho.mqtt.client.Client` always connected."""
+
+    def __init__(self, bus, client_id):
+        """Initialize LocalClient.
+
+        :param bus: Bus of the client.
+        :type bus: LocalBus
+        :param client_id: Identifier of the client.
+        :type client_id: str
+        """
+        self._bus = bus
+        self._client_id = client_id
+        self._logger = logging.getLogger(name=__name__)
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+
+        self._lock = threading.Lock()
+        # Topic filter -> callback
+        self._callbacks = {}
+        self._subscriptions = set()
+        self._inbox = queue.Queue()
+        self._thread = None
+        self._connected = False
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        """Accept the reconnection delays, not used since the client never disconnects."""
+        del min_delay, max_delay
+
+    def message_callback_add(self, sub, callback):
+        """Set the method executed with the messages of a topic filter."""
+        with self._lock:
+            self._callbacks[sub] = callback
+
+    def message_callback_remove(self, sub):
+        """Remove the method executed with the messages of a topic filter."""
+        with self._lock:
+            self._callbacks.pop(sub, None)
+
+    def connect_async(self, *args, **kwargs):
+        """Prepare the connection to the bus, made by `loop_start`."""
+        del args, kwargs
+
+    def loop_start(self):
+        """Connect to the bus, and start delivering the messages in a new thread."""
+        if self._thread is not None:
+            return
+        self._connected = True
+        self._bus._connect(self)
+        self._thread = threading.Thread(target=self._loop, name="LocalBus-{}".format(self._client_id))
+        self._thread.daemon = True
+        self._thread.start()
+        self._inbox.put(self._on_connected)
+
+    def loop_stop(self, force=False):
+        """Leave the bus and stop delivering messages, and wait for the thread to finish unless called from it."""
+        del force
+        if self._connected:
+            self._connected = False
+            self._bus._disconnect(self)
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._inbox.put(None)
+        if thread is not threading.current_thread():
+            thread.join()
+
+    def disconnect(self, *args, **kwargs):
+        """Disconnect from the bus."""
+        del args, kwargs
+        if self._connected:
+            self._connected = False
+            self._bus._disconnect(self)
+            self._inbox.put(self._on_disconnected)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def subscribe(self, topic, qos=0, options=None, properties=None):
+        """Subscribe to one topic filter, or to a list of (topic filter, QoS) pairs."""
+        del qos, options, properties
+        topics = [topic] if not isinstance(topic, list) else [t for t, _ in topic]
+        with self._lock:
+            self._subscriptions.update(topics)
+        for topic_filter in topics:
+            for message, expires_at in self._bus._retained_messages(topic_filter):
+                self._inbox.put((message, expires_at))
+        return mqtt.MQTT_ERR_SUCCESS, 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        """Publish a message on the bus, delivered to the subscribers' queues before returning.
+
+        :param properties: MQTT v5 properties, of which only the message expiry is used.
+        :type properties: Optional[paho.mqtt.properties.Properties]
+        """
+        message = mqtt.MQTTMessage(topic=topic.encode("utf-8"))
+        message.payload = _payload_bytes(payload)
+        message.qos = qos
+        message.retain = retain
+        expiry = getattr(properties, "MessageExpiryInterval", None)
+        self._bus._publish(message, None if expiry is None else time.time() + expiry)
+        info = mqtt.MQTTMessageInfo(0)
+        info.rc = mqtt.MQTT_ERR_SUCCESS
+        # Nothing left to send, so `wait_for_publish` must not block.
+        info._set_as_published()
+        return info
+
+    def _deliver(self, message, expires_at):
+        """Queue a message for the thread of the client, if subscribed to its topic."""
+        with self._lock:
+            subscribed = any(mqtt.topic_matches_sub(sub, message.topic) for sub in self._subscriptions)
+        if subscribed:
+            self._inbox.put((message, expires_at))
+
+    def _loop(self):
+        """Execute the callbacks of the client until stopped."""
+        while True:
+            item = self._inbox.get()
+            if item is None:
+                return
+            try:
+                if callable(item):
+                    item()
+                else:
+                    self._dispatch(*item)
+            except Exception as e:
+                self._logger.error("Error in the callback of {}: {}".format(self._client_id, e))
+
+    def _dispatch(self, message, expires_at):
+        """Execute the callbacks of the topic filters matching a message."""
+        if expires_at is not None and time.time() > expires_at:
+            return
+        with self._lock:
+            callbacks = [cb for sub, cb in self._callbacks.items() if mqtt.topic_matches_sub(sub, message.topic)]
+        if not callbacks and self.on_message is not None:
+            callbacks = [self.on_message]
+        for callback in callbacks:
+            callback(self, None, message)
+
+    def _on_connected(self):
+        """Execute the connection callback."""
+        if self.on_connect is not None:
+            self.on_connect(self, None, {"session present": 0}, 0)
+
+    def _on_disconnected(self):
+        """Execute the disconnection callback."""
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, None, 0)
+
+
+def _payload_bytes(payload):
+    """Convert a payload to bytes, as the MQTT client does."""
+    if payload is None:
+        return b""
+    if isinstance(payload, (bytes, bytearray)):
+        return bytes(payload)
+    if isinstance(payload, (int, float)):
+        return str(payload).encode("ascii")
+    return payload.encode("utf-8")
@@ -0,0 +1,142 @@
+"""
+Commands sent by the speech service to the robots.
+
+[Requires Python 2.7 compatibility]
+"""
+import struct
+
+from .latency import STAGES, LatencyTrace
+
+# First byte of the binary payloads. It is not ASCII, so binary payloads cannot be mistaken for text commands.
+MAGIC = 0xA5
+VERSION = 1
+
+# magic, version, confidence, line, capture time
+_HEADER = struct.Struct("!BBfid")
+_LENGTH = struct.Struct("!B")
+_STAMP = struct.Struct("!Bd")
+
+
+class Command(object):
+    """
+    Reaction requested to a robot.
+
+    Commands are sent in a compact binary payload (see `encode`). Text payloads, a bare command ('sad') optionally
+    followed by its latency trace (see `LatencyTrace.encode`), are also accepted by `decode`.
+    """
+
+    def __init__(self, command, confidence=None, line=None, session=None, trace=None):
+        """Initialize Command.
+
+        :param command: The reaction, e.g. 'sad'.
+        :type command: str
+        :param confidence: Score (0 to 1) of the match of the recognised text with the book.
+        :type confidence: Optional[float]
+        :param line: Identifier of the matched book line (or reaction sentence).
+        :type line: Optional[int]
+        :param session: Name of the speech session that sent the command.
+        :type session: Optional[str]
+        :param trace: Latency trace of the command.
+        :type trace: Optional[LatencyTrace]
+        """
+        self.command = command
+        self.confidence = confidence
+        self.line = line
+        self.session = session
+        self.trace = trace
+
+    @property
+    def captured_at(self):
+        """Return the wall-clock time at which the audio of the command was captured, if known."""
+        if self.trace is not None:
+            for stage, timestamp in self.trace.stamps:
+                if stage == "captured":
+                    return timestamp
+        return None
+
+    def encode(self):
+        """Return the binary payload of the command.
+
+        Layout (network byte order): magic (B), version (B), confidence (f, -1 if unknown), line (i, -1 if unknown),
+        capture time (d, 0 if unknown), command and session (length (B) and UTF-8 text each), and the number of
+        other stages (B) followed by their stage index in `STAGES` (B) and time (d).
+
+        :rtype: bytes
+        """
+        stamps = []
+        if self.trace is not None:
+            stamps = [(stage, t) for stage, t in self.trace.stamps if stage != "captured" and stage in STAGES]
+        parts = [
+            _HEADER.pack(
+                MAGIC,
+                VERSION,
+                -1.0 if self.confidence is None else self.confidence,
+                -1 if self.line is None else self.line,
+                self.captured_at or 0.0,
+            ),
+            _encode_text(self.command),
+            _encode_text(self.session or ""),
+            _LENGTH.pack(len(stamps)),
+        ]
+        parts += [_STAMP.pack(STAGES.index(stage), timestamp) for stage, timestamp in stamps]
+        return b"".join(parts)
+
+    @classmethod
+    def decode(cls, payload):
+        """Decode a binary or text payload.
+
+        :param payload: Payload of an MQTT message.
+        :type payload: bytes
+        :rtype: Command
+        :raises ValueError: If the payload is binary but malformed, or of an unknown version.
+        """
+        if not isinstance(payload, (bytes, bytearray)):
+            # Text (unicode on Python 2)
+            command, trace = LatencyTrace.decode(payload)
+            return cls(command, trace=trace)
+        data = bytearray(payload)
+        if not data or data[0] != MAGIC:
+            command, trace = LatencyTrace.decode(data.decode("utf-8"))
+            return cls(command, trace=trace)
+
+        try:
+            _, version, confidence, line, captured_at = _HEADER.unpack_from(data, 0)
+            if version != VERSION:
+                raise ValueError("Unsupported command version: {}".format(version))
+            offset = _HEADER.size
+            command, offset = _decode_text(data, offset)
+            session, offset = _decode_text(data, offset)
+            (count,) = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            stamps = [("captured", captured_at)] if captured_at else []
+            for _ in range(count):
+                stage, timestamp = _STAMP.unpack_from(data, offset)
+                offset += _STAMP.size
+                # Stages added by later versions are skipped.
+                if stage < len(STAGES):
+                    stamps.append((STAGES[stage], timestamp))
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise ValueError("Malformed command: {}".format(e))
+
+        return cls(
+            command,
+            confidence=None if confidence < 0 else confidence,
+            line=None if line < 0 else line,
+            session=session or None,
+            trace=LatencyTrace(stamps) if stamps else None,
+        )
+
+
+def _encode_text(text):
+    """Return a short text as its length followed by its UTF-8 bytes."""
+    data = text.encode("utf-8")[:255]
+    return _LENGTH.pack(len(data)) + data
+
+
+def _decode_text(data, offset):
+    """Return the short text at an offset of a payload, and the offset after it."""
+    (length,) = _LENGTH.unpack_from(data, offset)
+    start = offset + _LENGTH.size
+    if start + length > len(data):
+        raise IndexError("text out of bounds")
+    return bytes(data[start : start + length]).decode("utf-8"), start + length
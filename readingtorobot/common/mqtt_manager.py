@@ -5,84 +5,286 @@ Communication manager using the MQTT protocol.
 """
 
 import logging
+import os
+import socket
+import threading
 import time
-from builtins import range
 
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+from .messages import Command
+
+# QoS of the topics (or topic filters) without a QoS given. Commands are delivered at least once, so that the ones
+# sent while a client reconnects are not lost.
+DEFAULT_QOS = {"+/stop": 1, "speech/cmd": 1, "speech/+/cmd": 1}
+# Time, in seconds, after which the broker discards the messages of a topic not delivered yet (MQTT v5 only). A
+# reaction is pointless once the reader has moved on.
+DEFAULT_MESSAGE_EXPIRY = {"speech/cmd": 5, "speech/+/cmd": 5}
 
 
 class MQTTManager:
-    """Manager for MQTT communication between processes of the application."""
+    """
+    Manager for MQTT communication between processes of the application.
+
+    The connection is made in the background by the network thread of the client, which reconnects with exponential
+    backoff (from `reconnect_min_delay` to `reconnect_max_delay` seconds) whenever it is lost, and subscribes again
+    to all the topics once connected.
 
-    def __init__(self, name, stop_function, process_text_function=None, timeout=20, server_ip=None):
+    The session is persistent by default: the broker keeps the subscriptions, and the QoS 1 and 2 messages sent to
+    the client, while it is disconnected (for up to `session_expiry` seconds with MQTT v5). Messages of topics with a
+    message expiry are discarded by the broker once expired. The default client ID is unique to the process, so the
+    session survives reconnections but not restarts; pass a stable `client_id` to resume it after a restart.
+
+    When all the clients run in the same process, a `LocalBus` can replace the broker (see `transport`).
+    """
+
+    def __init__(
+        self,
+        name,
+        stop_function,
+        process_text_function=None,
+        timeout=20,
+        server_ip=None,
+        speech_topic="speech/cmd",
+        reconnect_min_delay=0.1,
+        reconnect_max_delay=0.5,
+        server_port=1883,
+        qos=None,
+        message_expiry=None,
+        clean_session=False,
+        session_expiry=600,
+        client_id=None,
+        protocol=mqtt.MQTTv5,
+        transport=None,
+    ):
         """Initialize MQTT Manager.
 
         :param name: Identifier for this MQTT client.
         :type name: str
         :param stop_function: Method to be executed when the 'stop' command is received.
         :type stop_function: Callable
-        :param process_text_function: Method to be executed when the 'speech/cmd' command is received.
-        :type process_text_function: Optional[Callable]
-        :param timeout: MQTT connection timeout.
-        :type timeout: int
+        :param process_text_function: Method to be executed with the `Command` received in `speech_topic`.
+        :type process_text_function: Optional[Callable[[Command], Any]]
+        :param timeout: Maximum time waited for the connection by `start(wait=True)`, in seconds.
+        :type timeout: float
         :param server_ip: Ip of the MQTT server. When not specified, localhost is used.
         :type server_ip: Optional[str]
+        :param speech_topic: Topic of the commands of the speech service ('speech/<session>/cmd' to follow a single
+            session of a multi-session service), or None for clients not receiving commands.
+        :type speech_topic: Optional[str]
+        :param reconnect_min_delay: Delay before the first reconnection attempt, in seconds.
+        :type reconnect_min_delay: float
+        :param reconnect_max_delay: Maximum delay between reconnection attempts, in seconds.
+        :type reconnect_max_delay: float
+        :param server_port: Port of the MQTT server.
+        :type server_port: int
+        :param qos: QoS of the subscriptions and publications of each topic (or topic filter), added to `DEFAULT_QOS`.
+            Other topics use QoS 0.
+        :type qos: Optional[Dict[str, int]]
+        :param message_expiry: Expiry of the messages published on each topic (or topic filter), in seconds, added to
+            `DEFAULT_MESSAGE_EXPIRY`. MQTT v5 only.
+        :type message_expiry: Optional[Dict[str, float]]
+        :param clean_session: If True, the broker discards the session of the client on every connection.
+        :type clean_session: bool
+        :param session_expiry: Time the broker keeps the session after a disconnection, in seconds. MQTT v5 only
+            (with MQTT v3.1.1, persistent sessions are kept until the broker decides otherwise).
+        :type session_expiry: int
+        :param client_id: Client ID, which must be unique on the broker: a client connecting with the ID of another
+            one takes over its session and disconnects it. By default, `name` followed by the host name and the
+            process ID.
+        :type client_id: Optional[str]
+        :param protocol: MQTT version, `mqtt.MQTTv5` or `mqtt.MQTTv311`.
+        :type protocol: int
+        :param transport: Bus creating the client, e.g. a `LocalBus`. If None, the client connects to the MQTT server.
+        :type transport: Optional[LocalBus]
         """
         self._process_text = process_text_function or (lambda _: None)
         self._stop = stop_function
         self._name = name
+        self._client_id = client_id or "{}-{}-{}".format(name, socket.gethostname(), os.getpid())
         self._logger = logging.getLogger(name=__name__)
 
+        self._server_ip = server_ip or "localhost"
+        self._server_port = server_port
+        self._mqtt_timeout = timeout
+        self._qos = dict(DEFAULT_QOS, **(qos or {}))
+        self._message_expiry = dict(DEFAULT_MESSAGE_EXPIRY, **(message_expiry or {}))
+        self._clean_session = clean_session
+        self._session_expiry = session_expiry
+        self._protocol = protocol
+        self._connected = threading.Event()
+        # Subscribed topics and their QoS, subscribed again on every connection.
+        self._subscriptions = {}
+        self._subscriptions_lock = threading.Lock()
+
         # Connection to command server
-        self._client = mqtt.Client(self._name)
-        self._client.message_callback_add("{}/stop".format(self._name), self._stop_callback)
-        self._client.message_callback_add("speech/cmd", self._process_text_callback)
+        if transport is not None:
+            self._client = transport.client(self._client_id, clean_session=clean_session, protocol=protocol)
+        elif protocol == mqtt.MQTTv5:
+            self._client = mqtt.Client(self._client_id, protocol=protocol)
+        else:
+            self._client = mqtt.Client(self._client_id, clean_session=clean_session, protocol=protocol)
+        self._client.reconnect_delay_set(min_delay=reconnect_min_delay, max_delay=reconnect_max_delay)
         self._client.on_connect = self._on_connect
-        self._client.connect(server_ip or "localhost")
-        self._client.subscribe("{}/stop".format(self._name), 0)
-        self._client.subscribe("speech/cmd", 0)
-        self._mqtt_timeout = timeout
-        self._connected_flag = False
+        self._client.on_disconnect = self._on_disconnect
+        self._client.message_callback_add("{}/stop".format(self._name), self._stop_callback)
+        self._subscribe("{}/stop".format(self._name))
+        if speech_topic is not None:
+            self._client.message_callback_add(speech_topic, self._process_text_callback)
+            self._subscribe(speech_topic)
+
+    @property
+    def client_id(self):
+        """Return the ID of the client on the MQTT server."""
+        return self._client_id
 
-    def start(self):
-        """Wait for connection to MQTT server."""
+    @property
+    def connected(self):
+        """Check if the client is connected to the MQTT server."""
+        return self._connected.is_set()
+
+    def start(self, wait=False):
+        """Connect to the MQTT server in the background.
+
+        :param wait: If True, wait until the client is connected, for at most `timeout` seconds.
+        :type wait: bool
+        :return: True if the client is connected.
+        :rtype: bool
+        """
+        if self._protocol == mqtt.MQTTv5:
+            properties = Properties(PacketTypes.CONNECT)
+            properties.SessionExpiryInterval = 0 if self._clean_session else self._session_expiry
+            self._client.connect_async(
+                self._server_ip, self._server_port, clean_start=self._clean_session, properties=properties
+            )
+        else:
+            self._client.connect_async(self._server_ip, self._server_port)
         self._client.loop_start()
-        try:
-            for _ in range(self._mqtt_timeout):
-                if self._connected_flag:
-                    break
-                time.sleep(1)
-        except TimeoutError:
-            self._logger.error("MQTT connection timed out, exiting.")
-            raise
-
-    def publish(self, *args, **kwargs):
-        """Publish message on mqtt topic."""
-        self._client.publish(*args, **kwargs)
-
-    def _on_connect(self, client, userdata, flags, rc):
+        if wait:
+            return self.wait_connected()
+        return self.connected
+
+    def wait_connected(self, timeout=None):
+        """Wait until the client is connected to the MQTT server.
+
+        :param timeout: Maximum time to wait, in seconds. If None, the `timeout` given on creation is used.
+        :type timeout: Optional[float]
+        :return: True if the client is connected.
+        :rtype: bool
+        """
+        if not self._connected.wait(self._mqtt_timeout if timeout is None else timeout):
+            self._logger.warning("Not connected to the MQTT broker yet, still trying in the background.")
+        return self.connected
+
+    def disconnect(self):
+        """Disconnect from the MQTT server, and stop the network thread.
+
+        The broker keeps the session, unless it is not persistent (see `clean_session`).
+        """
+        self._client.disconnect()
+        self._client.loop_stop()
+
+    def add_callback(self, topic, callback, qos=None):
+        """Subscribe to a topic, executing a method with the payload of every message received.
+
+        :param topic: Topic to subscribe to.
+        :type topic: str
+        :param callback: Method to be executed with the decoded payload of each message.
+        :type callback: Callable[[str], Any]
+        :param qos: Subscription QoS level. If None, the QoS configured for the topic is used.
+        :type qos: Optional[int]
+        """
+
+        def _callback(cli, obj, msg):
+            del cli, obj
+            callback(msg.payload.decode("utf-8"))
+
+        self._client.message_callback_add(topic, _callback)
+        self._subscribe(topic, qos)
+
+    def _subscribe(self, topic, qos=None):
+        """Subscribe to a topic now if connected, and on every connection."""
+        if qos is None:
+            qos = _topic_setting(self._qos, topic, 0)
+        with self._subscriptions_lock:
+            self._subscriptions[topic] = qos
+            if self.connected:
+                self._client.subscribe(topic, qos)
+
+    def publish(self, topic, payload=None, qos=None, retain=False, expiry=None):
+        """Publish message on mqtt topic.
+
+        :param topic: Topic of the message.
+        :type topic: str
+        :param payload: Payload of the message.
+        :type payload: Union[bytes, str, int, float, None]
+        :param qos: QoS level. If None, the QoS configured for the topic is used.
+        :type qos: Optional[int]
+        :param retain: If True, the broker keeps the message for future subscribers.
+        :type retain: bool
+        :param expiry: Time after which the broker discards the message, in seconds (MQTT v5 only). If None, the
+            expiry configured for the topic is used.
+        :type expiry: Optional[float]
+        :rtype: mqtt.MQTTMessageInfo
+        """
+        if qos is None:
+            qos = _topic_setting(self._qos, topic, 0)
+        if expiry is None:
+            expiry = _topic_setting(self._message_expiry, topic, None)
+        properties = None
+        if expiry is not None and self._protocol == mqtt.MQTTv5:
+            properties = Properties(PacketTypes.PUBLISH)
+            properties.MessageExpiryInterval = max(1, int(round(expiry)))
+        return self._client.publish(topic, payload, qos, retain, properties)
+
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
         """Detect connection to MQTT server.
 
         See documentation in the Paho MQTT package for 'Client.on_connect'.
 
         :param client: Unused.
         :param userdata: Unused.
-        :Param flags: Unused.
+        :param flags: Connection flags, whether the broker resumed a previous session.
+        :type flags: Dict[str, int]
         :param rc: The connection result.
         :type rc: int
+        :param properties: Unused (MQTT v5 only).
         """
         # Delete unaccessed variables.
-        del client, userdata, flags
+        del client, userdata, properties
         if rc == 0:
-            self._connected_flag = True
-            self._logger.info("Connected to MQTT broker.")
+            resumed = " (session resumed)" if flags.get("session present") else ""
+            self._logger.info("Connected to MQTT broker{}.".format(resumed))
+            with self._subscriptions_lock:
+                self._connected.set()
+                if self._subscriptions:
+                    self._client.subscribe(list(self._subscriptions.items()))
             self._client.publish("{}/started".format(self._name), 1)
         else:
             self._logger.error("Bad connection to mqtt, returned code: {}".format(rc))
             self._client.publish("{}/started".format(self._name), 0)
 
+    def _on_disconnect(self, client, userdata, rc, properties=None):
+        """Detect the loss of the connection to the MQTT server.
+
+        :param client: Unused.
+        :param userdata: Unused.
+        :param rc: The disconnection result (0 if requested by this client).
+        :type rc: int
+        :param properties: Unused (MQTT v5 only).
+        """
+        del client, userdata, properties
+        self._connected.clear()
+        if rc != 0:
+            self._logger.warning("Lost connection to MQTT broker ({}), reconnecting.".format(rc))
+
     def _stop_callback(self, cli, obj, msg):
-        """Run stop function and send success response when finished.
+        """Run stop function in a new thread.
+
+        The network thread has to return, to acknowledge the message. Otherwise, the broker would send it again when
+        the persistent session is resumed.
 
         :param cli: Unused.
         :param obj: Unused.
@@ -92,12 +294,16 @@ class MQTTManager:
         # Delete unaccessed variables.
         del cli, obj
         self._logger.info("Stop message recieved: {}".format(msg.topic))
+        threading.Thread(target=self._run_stop, name="MQTTStop").start()
+
+    def _run_stop(self):
+        """Run stop function and send success response when finished."""
         self._stop()
         # Add mqtt response saying we finished.
         self._logger.info("Sending response.")
-        self._client.publish("nao/stopped_clean", "0")
+        self._client.publish("{}/stopped_clean".format(self._name), "0")
         time.sleep(1)
-        self._client.loop_stop()
+        self.disconnect()
 
     def _process_text_callback(self, cli, obj, msg):
         """Run process text function on msg recieved.
@@ -109,4 +315,19 @@ class MQTTManager:
         """
         # Delete unaccessed variables
         del cli, obj
-        self._process_text(msg.payload.decode("ascii"))
+        try:
+            command = Command.decode(msg.payload)
+        except ValueError as e:
+            self._logger.warning("Invalid command on {}: {}".format(msg.topic, e))
+            return
+        self._process_text(command)
+
+
+def _topic_setting(settings, topic, default):
+    """Return the setting of a topic, given by the topic itself or by the first topic filter matching it."""
+    if topic in settings:
+        return settings[topic]
+    for topic_filter, value in settings.items():
+        if mqtt.topic_matches_sub(topic_filter, topic):
+            return value
+    return default
@@ -0,0 +1,183 @@
+"""
+Scheduling of the robot reactions, shared by all robots.
+
+[Requires Python 2.7 compatibility]
+"""
+import logging
+import threading
+import time
+
+from .feelings import Feel
+
+# The interaction starting and final animations go before reactions to the text, and are never held back. These are
+# the priorities of all the reactions, from the commands received (see `FeelingReaction`) to the robot animations.
+DEFAULT_PRIORITIES = {Feel.START: 1, Feel.END: 1}
+DEFAULT_COOLDOWNS = {Feel.START: 0.0, Feel.END: 0.0}
+
+
+class ReactionScheduler(object):
+    """
+    Queue of the reactions a robot has to play, thread-safe.
+
+    Reactions are submitted by `do_feel` and taken by the thread playing the animations with `next`. The scheduler
+    makes sure that:
+
+    - The same kind of reaction (e.g. Feel.SAD) is not played twice within its cooldown.
+    - At most `max_queued` reactions wait. When full, the least important waiting reaction (lowest priority, then
+      oldest) is dropped, or the new one if it is less important than all the waiting ones.
+    - Reactions submitted more than `max_age` seconds ago are dropped, instead of playing seconds after the sentence
+      that triggered them.
+
+    Idle or background animations should check `pending` (or `wait` on the scheduler instead of sleeping) and give
+    way to the reactions as soon as one is submitted.
+    """
+
+    def __init__(self, cooldown=4.0, cooldowns=None, priorities=None, max_queued=1, max_age=2.0, clock=time.time):
+        """Initialize ReactionScheduler.
+
+        :param cooldown: Minimum time, in seconds, between two reactions of the same kind.
+        :type cooldown: float
+        :param cooldowns: Cooldown of specific kinds of reaction (by default, none for Feel.START and Feel.END).
+        :type cooldowns: Optional[Dict[Any, float]]
+        :param priorities: Priority of specific kinds of reaction, 0 by default (by default, 1 for Feel.START and
+            Feel.END).
+        :type priorities: Optional[Dict[Any, int]]
+        :param max_queued: Maximum number of reactions waiting to be played.
+        :type max_queued: int
+        :param max_age: Maximum time, in seconds, between the creation of a reaction and the moment it is played (None
+            to wait forever).
+        :type max_age: Optional[float]
+        :param clock: Function returning the current time, in seconds.
+        :type clock: Callable[[], float]
+        """
+        self._cooldown = cooldown
+        self._cooldowns = DEFAULT_COOLDOWNS if cooldowns is None else cooldowns
+        self._priorities = DEFAULT_PRIORITIES if priorities is None else priorities
+        self._max_queued = max_queued
+        self._max_age = max_age
+        self._clock = clock
+        self._logger = logging.getLogger(name=__name__)
+
+        # Waiting reactions, in submission order, as (priority, creation time, kind, reaction).
+        self._queue = []
+        # Kind of reaction -> time it was last played.
+        self._last_played = {}
+        self._closed = False
+        self._condition = threading.Condition()
+
+    @property
+    def pending(self):
+        """Check if reactions are waiting to be played."""
+        with self._condition:
+            return bool(self._queue)
+
+    def submit(self, kind, reaction=None, created_at=None, priority=None):
+        """Add a reaction to the queue.
+
+        :param kind: Kind of the reaction, for its cooldown and priority, e.g. Feel.SAD.
+        :type kind: Any
+        :param reaction: What `next` returns for this reaction (the kind itself if None), e.g. an animation.
+        :type reaction: Any
+        :param created_at: Time at which the reaction was triggered (now if None), on the clock of the scheduler.
+        :type created_at: Optional[float]
+        :param priority: Priority of the reaction. If None, the priority of its kind.
+        :type priority: Optional[int]
+        :return: True if the reaction has been queued.
+        :rtype: bool
+        """
+        now = self._clock()
+        if priority is None:
+            priority = self._priorities.get(kind, 0)
+        entry = (priority, now if created_at is None else created_at, kind, kind if reaction is None else reaction)
+        with self._condition:
+            if self._closed:
+                return False
+            if self._cooling_down(kind, now):
+                self._logger.debug("Dropping reaction {}, played recently.".format(kind))
+                return False
+            if len(self._queue) >= self._max_queued:
+                # Least important: lowest priority, then oldest.
+                weakest = min(self._queue, key=lambda e: e[:2])
+                if weakest[0] > priority:
+                    self._logger.debug("Dropping reaction {}, the queue is full.".format(kind))
+                    return False
+                self._queue.remove(weakest)
+                self._logger.debug("Dropping reaction {}, replaced by {}.".format(weakest[2], kind))
+            self._queue.append(entry)
+            self._condition.notify_all()
+        return True
+
+    def next(self, timeout=0):
+        """Take the next reaction to play, most important first.
+
+        The reaction is considered played from now on, for its cooldown.
+
+        :param timeout: Maximum time to wait for a reaction, in seconds. If None, wait until there is one or the
+            scheduler is closed.
+        :type timeout: Optional[float]
+        :return: The reaction, or None if there is none to play.
+        :rtype: Any
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                entry = self._pop()
+                if entry is not None:
+                    return entry[3]
+                if self._closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+
+    def wait(self, timeout=None):
+        """Wait until a reaction is submitted, e.g. instead of sleeping between idle animations.
+
+        :param timeout: Maximum time to wait, in seconds. If None, wait until there is one or the scheduler is closed.
+        :type timeout: Optional[float]
+        :return: True if reactions are waiting to be played.
+        :rtype: bool
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while not self._queue:
+                if self._closed:
+                    return False
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def clear(self):
+        """Drop all the waiting reactions."""
+        with self._condition:
+            self._queue = []
+
+    def close(self):
+        """Drop all the waiting reactions and refuse new ones, waking up the threads waiting for them."""
+        with self._condition:
+            self._closed = True
+            self._queue = []
+            self._condition.notify_all()
+
+    def _pop(self):
+        """Remove and return the most important reaction that can be played (with the lock held)."""
+        now = self._clock()
+        if self._max_age is not None:
+            for entry in [e for e in self._queue if now - e[1] > self._max_age]:
+                self._logger.warning("Dropping stale reaction {}.".format(entry[2]))
+                self._queue.remove(entry)
+        for entry in sorted(self._queue, key=lambda e: (-e[0], e[1])):
+            self._queue.remove(entry)
+            if self._cooling_down(entry[2], now):
+                continue
+            self._last_played[entry[2]] = now
+            return entry
+        return None
+
+    def _cooling_down(self, kind, now):
+        """Check if a kind of reaction has been played within its cooldown (with the lock held)."""
+        last = self._last_played.get(kind)
+        return last is not None and now - last < self._cooldowns.get(kind, self._cooldown)
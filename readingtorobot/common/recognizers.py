@@ -0,0 +1,350 @@
+"""Speech recognition engines, behind a common streaming interface."""
+
+import collections
+import logging
+import time
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import speech_recognition as sr
+
+DEFAULT_SAMPLE_RATE = 16000
+
+
+class RecognitionMetrics:
+    """
+    Accumulate the cost of speech recognition, shared by any number of backends and threads.
+
+    - Latency: time between the end of the audio of an utterance (`finish`) and its text.
+    - Real-time factor: processing time divided by the duration of the audio processed.
+    """
+
+    def __init__(self, max_samples: int = 1000) -> None:
+        """Initialize RecognitionMetrics.
+
+        :param max_samples: Number of recent latencies kept to compute percentiles.
+        """
+        self._lock = Lock()
+        self._latencies: "collections.deque[float]" = collections.deque(maxlen=max_samples)
+        self.utterances = 0
+        self.audio_seconds = 0.0
+        self.processing_seconds = 0.0
+
+    def record(self, audio_seconds: float, processing_seconds: float, latency: float) -> None:
+        """Add a decoded utterance.
+
+        :param audio_seconds: Duration of the audio of the utterance.
+        :param processing_seconds: Total time spent decoding the utterance.
+        :param latency: Time spent finishing the utterance.
+        """
+        with self._lock:
+            self.utterances += 1
+            self.audio_seconds += audio_seconds
+            self.processing_seconds += processing_seconds
+            self._latencies.append(latency)
+
+    def reset(self) -> None:
+        """Clear all the measurements."""
+        with self._lock:
+            self._latencies.clear()
+            self.utterances = 0
+            self.audio_seconds = 0.0
+            self.processing_seconds = 0.0
+
+    @property
+    def real_time_factor(self) -> float:
+        """Return the processing time per second of audio."""
+        return self.processing_seconds / self.audio_seconds if self.audio_seconds else 0.0
+
+    def latency_percentile(self, percentile: float) -> float:
+        """Return a percentile (0 to 100) of the recent latencies, in seconds."""
+        with self._lock:
+            latencies = list(self._latencies)
+        return float(np.percentile(latencies, percentile)) if latencies else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """Return all the metrics in a dictionary."""
+        return {
+            "utterances": self.utterances,
+            "audio_seconds": self.audio_seconds,
+            "processing_seconds": self.processing_seconds,
+            "real_time_factor": self.real_time_factor,
+            "latency_p50": self.latency_percentile(50),
+            "latency_p95": self.latency_percentile(95),
+        }
+
+    def __str__(self) -> str:
+        """Describe the metrics."""
+        return (
+            "{utterances} utterances, {audio_seconds:.1f} s of audio, real-time factor {real_time_factor:.3f}, "
+            "latency p50 {latency_p50:.3f} s, p95 {latency_p95:.3f} s".format(**self.summary())
+        )
+
+
+class RecognizerBackend:
+    """
+    Base class of the speech recognition engines.
+
+    Audio of an utterance is given with `feed`, `partial` returns the text recognised so far, and `finish` returns
+    the final text and gets ready for the next utterance. Subclasses implement `_feed`, `_partial`, `_finish` and
+    `_reset`; the time spent in them is reported to the metrics object.
+    """
+
+    # True if the engine decodes audio as it is fed, so that partial results are available.
+    streaming = False
+
+    def __init__(self, sample_rate: int = DEFAULT_SAMPLE_RATE, metrics: Optional[RecognitionMetrics] = None) -> None:
+        """Initialize RecognizerBackend.
+
+        :param sample_rate: Sample rate of the audio.
+        :param metrics: Object receiving the measurements. If None, a new one is created.
+        """
+        self._logger = logging.getLogger(name=__name__)
+        self.sample_rate = sample_rate
+        self.metrics = metrics if metrics is not None else RecognitionMetrics()
+        self._samples = 0
+        self._processing = 0.0
+
+    def feed(self, frames: np.ndarray) -> None:
+        """Add audio (int16 samples) to the current utterance."""
+        start = time.perf_counter()
+        self._feed(frames)
+        self._samples += len(frames)
+        self._processing += time.perf_counter() - start
+
+    def partial(self) -> str:
+        """Return the text recognised so far in the current utterance."""
+        start = time.perf_counter()
+        text = self._partial()
+        self._processing += time.perf_counter() - start
+        return text
+
+    def finish(self) -> str:
+        """Return the text of the current utterance, and start a new one."""
+        start = time.perf_counter()
+        try:
+            text = self._finish()
+        finally:
+            latency = time.perf_counter() - start
+            self.metrics.record(self._samples / self.sample_rate, self._processing + latency, latency)
+            self._samples = 0
+            self._processing = 0.0
+        return text
+
+    def recognize(self, frames: np.ndarray) -> str:
+        """Return the text of a complete utterance."""
+        self.feed(frames)
+        return self.finish()
+
+    def reset(self) -> None:
+        """Discard the current utterance."""
+        self._reset()
+        self._samples = 0
+        self._processing = 0.0
+
+    def close(self) -> None:
+        """Release the resources of the engine."""
+        self.reset()
+
+    def _feed(self, frames: np.ndarray) -> None:
+        """Add audio to the current utterance."""
+        raise NotImplementedError
+
+    def _partial(self) -> str:
+        """Return the text recognised so far, if the engine supports it."""
+        return ""
+
+    def _finish(self) -> str:
+        """Return the text of the current utterance and clear it."""
+        raise NotImplementedError
+
+    def _reset(self) -> None:
+        """Clear the current utterance."""
+
+
+class DeepSpeechBackend(RecognizerBackend):
+    """
+    DeepSpeech model, decoding one stream per utterance.
+
+    A model is not safe for concurrent use, so backends sharing a model (e.g. the sessions of `MultiSpeechService`)
+    must share its lock: each call to the model or its streams holds it.
+    """
+
+    streaming = True
+
+    def __init__(
+        self,
+        model,
+        sample_rate: int = DEFAULT_SAMPLE_RATE,
+        metrics: Optional[RecognitionMetrics] = None,
+        lock: Optional[Lock] = None,
+    ):
+        """Initialize DeepSpeechBackend.
+
+        :param model: DeepSpeech model (see `deepspeech_module.load_deepspeech_model`).
+        :param sample_rate: Sample rate of the audio.
+        :param metrics: Object receiving the measurements.
+        :param lock: Lock of the model (see `deepspeech_module.model_lock`). If None, the model is not shared.
+        """
+        super().__init__(sample_rate, metrics)
+        self._model = model
+        self._model_lock = lock if lock is not None else Lock()
+        self._stream = None
+
+    def _feed(self, frames: np.ndarray) -> None:
+        with self._model_lock:
+            if self._stream is None:
+                self._stream = self._model.createStream()
+            self._stream.feedAudioContent(frames)
+
+    def _partial(self) -> str:
+        with self._model_lock:
+            return self._stream.intermediateDecode() if self._stream is not None else ""
+
+    def _finish(self) -> str:
+        if self._stream is None:
+            return ""
+        stream, self._stream = self._stream, None
+        with self._model_lock:
+            return stream.finishStream()
+
+    def _reset(self) -> None:
+        if self._stream is not None:
+            with self._model_lock:
+                self._stream.freeStream()
+            self._stream = None
+
+
+def best_transcript(query) -> str:
+    """Return the most likely transcript of a raw Google Speech Recognition response (empty if there is none)."""
+    if not query:
+        return ""
+    if "confidence" in query["alternative"][0]:
+        # return alternative with highest confidence score
+        best_hypothesis = max(query["alternative"], key=lambda alternative: alternative.get("confidence", 0))
+    else:
+        # when there is no confidence available, we arbitrarily choose the first hypothesis.
+        best_hypothesis = query["alternative"][0]
+    return best_hypothesis["transcript"]
+
+
+class GoogleBackend(RecognizerBackend):
+    """Google Speech Recognition API. The audio of an utterance is sent in a single request when it is finished."""
+
+    def __init__(
+        self,
+        language: str = "en-AU",
+        endpoint: Optional[str] = None,
+        timeout: Optional[float] = 10,
+        sample_rate: int = DEFAULT_SAMPLE_RATE,
+        metrics: Optional[RecognitionMetrics] = None,
+    ) -> None:
+        """Initialize GoogleBackend.
+
+        :param language: Language of the speech.
+        :param endpoint: URL of the speech API. If None, the default of the speech_recognition package is used.
+        :param timeout: Maximum duration of a request, in seconds.
+        :param sample_rate: Sample rate of the audio.
+        :param metrics: Object receiving the measurements.
+        """
+        super().__init__(sample_rate, metrics)
+        self._language = language
+        self._endpoint = endpoint
+        self._recognizer = sr.Recognizer()
+        self._recognizer.operation_timeout = timeout
+        self._chunks: List[np.ndarray] = []
+
+    def _feed(self, frames: np.ndarray) -> None:
+        # The audio is only read by `finish`: the frames must not be overwritten before.
+        self._chunks.append(frames)
+
+    def _finish(self) -> str:
+        frames = self._chunks[0] if len(self._chunks) == 1 else np.concatenate(self._chunks or [np.zeros(0, np.int16)])
+        audio = sr.AudioData(memoryview(np.ascontiguousarray(frames)).cast("B"), self.sample_rate, 2)
+        self._chunks = []
+        kwargs = {"endpoint": self._endpoint} if self._endpoint is not None else {}
+        try:
+            return best_transcript(
+                self._recognizer.recognize_google(audio, show_all=True, language=self._language, **kwargs)
+            )
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            self._logger.warning("Speech recognition request failed: {}".format(e))
+            return ""
+
+    def _reset(self) -> None:
+        self._chunks = []
+
+
+class ReplayBackend(RecognizerBackend):
+    """
+    Mock engine returning transcripts read from a file (one per line), in order, for each finished utterance.
+
+    The decoding time of a real engine can be simulated with a fixed real-time factor.
+    """
+
+    streaming = True
+
+    def __init__(
+        self,
+        transcripts: Union[str, Iterable[str]],
+        real_time_factor: float = 0.0,
+        sample_rate: int = DEFAULT_SAMPLE_RATE,
+        metrics: Optional[RecognitionMetrics] = None,
+    ) -> None:
+        """Initialize ReplayBackend.
+
+        :param transcripts: Path to the file with the transcripts, or the transcripts themselves.
+        :param real_time_factor: Time spent decoding per second of audio.
+        :param sample_rate: Sample rate of the audio.
+        :param metrics: Object receiving the measurements.
+        """
+        super().__init__(sample_rate, metrics)
+        if isinstance(transcripts, str):
+            with open(transcripts, "r") as f:
+                transcripts = [line.strip() for line in f if line.strip()]
+        self._transcripts = list(transcripts)
+        if not self._transcripts:
+            raise ValueError("No transcripts to replay.")
+        self._index = 0
+        self._real_time_factor = real_time_factor
+
+    def _feed(self, frames: np.ndarray) -> None:
+        if self._real_time_factor:
+            time.sleep(self._real_time_factor * len(frames) / self.sample_rate)
+
+    def _partial(self) -> str:
+        # Reveal the words of the next transcript in proportion to the audio fed so far (assuming 0.4 s per word).
+        words = self._transcripts[self._index].split(" ")
+        return " ".join(words[: int(self._samples / self.sample_rate / 0.4)])
+
+    def _finish(self) -> str:
+        text = self._transcripts[self._index]
+        self._index = (self._index + 1) % len(self._transcripts)
+        return text
+
+
+def create_backend(
+    interpreter: str, configuration: dict, metrics: Optional[RecognitionMetrics] = None
+) -> RecognizerBackend:
+    """Create the recognizer backend selected in a configuration.
+
+    :param interpreter: 'ds' for DeepSpeech, 'gc' for Google Cloud or 'replay' for transcripts read from the
+        `replay_file` of the configuration.
+    :param configuration: Speech recognition configuration.
+    :param metrics: Object receiving the measurements.
+    """
+    if interpreter == "ds":
+        from .deepspeech_module import load_deepspeech_model, model_lock
+
+        model = load_deepspeech_model(configuration)
+        return DeepSpeechBackend(model, metrics=metrics, lock=model_lock(model))
+    if interpreter == "gc":
+        return GoogleBackend(endpoint=configuration.get("gc_endpoint", None), metrics=metrics)
+    if interpreter == "replay":
+        return ReplayBackend(
+            configuration["replay_file"], configuration.get("replay_real_time_factor", 0.0), metrics=metrics
+        )
+    raise ValueError("Unknown interpreter: {}".format(interpreter))
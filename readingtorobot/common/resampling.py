@@ -0,0 +1,98 @@
+"""Streaming sample rate conversion for the audio input."""
+
+from math import gcd
+
+import numpy as np
+from scipy import signal, sparse
+
+
+def resample_block(data: np.ndarray, input_rate: int, output_rate: int) -> np.ndarray:
+    """Resample an isolated block of audio with an FFT-based method.
+
+    :param data: Input samples.
+    :param input_rate: Sample rate of `data`.
+    :param output_rate: Required sample rate.
+    :return: Resampled block.
+    """
+    return signal.resample(data, int(len(data) / input_rate * output_rate))
+
+
+class StreamingResampler:
+    """
+    Polyphase FIR resampler that keeps its filter state between blocks.
+
+    It uses the same anti-aliasing filter as `scipy.signal.resample_poly`, but the input history is carried over from
+    one block to the next, so consecutive blocks are filtered as one continuous signal instead of being resampled in
+    isolation. The output is delayed by the filter's group delay (under 1 ms at the supported rates).
+    """
+
+    MAX_CACHED_MATRICES = 4
+
+    def __init__(self, input_rate: int, output_rate: int, window=("kaiser", 5.0)) -> None:
+        """Initialize StreamingResampler.
+
+        :param input_rate: Sample rate of the incoming blocks.
+        :param output_rate: Required sample rate.
+        :param window: Window used to design the low-pass filter (see `scipy.signal.firwin`).
+        """
+        div = gcd(input_rate, output_rate)
+        self._up = output_rate // div
+        self._down = input_rate // div
+
+        max_rate = max(self._up, self._down)
+        half_len = 10 * max_rate
+        h = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=window) * self._up
+
+        # Split the filter in `up` phases: phase p holds taps p, p + up, p + 2 * up, ...
+        self._taps = -(-len(h) // self._up)
+        h = np.concatenate([h, np.zeros(self._taps * self._up - len(h))])
+        self._bank = h.reshape(self._taps, self._up).T
+
+        self._history = np.zeros(self._taps - 1)
+        self._consumed = 0  # Input samples received so far
+        self._produced = 0  # Output samples generated so far
+        # Blocks of constant size repeat the same filter alignment, so their filter matrices are cached.
+        self._matrices = {}
+
+    def process(self, data: np.ndarray) -> np.ndarray:
+        """Resample the next block of the stream.
+
+        :param data: Next block of input samples.
+        :return: The output samples that can be computed from the input received so far.
+        """
+        x = np.concatenate([self._history, data])
+        base = self._consumed - len(self._history)  # Stream index of x[0]
+        self._consumed += len(data)
+        end = -(-self._consumed * self._up // self._down)
+
+        offset = self._produced * self._down - base * self._up
+        key = (len(x), offset, end - self._produced)
+        matrix = self._matrices.get(key)
+        if matrix is None:
+            matrix = self._block_matrix(*key)
+            if len(self._matrices) < self.MAX_CACHED_MATRICES:
+                self._matrices[key] = matrix
+        self._produced = end
+
+        self._history = x[len(x) - (self._taps - 1) :]
+        return matrix @ x
+
+    def _block_matrix(self, length: int, offset: int, count: int) -> sparse.csr_matrix:
+        """Build the (sparse) matrix mapping a block of input samples to its output samples.
+
+        Output k is computed backwards from input sample (offset + k * down) // up, using the filter phase
+        (offset + k * down) % up.
+        """
+        pos = offset + np.arange(count) * self._down
+        last_input = pos // self._up
+        phase = pos % self._up
+
+        rows = np.repeat(np.arange(count), self._taps)
+        cols = (last_input[:, None] - np.arange(self._taps)[None, :]).ravel()
+        return sparse.csr_matrix((self._bank[phase].ravel(), (rows, cols)), shape=(count, length))
+
+    def reset(self) -> None:
+        """Clear the filter state."""
+        self._history = np.zeros(self._taps - 1)
+        self._consumed = 0
+        self._produced = 0
@@ -4,9 +4,11 @@
 import argparse
 import logging
 import socket
-from typing import Optional
+from typing import List, Optional
 
-from readingtorobot.common import load_config_file, MQTTManager
+from readingtorobot.common import load_config_file, resource_file, LocalBus, MQTTManager
+from readingtorobot.common.latency import LatencyTrace
+from readingtorobot.common.messages import Command
 from readingtorobot.common.voice_recognition import VoiceRecognition
 from readingtorobot.common.continuous_speech import DEFAULT_SAMPLE_RATE
 
@@ -16,35 +18,145 @@ class SpeechSender(VoiceRecognition):
     Speech recognition with mqtt manager.
 
     This class allows the recognition of speech and evaluation of messages, and publishes the results over MQTT.
+
+    A session name can be given to run several senders in one process. Each session then publishes on
+    'speech/<session>/cmd' and changes book on 'speech/<session>/book', using the MQTT client shared by all sessions.
+
+    Commands are published in the binary format of `Command`, with the match score, book line, session and latency
+    trace of their text. Set `payload_format` to 'text' in the configuration file for robots expecting bare commands
+    followed by their trace (see `LatencyTrace.encode`).
     """
 
     HOST = socket.gethostbyname(socket.gethostname())
 
-    def __init__(self, config: Optional[str] = None, interpreter: Optional[str] = None, timeout: int = 20):
+    def __init__(
+        self,
+        config: Optional[str] = None,
+        interpreter: Optional[str] = None,
+        timeout: int = 20,
+        session: Optional[str] = None,
+        overrides: Optional[dict] = None,
+        mqtt_client: Optional[MQTTManager] = None,
+        transport: Optional[LocalBus] = None,
+    ):
         """Initialize Speech Recognition notification process.
 
         :param config: configuration file path.
         :param interpreter: 'ds' for DeepSpeech or 'gc' for Google Cloud.
         :param timeout: MQTT client connection timeout.
+        :param session: Name of the session. If None, the topics 'speech/cmd' and 'speech/book' are used.
+        :param overrides: Configuration parameters of this session, replacing those of the configuration file.
+        :param mqtt_client: Connection to the command server, started by its owner. If None, a new one is created.
+        :param transport: Bus replacing the MQTT server for a new connection, when the robot runs in this process.
         """
-        super().__init__(config=config, interpreter=interpreter)
+        super().__init__(config=config, interpreter=interpreter, overrides=overrides)
+        prefix = "speech" if session is None else "speech/{}".format(session)
+        self._session = session
+        self._binary_payloads = self._config.get("payload_format", "binary") != "text"
+        self._cmd_topic = "{}/cmd".format(prefix)
+        if session is not None:
+            self.name = "SpeechRecognition-{}".format(session)
 
         # Connection to command server
-        self._mqtt_client = MQTTManager("speech", self.stop, timeout=timeout, server_ip=self.HOST)
+        self._owns_mqtt_client = mqtt_client is None
+        if mqtt_client is None:
+            mqtt_client = MQTTManager("speech", self.stop, timeout=timeout, server_ip=self.HOST, transport=transport)
+        self._mqtt_client = mqtt_client
+        self._mqtt_client.add_callback("{}/book".format(prefix), self._library.select)
 
     def start(self):
         """Start speech recognition thread."""
         try:
-            self._mqtt_client.start()
+            if self._owns_mqtt_client:
+                self._mqtt_client.start()
             super().start()
         except TimeoutError:
             raise
 
-    def _process_text(self, text: str):
+    def _process_text(self, text: str, trace: Optional[LatencyTrace] = None):
         """Process detected text and publish the corresponding emotion response."""
-        op = self._book.evaluate_static_sentence_validity(text)
-        if op is not None:
-            self._mqtt_client.publish("speech/cmd", op)
+        op = self._book.evaluate(text)
+        if op is None:
+            return
+        if trace is not None:
+            # No "published" stage: only the encoding separates the publication from the match.
+            trace.mark("matched")
+        if self._binary_payloads:
+            line, score = self._book.last_match or (None, None)
+            payload = Command(op, confidence=score, line=line, session=self._session, trace=trace).encode()
+        else:
+            payload = trace.encode(op) if trace is not None else op
+        self._mqtt_client.publish(self._cmd_topic, payload)
+
+
+class MultiSpeechService:
+    """
+    Speech recognition for several reading stations in a single process.
+
+    Each entry of the `sessions` list of the configuration file runs a `SpeechSender` with its own audio input, VAD
+    state and book position. The parameters of an entry (e.g. `device`, `file` or `book`) replace those of the
+    configuration file and of `overrides`, and its `name` selects the MQTT topics of the session. All sessions share
+    the MQTT connection and, through the model cache, the DeepSpeech model, which decodes for one session at a time.
+    """
+
+    HOST = SpeechSender.HOST
+
+    def __init__(
+        self,
+        config: Optional[str] = None,
+        interpreter: Optional[str] = None,
+        timeout: int = 20,
+        overrides: Optional[dict] = None,
+        transport: Optional[LocalBus] = None,
+    ):
+        """Initialize the sessions.
+
+        :param config: configuration file path.
+        :param interpreter: 'ds' for DeepSpeech or 'gc' for Google Cloud.
+        :param timeout: MQTT client connection timeout.
+        :param overrides: Configuration parameters of all the sessions, replacing those of the configuration file.
+        :param transport: Bus replacing the MQTT server, when the robots run in this process.
+        """
+        if config is None:
+            config = resource_file("ds_config.json")
+        sessions = load_config_file(config).get("sessions", [])
+        if not sessions:
+            raise ValueError("No sessions defined in: {}".format(config))
+
+        self._mqtt_client = MQTTManager("speech", self.stop, timeout=timeout, server_ip=self.HOST, transport=transport)
+        self._senders: List[SpeechSender] = []
+        for parameters in sessions:
+            session_overrides = dict(overrides or {})
+            session_overrides.update((k, v) for k, v in parameters.items() if k != "name")
+            self._senders.append(
+                SpeechSender(
+                    config,
+                    interpreter,
+                    session=parameters["name"],
+                    overrides=session_overrides,
+                    mqtt_client=self._mqtt_client,
+                )
+            )
+
+    def start(self):
+        """Connect to the MQTT server and start all the sessions."""
+        self._mqtt_client.start()
+        for sender in self._senders:
+            sender.start()
+
+    def stop(self):
+        """Stop all the sessions."""
+        for sender in self._senders:
+            sender.stop()
+
+    def is_alive(self) -> bool:
+        """Check if any session is running."""
+        return any(sender.is_alive() for sender in self._senders)
+
+    def join(self):
+        """Wait until all the sessions finish."""
+        for sender in self._senders:
+            sender.join()
 
 
 def main():
@@ -93,22 +205,17 @@ def main():
 
     args = parser.parse_args()
 
-    # Load config parameters
-    if args.config:
-        configuration = load_config_file(args.config)
-    else:
-        configuration = {}
-
     # If given explicitly, override configuration parameters
+    configuration = {}
     if args.model:
         configuration["model"] = args.model
     if args.scorer:
         configuration["scorer"] = args.scorer
-    if args.vad_aggressiveness:
+    if args.vad_aggressiveness is not None:
         configuration["vad_aggressiveness"] = args.vad_aggressiveness
     if args.rate:
         configuration["sample_rate"] = args.rate
-    if args.device:
+    if args.device is not None:
         configuration["device"] = args.device
     if args.hot_words:
         configuration["hot_words"] = {}
@@ -117,7 +224,10 @@ def main():
             configuration["hot_words"][word] = boost
 
     # Create speech recognition object
-    speech_reco = SpeechSender(config=args.config)
+    if "sessions" in load_config_file(args.config or resource_file("ds_config.json")):
+        speech_reco = MultiSpeechService(config=args.config, overrides=configuration)
+    else:
+        speech_reco = SpeechSender(config=args.config, overrides=configuration)
 
     try:
         speech_reco.start()
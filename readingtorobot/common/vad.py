@@ -0,0 +1,116 @@
+"""Voice activity detection of batches of audio frames."""
+
+from threading import Lock
+from typing import List, Sequence
+
+import numpy as np
+import webrtcvad
+
+
+class DecisionBitmap:
+    """
+    Voice activity decisions of the latest frames of a stream.
+
+    Frames are identified by their stream index (0 for the first frame classified). Decisions are read as booleans or
+    as a bitmap packed like `np.packbits`: the first frame of each byte is its most significant bit. Decisions can be
+    read from any thread while they are added.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """Initialize DecisionBitmap.
+
+        :param capacity: Number of decisions kept.
+        """
+        self._capacity = capacity
+        self._decisions = np.zeros(capacity, dtype=bool)
+        self._total = 0
+        self._lock = Lock()
+
+    @property
+    def total(self) -> int:
+        """Return the number of decisions added since the beginning of the stream."""
+        with self._lock:
+            return self._total
+
+    def append(self, decisions: Sequence[bool]) -> None:
+        """Add the decisions of the next frames of the stream."""
+        count = len(decisions)
+        if count > self._capacity:
+            decisions = decisions[count - self._capacity :]
+        with self._lock:
+            # Index of the first decision kept, when the oldest ones of the batch do not fit.
+            position = (self._total + count - len(decisions)) % self._capacity
+            first = min(len(decisions), self._capacity - position)
+            self._decisions[position : position + first] = decisions[:first]
+            self._decisions[: len(decisions) - first] = decisions[first:]
+            self._total += count
+
+    def get(self, start: int, stop: int = -1) -> np.ndarray:
+        """Return the decisions of a range of frames, as booleans.
+
+        :param start: Stream index of the first frame. Decisions older than the capacity are not returned.
+        :param stop: Stream index after the last frame. Negative values return up to the newest frame.
+        """
+        with self._lock:
+            stop = self._total if stop < 0 else min(stop, self._total)
+            start = min(max(start, stop - self._capacity, 0), stop)
+            return self._decisions[np.arange(start, stop) % self._capacity]
+
+    def packed(self, start: int, stop: int = -1) -> bytes:
+        """Return the decisions of a range of frames, packed in bytes (see `get`)."""
+        return np.packbits(self.get(start, stop)).tobytes()
+
+
+class BatchVad:
+    """
+    Voice activity detector classifying several frames at once.
+
+    Frames whose RMS energy is below `energy_threshold` are classified as silence without calling the detector, so
+    that quiet periods cost a single NumPy operation per batch. The decisions of the whole stream are recorded in
+    `decisions`.
+    """
+
+    def __init__(
+        self,
+        aggressiveness: int = 3,
+        sample_rate: int = 16000,
+        energy_threshold: float = 30,
+        history: int = 500,
+    ) -> None:
+        """Initialize BatchVad.
+
+        :param aggressiveness: Aggressiveness of the WebRTC detector, from 0 (least) to 3.
+        :param sample_rate: Sample rate of the frames.
+        :param energy_threshold: RMS level (int16 scale) below which frames are silent (0 to call the detector on
+            every frame).
+        :param history: Number of decisions kept in `decisions`.
+        """
+        self._vad = webrtcvad.Vad(aggressiveness)
+        self._sample_rate = sample_rate
+        self._energy_threshold = energy_threshold
+        self.decisions = DecisionBitmap(history)
+
+    def configure(self, aggressiveness: int, energy_threshold: float) -> None:
+        """Change the aggressiveness of the detector and the energy threshold, also while frames are classified."""
+        self._vad.set_mode(aggressiveness)
+        self._energy_threshold = energy_threshold
+
+    def is_speech(self, frame: bytes, sample_rate: int) -> bool:
+        """Classify a single frame with the WebRTC detector."""
+        return self._vad.is_speech(frame, sample_rate)
+
+    def classify(self, frames: List[bytes]) -> List[bool]:
+        """Classify consecutive frames of the stream.
+
+        :param frames: Frames of int16 samples, all of the same size.
+        :return: One boolean per frame, True for speech.
+        """
+        is_speech, rate = self.is_speech, self._sample_rate
+        if self._energy_threshold > 0:
+            samples = np.frombuffer(b"".join(frames), dtype=np.int16).reshape(len(frames), -1).astype(np.float32)
+            loud = np.einsum("ij,ij->i", samples, samples) >= self._energy_threshold**2 * samples.shape[1]
+            decisions = [voiced and is_speech(f, rate) for f, voiced in zip(frames, loud.tolist())]
+        else:
+            decisions = [is_speech(f, rate) for f in frames]
+        self.decisions.append(decisions)
+        return decisions
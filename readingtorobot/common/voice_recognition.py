@@ -2,13 +2,16 @@
 
 import logging
 import time
-from typing import Optional
-import numpy as np
-import speech_recognition as sr
-from threading import Thread
+from typing import Optional, Tuple
+import queue
+from threading import Event, Thread
 
-from .continuous_speech import ContinuousSpeech
-from .configuration_loader import load_config_file, resource_file
+from .continuous_speech import AudioConfig, ContinuousSpeech
+from .google_recognizer import GoogleRecognizerPool
+from .latency import LatencyTrace
+from .recognizers import RecognitionMetrics, create_backend
+from .configuration_loader import ConfigWatcher, load_config_file, resource_file
+from .book_library import DEFAULT_BOOK, DEFAULT_CACHE_FILE, BookLibrary
 from .book_reactions import Book
 
 
@@ -18,95 +21,278 @@ class VoiceRecognition(Thread):
 
     Interpreter options:
     - 'ds' : DeepSpeech (default)
-    - 'gc' : Google Cloud Speech API
+    - 'gc' : Google Cloud Speech API. Up to `gc_workers` requests are sent concurrently (to `gc_endpoint`, if
+      given), and results that arrive after those of newer audio are dropped.
+    - 'replay' : Transcripts read from `replay_file`, one per utterance (for testing).
+
+    The decoding latency and real-time factor of the interpreter are accumulated in `metrics`. Each recognised text
+    is processed with a `LatencyTrace` holding the capture time of its audio and the time it was decoded.
+
+    Recognition modes (`recognition_mode` in the configuration file):
+    - 'window' : Decode the whole audio window every `processing_interval` seconds (default).
+    - 'incremental' : Feed only new audio to one stream per utterance, and finish it when the utterance ends
+      (DeepSpeech only). Only the final text of each utterance is processed, partial results are logged.
+    - 'utterance' : Decode each utterance segmented by the VAD exactly once. Texts are matched with the book in a
+      separate thread, through a queue of at most `max_queued_texts` entries.
+
+    While running, the configuration file is checked for changes every `config_poll_interval` seconds (1 by
+    default, 0 to disable), and the audio parameters that can change at runtime (see `RUNTIME_AUDIO_PARAMETERS`) are
+    applied. Invalid configurations are logged and ignored.
 
     :param name: Name of the thread.
     """
 
-    def __init__(self, config: Optional[str] = None, interpreter: Optional[str] = None) -> None:
+    def __init__(
+        self, config: Optional[str] = None, interpreter: Optional[str] = None, overrides: Optional[dict] = None
+    ) -> None:
         """
         Initialize VoiceRecognition.
 
         :param config: configuration file path.
         :param interpreter: 'ds' for DeepSpeech or 'gc' for Google Cloud.
+        :param overrides: Configuration parameters replacing those of the configuration file.
         """
         super().__init__()
         self.name = "SpeechRecognition"
         self._running = False
+        self._stop_event = Event()
         if config is None:
             config = resource_file("ds_config.json")
 
         cf = load_config_file(config)
+        if overrides:
+            cf.update(overrides)
+        self._config = cf
+        self._overrides = overrides or {}
         if interpreter is None:
             interpreter = cf.get("interpreter", "ds")
 
         self._audio_proc = ContinuousSpeech.from_json(cf)
-        if interpreter == "ds":
-            from .deepspeech_module import load_deepspeech_model
-
-            self._ds = load_deepspeech_model(cf)
+        self._config_watcher = None
+        if cf.get("config_poll_interval", 1.0) > 0:
+            self._config_watcher = ConfigWatcher(config, self._reload_config, cf.get("config_poll_interval", 1.0))
+        self.metrics = RecognitionMetrics()
+        if interpreter == "gc":
+            self._backend = None
+            self._gc = GoogleRecognizerPool(
+                self._deliver_text,
+                workers=cf.get("gc_workers", 2),
+                endpoint=cf.get("gc_endpoint", None),
+                metrics=self.metrics,
+            )
         else:
-            self._ds = sr.Recognizer()
+            self._backend = create_backend(interpreter, cf, self.metrics)
+            self._gc = None
 
-        self._book = Book("the_teeny_tree_literal.txt")
+        self._library = BookLibrary(
+            cache_file=cf.get("book_cache", DEFAULT_CACHE_FILE),
+            active=cf.get("book", DEFAULT_BOOK),
+            track_position=cf.get("track_position", False),
+            max_edit_distance=cf.get("max_edit_distance", 0),
+        )
 
         self._logger = logging.getLogger(name=__name__)
 
+        self._mode = cf.get("recognition_mode", "window")
+        if self._mode == "incremental" and not (self._backend is not None and self._backend.streaming):
+            self._logger.warning("Incremental recognition requires a streaming interpreter, using 'window' mode.")
+            self._mode = "window"
+        self._in_utterance = False
+        self._stream_start = 0
+        self._next_frame = 0
+        self._partial_text = ""
+        self._texts: "queue.Queue[Optional[Tuple[str, LatencyTrace]]]" = queue.Queue(
+            maxsize=cf.get("max_queued_texts", 4)
+        )
+
+    @property
+    def _book(self) -> Book:
+        """Return the book being read."""
+        return self._library.active
+
     def start(self) -> None:
         """Start thread."""
         self._running = True
+        self._stop_event.clear()
+        if self._config_watcher is not None:
+            self._config_watcher.start()
         super().start()
 
     def stop(self) -> None:
         """Stop thread."""
         self._running = False
+        self._stop_event.set()
+        if self._config_watcher is not None:
+            self._config_watcher.stop()
+        self._audio_proc.wake()
         if self.is_alive():
             self.join()
 
+    def _reload_config(self, data: dict) -> None:
+        """Apply the audio parameters of a modified configuration file."""
+        data.update(self._overrides)
+        try:
+            audio_config = AudioConfig.from_json(data)
+        except ValueError as e:
+            self._logger.error("{}, keeping the current configuration.".format(e))
+            return
+        self._audio_proc.apply_config(audio_config)
+
     def run(self) -> None:
-        """Run in the thread."""
+        """Run in the thread.
+
+        The thread sleeps until the audio processor stores voiced audio (or an utterance ends), and then decodes at
+        most once every `processing_interval` seconds. In 'utterance' mode, it waits for complete utterances instead.
+        """
         self._logger.info("Say something!")
         try:
             self._audio_proc.start()
-            last_step_time = time.perf_counter()
-            while self._running:
-                while time.perf_counter() - last_step_time < self._audio_proc.wait_time:
-                    time.sleep(0.01)
-                # Get audio track
-                frames = self._audio_proc.get_audio(int(time.perf_counter() - last_step_time))
-                last_step_time = time.perf_counter()
-
-                if isinstance(self._ds, sr.Recognizer):
-                    audio = self._audio_proc.frames_to_SR(frames)
-                    query = self._ds.recognize_google(audio, show_all=True, language="en-AU")
-                    if query:
-                        if "confidence" in query["alternative"]:
-                            # return alternative with highest confidence score
-                            best_hypothesis = max(
-                                query["alternative"], key=lambda alternative: alternative["confidence"]
-                            )
-                        else:
-                            # when there is no confidence available, we arbitrarily choose the first hypothesis.
-                            best_hypothesis = query["alternative"][0]
-                        text = best_hypothesis["transcript"]
-                    else:
-                        text = ""
-                else:
-                    # Start stream
-                    stream = self._ds.createStream()
-
-                    for frame in frames:
-                        stream.feedAudioContent(np.frombuffer(frame, np.int16))
-                    text = stream.finishStream()
-
-                if text:
-                    self._process_text(text)
+            if self._mode == "utterance":
+                self._decode_utterances()
+            else:
+                self._decode_stream()
 
             self._audio_proc.stop()
         except Exception as e:
             self._audio_proc.stop()
             raise e
+        finally:
+            if self._backend is not None:
+                self._backend.close()
+            if self._gc is not None:
+                self._gc.shutdown(wait=False)
+            self._logger.info("Recognition: {}".format(self.metrics))
+
+    def _decode_stream(self) -> None:
+        """Decode the recorded audio periodically while there is speech, until the thread is stopped."""
+        last_step_time = time.perf_counter()
+        audio_seq = 0
+        while self._running:
+            audio_seq = self._audio_proc.wait_for_audio(audio_seq)
+            remaining = self._audio_proc.wait_time - (time.perf_counter() - last_step_time)
+            if remaining > 0:
+                self._stop_event.wait(remaining)
+            if not self._running:
+                break
+            time_diff = int(time.perf_counter() - last_step_time)
+            last_step_time = time.perf_counter()
+            if self._mode == "incremental":
+                self._decode_incremental()
+            else:
+                self._decode_window(time_diff)
+
+    def _decode_utterances(self) -> None:
+        """Decode the utterances detected by the audio processor, and hand the texts to the book matcher thread."""
+        matcher = Thread(target=self._match_texts, name="BookMatcher")
+        matcher.start()
+        try:
+            while self._running:
+                utterance = self._audio_proc.get_utterance()
+                if utterance is None:
+                    continue
+                if self._gc is not None:
+                    # Blocks while all the requests in flight wait for the matcher.
+                    self._gc.submit(utterance.samples, utterance.captured_at)
+                    continue
+                text = self._backend.recognize(utterance.samples)
+                if text:
+                    # Blocks while the matcher is busy, so that texts do not pile up.
+                    self._texts.put((text, self._decoded_trace(utterance.captured_at)))
+        finally:
+            if self._gc is not None:
+                self._gc.shutdown()
+            self._texts.put(None)
+            matcher.join()
 
-    def _process_text(self, text: str) -> None:
-        """Process the given text."""
-        del text
+    def _match_texts(self) -> None:
+        """Process the recognised texts until a None is received."""
+        while True:
+            item = self._texts.get()
+            if item is None:
+                return
+            text, trace = item
+            try:
+                self._process_text(text, trace)
+            except Exception:
+                self._logger.exception("Could not process text: '{}'".format(text))
+
+    def _decode_window(self, time_diff: int) -> None:
+        """Decode the current audio window.
+
+        :param time_diff: Time elapsed since the last decoded window, in seconds.
+        """
+        # Get audio track
+        captured_at = self._audio_proc.last_audio_at
+        frames = self._audio_proc.get_audio(time_diff)
+
+        if self._gc is not None:
+            # The next window overlaps this one, so it can be skipped if all the requests are still in flight. A
+            # window without newer audio than the last delivered result is dropped by the pool.
+            self._gc.submit(frames, captured_at, block=False)
+            return
+
+        text = self._backend.recognize(frames)
+        if text:
+            self._process_text(text, self._decoded_trace(captured_at))
+
+    def _deliver_text(self, text: str, timestamp: float) -> None:
+        """Process a text recognised by the Google recogniser pool, in one of its worker threads.
+
+        :param text: Recognised text.
+        :param timestamp: Capture time (`time.perf_counter`) of the audio.
+        """
+        trace = self._decoded_trace(timestamp)
+        if self._mode == "utterance":
+            self._texts.put((text, trace))
+        else:
+            self._process_text(text, trace)
+
+    @staticmethod
+    def _decoded_trace(captured_at: float) -> LatencyTrace:
+        """Start the latency trace of a text decoded now, from audio captured at a `time.perf_counter` time."""
+        now = time.time()
+        trace = LatencyTrace()
+        trace.mark("captured", now - (time.perf_counter() - captured_at))
+        trace.mark("decoded", now)
+        return trace
+
+    def _decode_incremental(self) -> None:
+        """Feed the audio recorded since the last step to the current utterance stream.
+
+        The stream is finished once the audio processor detects the end of the utterance, and its text processed.
+        Partial results are only logged, so that each utterance is processed once, with its whole text.
+        """
+        boundary = self._audio_proc.utterance_end
+        if self._in_utterance and boundary > self._stream_start:
+            captured_at = self._audio_proc.last_audio_at
+            frames, self._next_frame = self._audio_proc.get_audio_since(self._next_frame, boundary)
+            self._backend.feed(frames)
+            text = self._backend.finish()
+            self._in_utterance = False
+            self._partial_text = ""
+            if text:
+                self._process_text(text, self._decoded_trace(captured_at))
+
+        captured_at = self._audio_proc.last_audio_at
+        frames, end = self._audio_proc.get_audio_since(self._next_frame)
+        if not len(frames):
+            return
+
+        if not self._in_utterance:
+            self._in_utterance = True
+            self._stream_start = self._next_frame
+        self._next_frame = end
+        self._backend.feed(frames)
+
+        partial = self._backend.partial()
+        if partial and partial != self._partial_text:
+            self._partial_text = partial
+            self._logger.debug("Partial text: {}".format(partial))
+
+    def _process_text(self, text: str, trace: Optional[LatencyTrace] = None) -> None:
+        """Process the given text.
+
+        :param text: Recognised text.
+        :param trace: Latency trace of the text, up to its decoding.
+        """
+        del text, trace
@@ -0,0 +1,69 @@
+"""Unit test for the AudioRingBuffer class."""
+import unittest
+
+import numpy as np
+
+from readingtorobot.common.audio_buffer import AudioRingBuffer
+
+
+def make_frame(value, size=4):
+    """Build a frame filled with a single value."""
+    return np.full(size, value, dtype=np.int16).tobytes()
+
+
+class AudioRingBufferTests(unittest.TestCase):
+    """Test Case for the AudioRingBuffer class."""
+
+    def test_view_is_contiguous_across_wrap(self):
+        """Check that the newest frames are returned in order after the write position wraps around."""
+        buf = AudioRingBuffer(max_frames=3, frame_size=4)
+        for i in range(5):
+            buf.append(make_frame(i))
+
+        self.assertEqual(len(buf), 3)
+        self.assertEqual(buf.total, 5)
+        self.assertEqual(buf.view().tolist(), [2] * 4 + [3] * 4 + [4] * 4)
+        self.assertEqual(buf.view(1).tolist(), [4] * 4)
+
+    def test_discard_and_keep(self):
+        """Check that trimming the buffer removes the oldest frames."""
+        buf = AudioRingBuffer(max_frames=4, frame_size=4)
+        for i in range(4):
+            buf.append(make_frame(i))
+
+        buf.discard_oldest(1)
+        self.assertEqual(buf.view()[::4].tolist(), [1, 2, 3])
+        buf.keep_newest(1)
+        self.assertEqual(buf.view()[::4].tolist(), [3])
+        buf.clear()
+        self.assertEqual(len(buf.view()), 0)
+
+    def test_view_survives_reserve(self):
+        """Check that a view is not overwritten until the reserved slots are consumed."""
+        buf = AudioRingBuffer(max_frames=2, frame_size=4, reserve=2)
+        buf.append(make_frame(1))
+        buf.append(make_frame(2))
+        view = buf.view()
+        buf.append(make_frame(3))
+        buf.append(make_frame(4))
+        self.assertEqual(view[::4].tolist(), [1, 2])
+
+    def test_since_returns_cleared_frames(self):
+        """Check that incremental reads still get the frames dropped from the window."""
+        buf = AudioRingBuffer(max_frames=4, frame_size=4, reserve=4)
+        for i in range(3):
+            buf.append(make_frame(i))
+        frames, position = buf.since(0)
+        self.assertEqual((frames[::4].tolist(), position), ([0, 1, 2], 3))
+
+        buf.append(make_frame(3))
+        buf.clear()
+        buf.append(make_frame(4))
+        frames, position = buf.since(position, 4)
+        self.assertEqual((frames[::4].tolist(), position), ([3], 4))
+        frames, position = buf.since(position)
+        self.assertEqual((frames[::4].tolist(), position), ([4], 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
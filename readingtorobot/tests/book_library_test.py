@@ -0,0 +1,69 @@
+"""Unit test for the BookLibrary class."""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from readingtorobot.common.book_library import BookLibrary
+from readingtorobot.common.book_reactions import Book
+
+sentencelist = {"sad": ["molly was very sad"], "groan": ["this is silly"]}
+
+
+class BookLibraryTests(unittest.TestCase):
+    """Test Case for the BookLibrary class."""
+
+    def setUp(self):
+        """Create a folder with a couple of books."""
+        self._dir = tempfile.mkdtemp()
+        self._cache = os.path.join(self._dir, "cache", "books.pickle")
+        for name, lines in [("first", ["molly was very sad"]), ("second", ["[groan] this is silly", "the end"])]:
+            with open(os.path.join(self._dir, "{}.txt".format(name)), "w") as f:
+                f.write("\n".join(lines))
+
+    def tearDown(self):
+        """Remove the books."""
+        shutil.rmtree(self._dir)
+
+    def test_cached_books_are_not_parsed(self):
+        """Check that a second library loads the preprocessed books from the cache."""
+        library = BookLibrary(self._dir, sentencelist, cache_file=self._cache, active="second")
+        self.assertEqual(library.names, ["first", "second"])
+        self.assertTrue(os.path.isfile(self._cache))
+
+        with mock.patch.object(Book, "compile_tables", side_effect=AssertionError("Book parsed")):
+            library = BookLibrary(self._dir, sentencelist, cache_file=self._cache, active="second")
+        self.assertEqual(library.active_name, "second")
+        self.assertEqual(library.active.evaluate_static_sentence_validity("this is silly"), "groan")
+
+    def test_changed_book_is_parsed(self):
+        """Check that books are parsed again when their file changes."""
+        BookLibrary(self._dir, sentencelist, cache_file=self._cache)
+        with open(os.path.join(self._dir, "first.txt"), "a") as f:
+            f.write("\nthe end")
+
+        with mock.patch.object(Book, "compile_tables", wraps=Book.compile_tables) as compile_tables:
+            library = BookLibrary(self._dir, sentencelist, cache_file=self._cache)
+        self.assertEqual(compile_tables.call_count, 1)
+        self.assertEqual(len(library["first"]._text), 2)
+
+    def test_sentences_by_book(self):
+        """Check that each book only reacts to its own sentences."""
+        book_sentences = {"first": {"happy": ["this is silly"]}}
+        library = BookLibrary(self._dir, sentencelist, book_sentences, cache_file=self._cache)
+        self.assertEqual(library["first"].evaluate_static_sentence_validity("this is silly"), "happy")
+        self.assertIsNone(library["first"].evaluate_static_sentence_validity("molly was very sad"))
+        self.assertEqual(library["second"].evaluate_static_sentence_validity("this is silly"), "groan")
+
+    def test_select(self):
+        """Check that the active book is only changed to existing books."""
+        library = BookLibrary(self._dir, sentencelist, cache_file=None, active="first")
+        self.assertFalse(library.select("third"))
+        self.assertEqual(library.active_name, "first")
+        self.assertTrue(library.select("second\n"))
+        self.assertIs(library.active, library["second"])
+
+
+if __name__ == "__main__":
+    unittest.main()
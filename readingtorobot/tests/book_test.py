@@ -1,6 +1,9 @@
 """Unit test for the Book class."""
 import logging
 import unittest
+from unittest import mock
+
+from readingtorobot.common import book_reactions
 from readingtorobot.common.book_reactions import Book
 
 sentencelist = {
@@ -48,6 +51,61 @@ class BookTests(unittest.TestCase):
             self.assertEqual(res, test["res"])
             book._last_matched_emotion = None
 
+    def test_skip_last_matched_emotion(self):
+        """Check that sentences of the last matched emotion are not matched again, and that the others are."""
+        book = Book(sentences=sentencelist)
+
+        self.assertEqual(book.evaluate_static_sentence_validity("molly was very sad"), "sad")
+        self.assertIsNone(book.evaluate_static_sentence_validity("molly was very sad"))
+        self.assertEqual(book.evaluate_static_sentence_validity("you have a tree said mr beam"), "excited")
+        self.assertEqual(book.evaluate_static_sentence_validity("oh dear she said and a little tear"), "sad")
+
+    def test_fuzzy_matching(self):
+        """Check that misrecognised words and aliases are only accepted when fuzzy matching is enabled."""
+        text = "you have a tre sad mister beem"
+        self.assertIsNone(Book(sentences=sentencelist).evaluate_static_sentence_validity(text))
+        book = Book(sentences=sentencelist, max_edit_distance=1)
+        self.assertEqual(book.evaluate_static_sentence_validity(text), "excited")
+
+    def test_batch_scoring(self):
+        """Check that scoring the candidates in a NumPy batch or in Python gives the same matches."""
+        index = Book(sentences=None, track_position=True)._line_index
+        texts = [
+            "pip and molly had a teeny pot each",
+            "the the the and a",
+            "you have a tre sad mister beem",
+            "some text with no match",
+        ]
+        for text in texts:
+            for options in ({}, {"max_edit_distance": 1}, {"window": (2, 8)}, {"exclude": [0, 1, 2]}):
+                with mock.patch.object(book_reactions, "BATCH_MIN_HITS", 0):
+                    batch = index.best_match(text.split(" "), 0.3, **options)
+                with mock.patch.object(book_reactions, "BATCH_MIN_HITS", 10**6):
+                    counted = index.best_match(text.split(" "), 0.3, **options)
+                self.assertEqual(batch, counted, (text, options))
+
+    def test_evaluate_reading_position(self):
+        """Check that the reading position follows the text, and that reactions are matched around it."""
+        book = Book(sentences=None, track_position=True)
+
+        # The reaction is only detected when the reading position reaches its line.
+        self.assertIsNone(book.evaluate("this is silly"))
+        self.assertIsNone(book.evaluate("it was plant a tree day at school"))
+        self.assertIsNone(book.evaluate("mr mister beam was teaching the children about seeds"))
+        for line in range(2, 16):
+            book.evaluate(" ".join(book._text[line].split(" ")[:5]))
+        self.assertEqual(book.evaluate("this is silly"), "groan")
+        line, score = book.last_match
+        self.assertEqual((book._text[line], score), ("[groan] this is silly", 1.0))
+        self.assertIsNone(book.evaluate("this is silly"))
+        self.assertIsNone(book.last_match)
+        self.assertEqual(book.evaluate("keep them wet and wait"), "happy")
+
+        # Once the position is lost, the whole book is searched.
+        for _ in range(book._max_missed_matches - 1):
+            self.assertIsNone(book.evaluate("molly was very sad"))
+        self.assertEqual(book.evaluate("molly was very sad"), "sad")
+
 
 if __name__ == "__main__":
     logging.basicConfig(
@@ -0,0 +1,61 @@
+"""Unit test for the configuration loader and watcher."""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from readingtorobot.common.configuration_loader import ConfigWatcher, load_config_file
+
+
+class ConfigurationLoaderTests(unittest.TestCase):
+    """Test Case for load_config_file and ConfigWatcher."""
+
+    def setUp(self):
+        """Create a configuration file."""
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, "config.json")
+        self.write({"silence_threshold": 200})
+
+    def tearDown(self):
+        """Remove the configuration file."""
+        shutil.rmtree(self._dir)
+
+    def write(self, data, mtime=None):
+        """Write the configuration file, with a given modification time."""
+        with open(self._path, "w") as f:
+            f.write(data if isinstance(data, str) else json.dumps(data))
+        if mtime is not None:
+            os.utime(self._path, (mtime, mtime))
+
+    def test_cache(self):
+        """Check that the file is only parsed again when it changes, and that callers get their own copy."""
+        self.write({"silence_threshold": 200}, mtime=1000)
+        with mock.patch("json.load", wraps=json.load) as parse:
+            config = load_config_file(self._path)
+            config["silence_threshold"] = 0
+            self.assertEqual(load_config_file(self._path), {"silence_threshold": 200})
+            self.assertEqual(parse.call_count, 1)
+
+            self.write({"silence_threshold": 300}, mtime=1001)
+            self.assertEqual(load_config_file(self._path), {"silence_threshold": 300})
+            self.assertEqual(parse.call_count, 2)
+
+    def test_watcher(self):
+        """Check that changes of the file are reported once, and that invalid files are skipped."""
+        self.write({"silence_threshold": 200}, mtime=1000)
+        reloaded = []
+        watcher = ConfigWatcher(self._path, reloaded.append)
+        self.assertFalse(watcher.check())
+
+        self.write({"silence_threshold": 300}, mtime=1001)
+        self.assertTrue(watcher.check())
+        self.assertFalse(watcher.check())
+        self.write('{"silence_threshold": ', mtime=1002)
+        self.assertFalse(watcher.check())
+        self.assertEqual(reloaded, [{"silence_threshold": 300}])
+
+
+if __name__ == "__main__":
+    unittest.main()
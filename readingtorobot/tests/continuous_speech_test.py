@@ -0,0 +1,137 @@
+"""Unit test for the ContinuousSpeech class, reading audio from files."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import wave
+
+import numpy as np
+
+from readingtorobot.common.continuous_speech import AudioConfig, ContinuousSpeech
+
+
+def write_wav(path, segments, rate=16000):
+    """Write a WAV file made of (seconds, voiced) segments. Voiced segments are filled with noise."""
+    rng = np.random.default_rng(0)
+    data = [
+        rng.integers(-3000, 3000, int(rate * seconds)) if voiced else np.zeros(int(rate * seconds))
+        for seconds, voiced in segments
+    ]
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(np.concatenate(data).astype(np.int16).tobytes())
+
+
+def energy_vad(frame, rate):
+    """Detect speech as any frame that is not silent."""
+    del rate
+    return bool(np.any(np.frombuffer(frame, dtype=np.int16)))
+
+
+class ContinuousSpeechTests(unittest.TestCase):
+    """Test Case for the ContinuousSpeech class."""
+
+    def setUp(self):
+        """Create a WAV file with two utterances."""
+        self._dir = tempfile.mkdtemp()
+        self._file = os.path.join(self._dir, "speech.wav")
+        write_wav(self._file, [(0.5, False), (1, True), (1, False), (2, True), (0.5, False)])
+
+    def tearDown(self):
+        """Remove the WAV file."""
+        shutil.rmtree(self._dir)
+
+    def test_utterances_from_file(self):
+        """Check that a file is segmented into utterances faster than real time, and that its end is signalled."""
+        speech = ContinuousSpeech(file=self._file, replay_speed=0, capture_mode="utterance")
+        speech._vad.is_speech = energy_vad
+        start = time.perf_counter()
+        speech.start()
+        utterances = []
+        while True:
+            utterance = speech.get_utterance(timeout=5)
+            if utterance is None:
+                break
+            utterances.append(utterance)
+        speech.stop()
+
+        self.assertLess(time.perf_counter() - start, 2)
+        self.assertTrue(speech.end_of_stream)
+        self.assertEqual(len(utterances), 2)
+        with wave.open(self._file, "rb") as wf:
+            audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        # Utterances start with the padding before the trigger and end once the padding is unvoiced.
+        for utterance, (first, last) in zip(utterances, [(25, 75), (125, 225)]):
+            self.assertFalse(utterance.samples.flags.owndata)
+            self.assertTrue(np.array_equal(utterance.samples, audio[utterance.start * 320 : utterance.end * 320]))
+            self.assertLessEqual(abs(utterance.start - first), 15)
+            self.assertLessEqual(abs(utterance.end - last), 15)
+
+    def test_window_from_file(self):
+        """Check that only the voiced audio of a file is stored, and that the last utterance ends with the file."""
+        speech = ContinuousSpeech(file=self._file, replay_speed=0, silence_threshold=10)
+        speech._vad.is_speech = energy_vad
+        speech.start()
+        speech.join(5)
+
+        self.assertTrue(speech.end_of_stream)
+        self.assertEqual(speech.utterance_end, 150)
+        frames, end = speech.get_audio_since(0)
+        self.assertEqual((len(frames), end), (150 * 320, 150))
+
+    def test_get_audio_clears_window(self):
+        """Check that only the newest `min_seconds` plus the elapsed time of the window are returned and kept."""
+        speech = ContinuousSpeech(file=self._file, replay_speed=0, silence_threshold=100, min_seconds=1)
+        speech._vad.is_speech = energy_vad
+        speech.start()
+        speech.join(5)
+
+        frames, _ = speech.get_audio_since(0)
+        audio = speech.get_audio(0.5)
+        self.assertEqual(len(audio), 75 * 320)
+        self.assertTrue(np.array_equal(audio, frames[-75 * 320 :]))
+        self.assertEqual(len(speech.get_audio(0)), 50 * 320)
+
+    def test_poly_resampler_at_processing_rate(self):
+        """Check that a file recorded at the processing rate is read as is with the polyphase resampler."""
+        speech = ContinuousSpeech(file=self._file, replay_speed=0, silence_threshold=10, resampler="poly")
+        speech._vad.is_speech = energy_vad
+        speech.start()
+        speech.join(5)
+
+        self.assertEqual(speech.utterance_end, 150)
+
+    def test_config_validation(self):
+        """Check that invalid audio parameters are all reported, and that missing ones take their default value."""
+        config = AudioConfig.from_json({"silence_threshold": 50, "recognition_mode": "utterance", "model": "x"})
+        self.assertEqual(config, AudioConfig(silence_threshold=50, capture_mode="utterance"))
+        with self.assertRaises(ValueError) as context:
+            AudioConfig.from_json({"vad_aggressiveness": 4, "processing_interval": "1", "device": True})
+        for name in ("vad_aggressiveness", "processing_interval", "device"):
+            self.assertIn(name, str(context.exception))
+        with self.assertRaises(ValueError):
+            AudioConfig.from_json({"min_seconds": 10, "max_seconds": 5})
+
+    def test_fractional_seconds(self):
+        """Check that durations which are not a whole number of seconds are rounded to whole blocks."""
+        config = AudioConfig.from_json({"file": self._file, "replay_speed": 0, "max_seconds": 7.5, "min_seconds": 2.5})
+        speech = ContinuousSpeech.from_config(config)
+        self.assertEqual(speech._main_buffer_size, 375)
+        self.assertEqual(speech._time_window, 250)
+
+    def test_apply_config(self):
+        """Check that the runtime audio parameters are changed, and that the others are reported."""
+        speech = ContinuousSpeech.from_json({"file": self._file, "replay_speed": 0})
+        speech.start()
+        new = speech.config._replace(processing_interval=0.1, silence_threshold=10, vad_aggressiveness=1, max_seconds=5)
+        self.assertEqual(speech.apply_config(new), ["max_seconds"])
+        self.assertEqual(speech.wait_time, 0.1)
+        self.assertEqual(speech.config, new._replace(max_seconds=10))
+        speech.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Unit test for the DeepSpeech model cache, with a stand-in for the deepspeech package."""
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+
+class FakeModel:
+    """DeepSpeech model recording its configuration."""
+
+    instances = []
+
+    def __init__(self, path):
+        """Initialize model."""
+        self.path = path
+        self.scorer = None
+        self.hot_words = {}
+        FakeModel.instances.append(self)
+
+    def enableExternalScorer(self, path):
+        """Set the scorer."""
+        self.scorer = path
+
+    def addHotWord(self, word, boost):
+        """Add a hot-word."""
+        self.hot_words[word] = boost
+
+
+class DeepSpeechModuleTests(unittest.TestCase):
+    """Test Case for load_deepspeech_model."""
+
+    def setUp(self):
+        """Import the module with the fake deepspeech package, and create model and scorer files."""
+        FakeModel.instances = []
+        fake_deepspeech = types.ModuleType("deepspeech")
+        fake_deepspeech.Model = FakeModel
+        patcher = mock.patch.dict(sys.modules, {"deepspeech": fake_deepspeech})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sys.modules.pop("readingtorobot.common.deepspeech_module", None)
+        self._module = importlib.import_module("readingtorobot.common.deepspeech_module")
+        self.addCleanup(sys.modules.pop, "readingtorobot.common.deepspeech_module", None)
+
+        self._dir = tempfile.mkdtemp()
+        for name in ["model.tflite", "a.scorer", "b.scorer"]:
+            with open(os.path.join(self._dir, name), "wb") as f:
+                f.write(b"\0" * 1024)
+        self._config = {"model": os.path.join(self._dir, "model.tflite"), "scorer": os.path.join(self._dir, "a.scorer")}
+
+    def tearDown(self):
+        """Release the models and remove the files."""
+        self._module.clear_model_cache()
+        shutil.rmtree(self._dir)
+
+    @unittest.skipUnless(hasattr(os, "posix_fadvise"), "No read-ahead on this platform.")
+    def test_same_model_is_shared(self):
+        """Check that the same configuration loads a single model, and reads its files ahead once."""
+        with mock.patch("os.posix_fadvise") as fadvise:
+            first = self._module.load_deepspeech_model(dict(self._config))
+            second = self._module.load_deepspeech_model(dict(self._config))
+        self.assertIs(first, second)
+        self.assertEqual(len(FakeModel.instances), 1)
+        self.assertEqual(fadvise.call_count, 2)
+        self.assertTrue(all(c.args[3] == os.POSIX_FADV_WILLNEED for c in fadvise.call_args_list))
+
+        self._module.clear_model_cache()
+        self.assertIsNot(self._module.load_deepspeech_model(dict(self._config)), first)
+
+    def test_settings_are_not_shared(self):
+        """Check that models with a different scorer or hot-words are separate."""
+        plain = self._module.load_deepspeech_model(dict(self._config))
+        other_scorer = self._module.load_deepspeech_model(
+            dict(self._config, scorer=os.path.join(self._dir, "b.scorer"))
+        )
+        hot_words = self._module.load_deepspeech_model(dict(self._config, hot_words={"molly": 10}))
+
+        self.assertEqual(len({id(plain), id(other_scorer), id(hot_words)}), 3)
+        self.assertEqual(plain.scorer, self._config["scorer"])
+        self.assertEqual(other_scorer.scorer, os.path.join(self._dir, "b.scorer"))
+        self.assertEqual(plain.hot_words, {})
+        self.assertEqual(other_scorer.hot_words, {})
+        self.assertEqual(hot_words.hot_words, {"molly": 10.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
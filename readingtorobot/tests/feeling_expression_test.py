@@ -0,0 +1,127 @@
+"""Unit test for the FeelingReaction class, with a robot whose animations block."""
+import threading
+import time
+import unittest
+
+from readingtorobot.common.feeling_expression import Feel, FeelingReaction
+from readingtorobot.common.latency import LatencyTrace
+from readingtorobot.common.messages import Command
+from readingtorobot.tests.robots import RecordingRobot
+
+
+class SlowRobot(RecordingRobot):
+    """Robot whose animations last until they are released."""
+
+    def __init__(self):
+        """Initialize SlowRobot."""
+        super().__init__()
+        self.release = threading.Event()
+
+    def do_feel(self, feeling):
+        """Record a feeling, and block until the animation is released."""
+        super().do_feel(feeling)
+        self.release.wait(5)
+
+
+class FeelingReactionTests(unittest.TestCase):
+    """Test Case for the FeelingReaction class."""
+
+    def setUp(self):
+        """Create the reaction manager of a slow robot."""
+        self._robot = SlowRobot()
+        self._reaction = FeelingReaction(self._robot)
+
+    def tearDown(self):
+        """Stop the reaction manager."""
+        self._robot.release.set()
+        self._reaction.stop()
+
+    def start_animation(self, command):
+        """Send a command and wait until its animation is running."""
+        self._reaction.process_text(command)
+        while not self._robot.feelings:
+            time.sleep(0.01)
+
+    def test_commands_do_not_block(self):
+        """Check that commands are accepted while an animation runs, and that only the latest one is kept."""
+        self.start_animation("sad")
+        start = time.perf_counter()
+        for command in ("happy", "scared", "excited"):
+            self._reaction.process_text(command)
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertFalse(self._reaction.wait_idle(0.1))
+
+        self._robot.release.set()
+        self.assertTrue(self._reaction.wait_idle(1))
+        self.assertEqual(self._robot.feelings, [Feel.SAD, Feel.EXCITED])
+
+    def test_priority(self):
+        """Check that a waiting command is not replaced by a less important one."""
+        self.start_animation("sad")
+        self._reaction.process_text("end")
+        self._reaction.process_text("happy")
+        self._robot.release.set()
+        self.assertTrue(self._reaction.wait_idle(1))
+        self.assertEqual(self._robot.feelings, [Feel.SAD, Feel.END])
+
+    def test_reaction_not_played(self):
+        """Check that reactions the robot does not play are not recorded."""
+        self._robot.do_feel = lambda feeling: feeling != Feel.SAD
+        for command in ("sad", "happy"):
+            self._reaction.process_text(Command(command, trace=LatencyTrace([("captured", time.time())])))
+            self.assertTrue(self._reaction.wait_idle(1))
+
+        self.assertEqual(self._reaction.latency.count("received", "animated"), 1)
+
+    def test_capture_age(self):
+        """Check that commands captured long ago are played, unless a maximum capture age is given."""
+        self._robot.release.set()
+        old = Command("sad", trace=LatencyTrace([("captured", time.time() - 20)]))
+        self._reaction.process_text(old)
+        self.assertTrue(self._reaction.wait_idle(1))
+
+        strict = FeelingReaction(self._robot, max_capture_age=5.0)
+        try:
+            for command, captured_at in (("happy", time.time() - 20), ("excited", time.time())):
+                strict.process_text(Command(command, trace=LatencyTrace([("captured", captured_at)])))
+                self.assertTrue(strict.wait_idle(1))
+        finally:
+            strict.stop()
+        self.assertEqual(self._robot.feelings, [Feel.SAD, Feel.EXCITED])
+
+    def test_queued_animation_start(self):
+        """Check that the animation of robots queueing their reactions is timed from when they start playing it."""
+        played = []
+        reaction = FeelingReaction(self._robot, queued_animations=True)
+        # The robot plays the reaction later, in its own thread.
+        self._robot.do_feel = lambda feeling: played.append(feeling) is None
+        traces = {command: LatencyTrace([("captured", time.time())]) for command in ("sad", "happy")}
+        try:
+            for command, trace in traces.items():
+                reaction.process_text(Command(command, trace=trace))
+                self.assertTrue(reaction.wait_idle(1))
+            self.assertEqual(reaction.latency.count("received", "animated"), 0)
+
+            time.sleep(0.05)
+            reaction.animation_started(Feel.SAD)
+            reaction.animation_started(Feel.SAD)
+        finally:
+            reaction.stop()
+        self.assertEqual(played, [Feel.SAD, Feel.HAPPY])
+        self.assertEqual(reaction.latency.count("received", "animated"), 1)
+        stamps = dict(traces["sad"].stamps)
+        self.assertGreaterEqual(stamps["animated"] - stamps["received"], 0.05)
+
+    def test_registered_command(self):
+        """Check that new commands can be added to the dispatch table."""
+        self._robot.release.set()
+        waves = []
+        self._reaction.register("wave", lambda command: waves.append(command.command))
+        self._reaction.process_text("wave")
+        self._reaction.process_text("unknown")
+        self.assertTrue(self._reaction.wait_idle(1))
+        self.assertEqual((waves, self._robot.feelings), (["wave"], []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+"""Unit test for the GoogleRecognizerPool class, using a local stand-in for the speech API."""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from readingtorobot.common.google_recognizer import GoogleRecognizerPool
+from readingtorobot.common.voice_recognition import VoiceRecognition
+
+# Requests with more audio data than this are answered slowly.
+SLOW_REQUEST_SIZE = 10000
+
+
+class SpeechAPIHandler(BaseHTTPRequestHandler):
+    """Answer like the Google Speech Recognition API, with a transcript depending on the size of the audio."""
+
+    def do_POST(self):
+        """Reply to a recognition request."""
+        size = int(self.headers["Content-Length"])
+        self.rfile.read(size)
+        if size > SLOW_REQUEST_SIZE:
+            time.sleep(0.5)
+            transcript = "you have a tree said mr beam"
+        else:
+            transcript = "molly was very sad"
+        result = {"result": [{"alternative": [{"transcript": transcript, "confidence": 0.9}], "final": True}]}
+        body = '{{"result":[]}}\n{}\n'.format(json.dumps(result)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Do not log requests."""
+
+
+def make_audio(seconds, noise):
+    """Build an audio track, containing noise or silence."""
+    samples = int(16000 * seconds)
+    data = np.random.default_rng(0).integers(-3000, 3000, samples) if noise else np.zeros(samples)
+    return data.astype(np.int16)
+
+
+class GoogleRecognizerPoolTests(unittest.TestCase):
+    """Test Case for the GoogleRecognizerPool class."""
+
+    def setUp(self):
+        """Start the speech API stand-in."""
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), SpeechAPIHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self._endpoint = "http://127.0.0.1:{}/recognize".format(self._server.server_port)
+        self._results = []
+
+    def tearDown(self):
+        """Stop the speech API stand-in."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def test_stale_results_are_dropped(self):
+        """Check that requests run concurrently, and that a result older than the last delivered one is dropped."""
+        pool = GoogleRecognizerPool(lambda text, ts: self._results.append((text, ts)), endpoint=self._endpoint)
+        start = time.perf_counter()
+        self.assertTrue(pool.submit(make_audio(1, noise=True), 1.0))
+        self.assertTrue(pool.submit(make_audio(0.2, noise=False), 2.0))
+        pool.shutdown()
+
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(self._results, [("molly was very sad", 2.0)])
+        self.assertEqual(pool.metrics.utterances, 2)
+        self.assertAlmostEqual(pool.metrics.audio_seconds, 1.2)
+
+    def test_skip_when_busy(self):
+        """Check that audio is skipped when all the workers are busy and blocking is not allowed."""
+        pool = GoogleRecognizerPool(
+            lambda text, ts: self._results.append((text, ts)), workers=1, endpoint=self._endpoint
+        )
+        self.assertTrue(pool.submit(make_audio(1, noise=True), 1.0, block=False))
+        self.assertFalse(pool.submit(make_audio(0.2, noise=False), 2.0, block=False))
+        pool.shutdown()
+
+        self.assertEqual(self._results, [("you have a tree said mr beam", 1.0)])
+
+
+class RecordingRecognition(VoiceRecognition):
+    """Voice recognition keeping the recognised texts."""
+
+    def __init__(self, *args, **kwargs):
+        """Initialize RecordingRecognition."""
+        super().__init__(*args, **kwargs)
+        self.texts = []
+        self.received = threading.Event()
+        # Any sound is speech.
+        self._audio_proc._vad.is_speech = lambda frame, rate: bool(np.any(np.frombuffer(frame, dtype=np.int16)))
+
+    def _process_text(self, text, trace=None):
+        """Keep a recognised text."""
+        self.texts.append(text)
+        self.received.set()
+
+
+class GoogleVoiceRecognitionTests(unittest.TestCase):
+    """Test Case for VoiceRecognition with the 'gc' interpreter, replaying a file to the speech API stand-in."""
+
+    def setUp(self):
+        """Start the speech API stand-in, and write a file with an utterance."""
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), SpeechAPIHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self._dir = tempfile.mkdtemp()
+        self._file = os.path.join(self._dir, "speech.wav")
+        with wave.open(self._file, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(16000)
+            audio = [make_audio(0.5, noise=False), make_audio(1, noise=True), make_audio(0.5, noise=False)]
+            wf.writeframes(np.concatenate(audio).tobytes())
+        self._overrides = {
+            "file": self._file,
+            "replay_speed": 0,
+            "processing_interval": 0.1,
+            "gc_endpoint": "http://127.0.0.1:{}/recognize".format(self._server.server_port),
+            "book_cache": None,
+            "config_poll_interval": 0,
+        }
+
+    def tearDown(self):
+        """Stop the speech API stand-in, and remove the file."""
+        self._server.shutdown()
+        self._server.server_close()
+        shutil.rmtree(self._dir)
+
+    def _recognize(self, mode):
+        """Replay the file in a recognition mode, and return the recognised texts."""
+        self._overrides["recognition_mode"] = mode
+        recognition = RecordingRecognition(interpreter="gc", overrides=self._overrides)
+        recognition.start()
+        try:
+            self.assertTrue(recognition.received.wait(5))
+        finally:
+            recognition.stop()
+        return recognition.texts
+
+    def test_utterance_mode(self):
+        """Check that utterances are sent to the speech API."""
+        self.assertEqual(self._recognize("utterance"), ["you have a tree said mr beam"])
+
+    def test_window_mode(self):
+        """Check that audio windows are sent to the speech API."""
+        self.assertIn("you have a tree said mr beam", self._recognize("window"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""Unit test for the latency traces of the reactions, from the speech service to the robot."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from readingtorobot.common.feeling_expression import Feel, FeelingReaction
+from readingtorobot.common.latency import LatencyHistograms, LatencyTrace
+from readingtorobot.tests.robots import RecordingRobot
+
+
+class LatencyTests(unittest.TestCase):
+    """Test Case for LatencyTrace and LatencyHistograms."""
+
+    def setUp(self):
+        """Create a directory for the histograms."""
+        self._dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the histograms."""
+        shutil.rmtree(self._dir)
+
+    def test_trace_round_trip(self):
+        """Check that a trace is carried with its command, and that bare commands are still accepted."""
+        trace = LatencyTrace([("captured", 100.0), ("decoded", 100.5)])
+        trace.mark("matched", 100.75)
+
+        command, decoded = LatencyTrace.decode(trace.encode("sad"))
+        self.assertEqual(command, "sad")
+        self.assertEqual(decoded.stamps, trace.stamps)
+        self.assertEqual(
+            decoded.durations(),
+            [("captured", "decoded", 0.5), ("decoded", "matched", 0.25), ("captured", "matched", 0.75)],
+        )
+        self.assertEqual(LatencyTrace.decode("happy"), ("happy", None))
+
+    def test_histograms(self):
+        """Check that durations are counted in their buckets, in the Prometheus text format."""
+        histograms = LatencyHistograms(buckets=(0.1, 1.0))
+        histograms.observe(LatencyTrace([("received", 0.0), ("animated", 0.05)]))
+        histograms.observe(LatencyTrace([("received", 0.0), ("animated", 0.5)]))
+
+        text = histograms.to_prometheus()
+        labels = 'since="received",stage="animated"'
+        self.assertIn('readingtorobot_reaction_latency_seconds_bucket{{{},le="0.1"}} 1'.format(labels), text)
+        self.assertIn('readingtorobot_reaction_latency_seconds_bucket{{{},le="1.0"}} 2'.format(labels), text)
+        self.assertIn("readingtorobot_reaction_latency_seconds_count{{{}}} 2".format(labels), text)
+
+    def test_robot_records_trace(self):
+        """Check that the robot side completes the trace of a command, and writes the histograms."""
+        path = os.path.join(self._dir, "latency.prom")
+        robot = RecordingRobot()
+        reaction = FeelingReaction(robot, latency_file=path)
+        trace = LatencyTrace()
+        for stage in ("captured", "decoded", "matched"):
+            trace.mark(stage)
+
+        for payload in (trace.encode("sad"), "happy", trace.encode("unknown")):
+            reaction.process_text(payload)
+            self.assertTrue(reaction.wait_idle(1))
+        reaction.stop()
+
+        self.assertEqual(robot.feelings, [Feel.SAD, Feel.HAPPY])
+        self.assertEqual(reaction.latency.count("matched", "received"), 1)
+        self.assertEqual(reaction.latency.count("received", "animated"), 1)
+        self.assertEqual(reaction.latency.count("captured", "animated"), 1)
+        with open(path) as f:
+            self.assertIn('since="captured",stage="animated"', f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
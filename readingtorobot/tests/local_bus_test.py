@@ -0,0 +1,84 @@
+"""Unit test for the LocalBus class, replacing the MQTT broker in a single process."""
+import threading
+import time
+import unittest
+
+from readingtorobot.common import Feel, FeelingReaction, LocalBus, MQTTManager
+from readingtorobot.common.messages import Command
+from readingtorobot.tests.robots import RecordingRobot
+
+
+class LocalBusTests(unittest.TestCase):
+    """Test Case for the LocalBus class."""
+
+    def setUp(self):
+        """Connect a robot and the speech service to a bus."""
+        self._bus = LocalBus()
+        self._robot = RecordingRobot()
+        self._stopped = threading.Event()
+        self._reaction = FeelingReaction(self._robot)
+        self._robot_client = MQTTManager("robot", self._stopped.set, self._reaction.process_text, transport=self._bus)
+        self._speech_client = MQTTManager("speech", lambda: None, transport=self._bus)
+        self.assertTrue(self._robot_client.start(wait=True))
+        self.assertTrue(self._speech_client.start(wait=True))
+
+    def tearDown(self):
+        """Disconnect the clients."""
+        for manager in (self._robot_client, self._speech_client):
+            manager._client.disconnect()
+            manager._client.loop_stop()
+        self._reaction.stop()
+
+    def test_command_delivery(self):
+        """Check that the commands of the speech service reach the robot without a broker."""
+        start = time.perf_counter()
+        self._speech_client.publish("speech/cmd", Command("sad", confidence=0.75).encode())
+        self.assertTrue(self._robot.felt.wait(1))
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertEqual(self._robot.feelings, [Feel.SAD])
+
+        self._speech_client.publish("robot/stop")
+        self.assertTrue(self._stopped.wait(1))
+
+    def test_stopped_client_leaves_bus(self):
+        """Check that a stopped client no longer receives messages, so they do not pile up in its queue."""
+        client = self._robot_client._client
+        self._speech_client.publish("robot/stop")
+        self.assertTrue(self._stopped.wait(1))
+        deadline = time.perf_counter() + 3
+        while client._thread is not None and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(client._thread)
+
+        for _ in range(10):
+            self._speech_client.publish("speech/cmd", Command("sad", confidence=0.75).encode())
+        self.assertTrue(client._inbox.empty())
+        self.assertNotIn(client, self._bus._clients)
+
+    def test_publish_is_complete(self):
+        """Check that a message is reported published when `publish` returns, as nothing is left to send."""
+        info = self._speech_client.publish("speech/cmd", Command("sad", confidence=0.75).encode())
+        self.assertTrue(info.is_published())
+        self.assertEqual(info.rc, 0)
+        info.wait_for_publish()
+        self.assertTrue(self._robot.felt.wait(1))
+
+    def test_topic_semantics(self):
+        """Check that wildcard subscriptions and retained messages behave as with a broker."""
+        books = []
+        self._speech_client.publish("speech/station1/book", "the_teeny_tree", retain=True)
+        self._speech_client.publish("speech/station2/book", "not retained")
+        self._robot_client.add_callback("speech/+/book", books.append)
+        self._speech_client.publish("speech/station2/cmd", "happy")
+        self._speech_client.publish("speech/station2/book", "the_three_little_pigs")
+
+        deadline = time.perf_counter() + 1
+        while len(books) < 2 and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(books, ["the_teeny_tree", "the_three_little_pigs"])
+        self.assertTrue(self._reaction.wait_idle(1))
+        self.assertEqual(self._robot.feelings, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Unit test for the Command messages sent to the robots."""
+import time
+import unittest
+
+from readingtorobot.common.feeling_expression import Feel, FeelingReaction
+from readingtorobot.common.latency import LatencyTrace
+from readingtorobot.common.messages import Command
+from readingtorobot.tests.robots import RecordingRobot
+
+
+class CommandTests(unittest.TestCase):
+    """Test Case for the Command class."""
+
+    def test_binary_round_trip(self):
+        """Check that all the fields of a command survive its binary encoding."""
+        trace = LatencyTrace([("captured", 1000.25), ("decoded", 1000.5), ("matched", 1000.75)])
+        payload = Command("sad", confidence=0.75, line=12, session="station1", trace=trace).encode()
+        self.assertLess(len(payload), 64)
+
+        command = Command.decode(payload)
+        self.assertEqual((command.command, command.confidence, command.line), ("sad", 0.75, 12))
+        self.assertEqual(command.session, "station1")
+        self.assertEqual(command.captured_at, 1000.25)
+        self.assertEqual(command.trace.stamps, trace.stamps)
+
+        command = Command.decode(Command("happy").encode())
+        self.assertEqual(command.command, "happy")
+        self.assertEqual((command.confidence, command.line, command.session, command.trace), (None, None, None, None))
+
+    def test_text_payloads(self):
+        """Check that text payloads are still accepted, and that broken binary payloads are rejected."""
+        self.assertEqual(Command.decode(b"happy").command, "happy")
+        command = Command.decode(b"sad;captured=1000.5;decoded=1001.0")
+        self.assertEqual((command.command, command.captured_at), ("sad", 1000.5))
+
+        payload = Command("sad", session="station1").encode()
+        with self.assertRaises(ValueError):
+            Command.decode(payload[:-3])
+        with self.assertRaises(ValueError):
+            Command.decode(payload[:1] + b"\x09" + payload[2:])
+
+    def test_robot_drops_stale_and_unconfident_commands(self):
+        """Check that old and low-confidence commands are not executed."""
+        robot = RecordingRobot()
+        reaction = FeelingReaction(robot, min_confidence=0.6, max_capture_age=5)
+        old = LatencyTrace([("captured", time.time() - 10)])
+        recent = LatencyTrace([("captured", time.time())])
+
+        for payload in (
+            Command("sad", confidence=0.9, trace=old).encode(),
+            Command("scared", confidence=0.5, trace=recent).encode(),
+            Command("happy", confidence=0.9, trace=recent).encode(),
+            "excited",
+        ):
+            reaction.process_text(payload)
+            self.assertTrue(reaction.wait_idle(1))
+        reaction.stop()
+
+        self.assertEqual(robot.feelings, [Feel.HAPPY, Feel.EXCITED])
+
+
+if __name__ == "__main__":
+    unittest.main()
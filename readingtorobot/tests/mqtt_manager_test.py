@@ -0,0 +1,376 @@
+"""Unit test for the MQTTManager class, using a minimal local stand-in for the MQTT broker."""
+import importlib.util
+import os
+import socket
+import threading
+import time
+import unittest
+
+import paho.mqtt.client as mqtt
+
+from readingtorobot.common.mqtt_manager import MQTTManager
+
+STOP_ROBOT_TOOL = os.path.join(os.path.dirname(__file__), "..", "..", "tools", "stop_robot.py")
+
+
+def read_length(data, position):
+    """Read a variable length integer, returning it and the position after it."""
+    value, shift = 0, 0
+    while True:
+        byte = data[position]
+        position += 1
+        value += (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, position
+
+
+def encode_length(value):
+    """Encode a variable length integer."""
+    data = b""
+    while True:
+        byte, value = value & 0x7F, value >> 7
+        data += bytes([byte | (0x80 if value else 0)])
+        if not value:
+            return data
+
+
+def read_text(data, position):
+    """Read a length-prefixed string, returning it and the position after it."""
+    size = int.from_bytes(data[position : position + 2], "big")
+    return data[position + 2 : position + 2 + size].decode("utf-8"), position + 2 + size
+
+
+class FakeBroker:
+    """
+    Accept MQTT 3.1.1 and 5 connections, acknowledging connections, subscriptions and publications.
+
+    It records the connections (client ID, clean session/start flag and raw v5 properties), the subscribed topics and
+    their QoS, and the messages published (topic, QoS, raw v5 properties and payload).
+
+    Published messages are forwarded to the subscribed clients, at the lowest of the QoS of the message and of the
+    subscription. The subscriptions of persistent sessions are kept after a disconnection, and their QoS 1 messages
+    are queued until the client connects again.
+    """
+
+    def __init__(self):
+        """Start listening on a free port."""
+        self.subscriptions = []
+        self.qos = {}
+        self.sessions = []
+        self.messages = []
+        self.acknowledged = []
+        self.connections = 0
+        self._clients = []
+        # Client ID -> {"subscriptions": {topic: QoS}, "queue": [(topic, payload, QoS)], "client", "version"}
+        self._session_state = {}
+        self._packet_id = 0
+        self._lock = threading.Lock()
+        self._server = socket.socket()
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(("127.0.0.1", 0))
+        self.port = self._server.getsockname()[1]
+        self._listen()
+
+    def _listen(self):
+        """Accept connections in a background thread."""
+        self._server.listen(5)
+        server = self._server
+        threading.Thread(target=self._accept, args=(server,), daemon=True).start()
+
+    def _accept(self, server):
+        """Serve every client connecting to the server socket."""
+        while True:
+            try:
+                client, _ = server.accept()
+            except OSError:
+                return
+            self._clients.append(client)
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        """Answer the packets of a client until it disconnects."""
+        version = 4
+        state = None
+        try:
+            while True:
+                header = client.recv(1)
+                if not header:
+                    return
+                length, shift = 0, 0
+                while True:
+                    byte = client.recv(1)[0]
+                    length += (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = b""
+                while len(body) < length:
+                    body += client.recv(length - len(body))
+                kind = header[0] >> 4
+                if kind == 1:  # CONNECT
+                    _, position = read_text(body, 0)
+                    version, flags = body[position], body[position + 1]
+                    position += 4
+                    properties = b""
+                    if version == 5:
+                        size, position = read_length(body, position)
+                        properties = body[position : position + size]
+                        position += size
+                    client_id, _ = read_text(body, position)
+                    self.sessions.append((client_id, bool(flags & 0x02), properties))
+                    self.connections += 1
+                    with self._lock:
+                        if flags & 0x02 or client_id not in self._session_state:
+                            self._session_state[client_id] = {"subscriptions": {}, "queue": []}
+                        state = self._session_state[client_id]
+                        state.update(client=client, version=version)
+                        client.sendall(b"\x20\x03\x00\x00\x00" if version == 5 else b"\x20\x02\x00\x00")
+                        for message in state["queue"]:
+                            self._deliver(state, *message)
+                        state["queue"] = []
+                elif kind == 8:  # SUBSCRIBE
+                    position = 2
+                    if version == 5:
+                        size, position = read_length(body, position)
+                        position += size
+                    granted = b""
+                    while position < len(body):
+                        topic, position = read_text(body, position)
+                        self.subscriptions.append(topic)
+                        self.qos[topic] = body[position] & 0x03
+                        with self._lock:
+                            state["subscriptions"][topic] = body[position] & 0x03
+                        granted += bytes([body[position] & 0x03])
+                        position += 1
+                    if version == 5:
+                        granted = b"\x00" + granted
+                    client.sendall(bytes([0x90, 2 + len(granted)]) + body[:2] + granted)
+                elif kind == 3:  # PUBLISH
+                    qos = (header[0] >> 1) & 0x03
+                    topic, position = read_text(body, 0)
+                    if qos:
+                        packet_id = body[position : position + 2]
+                        position += 2
+                        client.sendall(b"\x40\x02" + packet_id)
+                    properties = b""
+                    if version == 5:
+                        size, position = read_length(body, position)
+                        properties = body[position : position + size]
+                        position += size
+                    self.messages.append((topic, qos, properties, body[position:]))
+                    self._route(topic, body[position:], qos)
+                elif kind == 4:  # PUBACK
+                    self.acknowledged.append(body[:2])
+                elif kind == 12:  # PINGREQ
+                    client.sendall(b"\xd0\x00")
+        except OSError:
+            return
+        finally:
+            with self._lock:
+                if state is not None and state.get("client") is client:
+                    state["client"] = None
+
+    def _route(self, topic, payload, qos):
+        """Forward a message to the subscribed clients, queuing it for the disconnected persistent sessions."""
+        with self._lock:
+            for state in self._session_state.values():
+                granted = [q for sub, q in state["subscriptions"].items() if mqtt.topic_matches_sub(sub, topic)]
+                if not granted:
+                    continue
+                message = (topic, payload, min(qos, max(granted)))
+                if state["client"] is not None:
+                    self._deliver(state, *message)
+                elif message[2]:
+                    state["queue"].append(message)
+
+    def _deliver(self, state, topic, payload, qos):
+        """Send a message to the client of a session (with the lock held)."""
+        self._packet_id += 1
+        try:
+            state["client"].sendall(self._publish_packet(topic, payload, qos, self._packet_id, state["version"]))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _publish_packet(topic, payload, qos, packet_id, version=5):
+        """Build a PUBLISH packet (with QoS 0 or 1)."""
+        body = len(topic).to_bytes(2, "big") + topic.encode("utf-8")
+        if qos:
+            body += packet_id.to_bytes(2, "big")
+        if version == 5:
+            body += b"\x00"
+        body += payload
+        return bytes([0x30 | qos << 1]) + encode_length(len(body)) + body
+
+    def send(self, topic, payload, qos=1, packet_id=1):
+        """Send a message to the clients (as MQTT 5, with QoS 0 or 1)."""
+        for client in self._clients:
+            client.sendall(self._publish_packet(topic, payload, qos, packet_id))
+
+    def close(self):
+        """Close the server and all the connections."""
+        self._server.close()
+        for client in self._clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            client.close()
+        self._clients = []
+
+    def restart(self, downtime):
+        """Close everything, and accept connections on the same port again after some time."""
+        self.close()
+        time.sleep(downtime)
+        self._server = socket.socket()
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(("127.0.0.1", self.port))
+        self._listen()
+
+
+def wait_until(condition, timeout):
+    """Wait until a condition is true, and return the time it took (None on timeout)."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if condition():
+            return time.perf_counter() - start
+        time.sleep(0.01)
+    return None
+
+
+class MQTTManagerTests(unittest.TestCase):
+    """Test Case for the MQTTManager class."""
+
+    def setUp(self):
+        """Start the broker stand-in."""
+        self._broker = FakeBroker()
+        self._manager = None
+
+    def tearDown(self):
+        """Stop the client and the broker stand-in."""
+        if self._manager is not None:
+            self._manager._client.disconnect()
+            self._manager._client.loop_stop()
+        self._broker.close()
+
+    def test_start_does_not_block(self):
+        """Check that starting without a broker returns immediately, and that the client connects once it is up."""
+        port = self._broker.port
+        self._broker.close()
+        self._manager = MQTTManager("robot", lambda: None, timeout=20, server_ip="127.0.0.1", server_port=port)
+
+        start = time.perf_counter()
+        self.assertFalse(self._manager.start())
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+        self._broker.restart(0.5)
+        self.assertTrue(self._manager.wait_connected(5))
+
+    def test_resubscribe_after_broker_restart(self):
+        """Check that the client reconnects within a second of the broker coming back, with all its subscriptions."""
+        self._manager = MQTTManager("robot", lambda: None, server_ip="127.0.0.1", server_port=self._broker.port)
+        self._manager.add_callback("speech/book", lambda _: None)
+        self.assertTrue(self._manager.start(wait=True))
+        self.assertIsNotNone(wait_until(lambda: len(self._broker.subscriptions) == 3, 2))
+
+        self._broker.subscriptions = []
+        self._broker.restart(2)
+        elapsed = wait_until(lambda: self._manager.connected, 5)
+        self.assertIsNotNone(elapsed)
+        self.assertLess(elapsed, 1.0)
+        self.assertIsNotNone(wait_until(lambda: len(self._broker.subscriptions) == 3, 2))
+        self.assertEqual(sorted(self._broker.subscriptions), ["robot/stop", "speech/book", "speech/cmd"])
+        self.assertEqual(self._broker.connections, 2)
+
+    def test_persistent_session(self):
+        """Check that the session is persistent, with a stable client ID, and that each topic has its QoS."""
+        self._manager = MQTTManager("robot", lambda: None, server_ip="127.0.0.1", server_port=self._broker.port)
+        self._manager.add_callback("speech/book", lambda _: None)
+        self.assertTrue(self._manager.start(wait=True))
+        self.assertIsNotNone(wait_until(lambda: len(self._broker.qos) == 3, 2))
+        self.assertEqual(self._broker.qos, {"robot/stop": 1, "speech/cmd": 1, "speech/book": 0})
+        # Clean start not set, and session expiry interval (0x11) of 600 s.
+        client_id = "robot-{}-{}".format(socket.gethostname(), os.getpid())
+        self.assertEqual(self._broker.sessions, [(client_id, False, b"\x11" + (600).to_bytes(4, "big"))])
+
+        self._broker.restart(0.5)
+        self.assertIsNotNone(wait_until(lambda: len(self._broker.sessions) == 2, 5))
+        self.assertEqual(self._broker.sessions[1][:2], (client_id, False))
+
+    def test_client_id(self):
+        """Check that the default client ID differs from the name, so that it is not shared by other processes."""
+        self._manager = MQTTManager("robot", lambda: None, server_ip="127.0.0.1", server_port=self._broker.port)
+        self.assertNotEqual(self._manager.client_id, "robot")
+        self.assertTrue(self._manager.client_id.startswith("robot-"))
+        custom = MQTTManager("robot", lambda: None, client_id="robot-1", server_ip="127.0.0.1")
+        self.assertEqual(custom.client_id, "robot-1")
+
+    def test_message_expiry(self):
+        """Check that commands are published with QoS 1 and an expiry, and that other topics are not."""
+        self._manager = MQTTManager("speech", lambda: None, server_ip="127.0.0.1", server_port=self._broker.port)
+        self.assertTrue(self._manager.start(wait=True))
+        self._manager.publish("speech/cmd", b"sad")
+        self._manager.publish("speech/station1/cmd", b"happy")
+        self._manager.publish("speech/other", b"text", expiry=60)
+        self.assertIsNotNone(wait_until(lambda: len(self._broker.messages) == 4, 2))
+
+        messages = {topic: (qos, properties, payload) for topic, qos, properties, payload in self._broker.messages}
+        # Message expiry interval (0x02) in seconds.
+        self.assertEqual(messages["speech/cmd"], (1, b"\x02" + (5).to_bytes(4, "big"), b"sad"))
+        self.assertEqual(messages["speech/station1/cmd"], (1, b"\x02" + (5).to_bytes(4, "big"), b"happy"))
+        self.assertEqual(messages["speech/other"], (0, b"\x02" + (60).to_bytes(4, "big"), b"text"))
+        self.assertEqual(messages["speech/started"], (0, b"", b"1"))
+
+    def test_mqtt_v311(self):
+        """Check that persistent sessions and QoS are also used with MQTT 3.1.1, without expiry."""
+        self._manager = MQTTManager(
+            "speech", lambda: None, server_ip="127.0.0.1", server_port=self._broker.port, protocol=mqtt.MQTTv311
+        )
+        self.assertTrue(self._manager.start(wait=True))
+        self._manager.publish("speech/cmd", b"sad")
+        self.assertIsNotNone(wait_until(lambda: len(self._broker.messages) == 2, 2))
+        self.assertEqual(self._broker.sessions, [(self._manager.client_id, False, b"")])
+        self.assertIn(("speech/cmd", 1, b"", b"sad"), self._broker.messages)
+
+    def test_stop_acknowledged(self):
+        """Check that the stop command is acknowledged, so that it is not delivered again with the session."""
+        stopped = threading.Event()
+        self._manager = MQTTManager("robot", stopped.set, server_ip="127.0.0.1", server_port=self._broker.port)
+        self.assertTrue(self._manager.start(wait=True))
+        self.assertIsNotNone(wait_until(lambda: len(self._broker.qos) == 2, 2))
+
+        self._broker.send("robot/stop", b"", qos=1, packet_id=7)
+        self.assertTrue(stopped.wait(2))
+        self.assertIsNotNone(wait_until(lambda: b"\x00\x07" in self._broker.acknowledged, 2))
+
+    def test_stop_reaches_disconnected_robot(self):
+        """Check that a stop sent while the robot is disconnected is delivered once it reconnects, and confirmed."""
+        spec = importlib.util.spec_from_file_location("stop_robot", STOP_ROBOT_TOOL)
+        stop_robot = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(stop_robot)
+
+        stopped = threading.Event()
+        robot = MQTTManager("robot", stopped.set, server_ip="127.0.0.1", server_port=self._broker.port)
+        self.assertTrue(robot.start(wait=True))
+        self.assertIsNotNone(wait_until(lambda: len(self._broker.qos) == 2, 2))
+        robot.disconnect()
+
+        results = []
+        sender = threading.Thread(
+            target=lambda: results.append(stop_robot.stop_robot("robot", "127.0.0.1", self._broker.port, timeout=5))
+        )
+        sender.start()
+        self.assertIsNotNone(wait_until(lambda: any(m[0] == "robot/stop" for m in self._broker.messages), 5))
+        self.assertIn(("robot/stop", 1), [message[:2] for message in self._broker.messages])
+        self.assertFalse(stopped.is_set())
+
+        self._manager = MQTTManager("robot", stopped.set, server_ip="127.0.0.1", server_port=self._broker.port)
+        self.assertTrue(self._manager.start(wait=True))
+        self.assertTrue(stopped.wait(2))
+        sender.join(5)
+        self.assertEqual(results, [True])
+
+
+if __name__ == "__main__":
+    unittest.main()
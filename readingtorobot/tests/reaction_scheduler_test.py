@@ -0,0 +1,95 @@
+"""Unit test for the ReactionScheduler class."""
+import threading
+import time
+import unittest
+
+from readingtorobot.common import Feel, ReactionScheduler
+
+
+class FakeClock:
+    """Clock advanced by hand."""
+
+    def __init__(self):
+        """Initialize FakeClock."""
+        self.now = 1000.0
+
+    def __call__(self):
+        """Return the current time."""
+        return self.now
+
+
+class ReactionSchedulerTests(unittest.TestCase):
+    """Test Case for the ReactionScheduler class."""
+
+    def setUp(self):
+        """Create a scheduler on a fake clock."""
+        self._clock = FakeClock()
+        self._scheduler = ReactionScheduler(cooldown=4.0, max_queued=2, max_age=2.0, clock=self._clock)
+
+    def test_cooldown(self):
+        """Check that a reaction is not played twice within its cooldown, unlike other reactions."""
+        self.assertTrue(self._scheduler.submit(Feel.SAD))
+        self.assertEqual(self._scheduler.next(), Feel.SAD)
+        self._clock.now += 1.0
+        self.assertFalse(self._scheduler.submit(Feel.SAD))
+        self.assertTrue(self._scheduler.submit(Feel.HAPPY))
+        self.assertEqual(self._scheduler.next(), Feel.HAPPY)
+
+        self._clock.now += 3.5
+        self.assertTrue(self._scheduler.submit(Feel.SAD, "sad animation"))
+        self.assertEqual(self._scheduler.next(), "sad animation")
+        # The interaction start and end have no cooldown.
+        for _ in range(2):
+            self.assertTrue(self._scheduler.submit(Feel.END))
+            self.assertEqual(self._scheduler.next(), Feel.END)
+
+    def test_queue_depth_and_priority(self):
+        """Check that the least important reactions are dropped when the queue is full."""
+        self.assertTrue(self._scheduler.submit(Feel.SAD))
+        self.assertTrue(self._scheduler.submit(Feel.END))
+        self.assertTrue(self._scheduler.submit(Feel.HAPPY))  # Replaces SAD
+        self.assertTrue(self._scheduler.submit(Feel.START))  # Replaces HAPPY
+        self.assertFalse(self._scheduler.submit(Feel.SCARED))
+        self.assertEqual([self._scheduler.next(), self._scheduler.next()], [Feel.END, Feel.START])
+        self.assertIsNone(self._scheduler.next())
+
+    def test_stale_reactions(self):
+        """Check that reactions that waited too long are never played."""
+        self._scheduler.submit(Feel.SAD)
+        self._scheduler.submit(Feel.HAPPY, created_at=self._clock.now - 1.5)
+        self._clock.now += 1.0
+        self.assertEqual(self._scheduler.next(), Feel.SAD)
+        self.assertFalse(self._scheduler.pending)
+
+    def test_priority_of_a_reaction(self):
+        """Check that a reaction can be given its own priority, instead of the priority of its kind."""
+        scheduler = ReactionScheduler(max_queued=1, clock=self._clock)
+        self.assertTrue(scheduler.submit("wave", priority=2))
+        self.assertFalse(scheduler.submit(Feel.END))
+        self.assertTrue(scheduler.submit("bow", priority=2))
+        self.assertEqual(scheduler.next(), "bow")
+
+    def test_close(self):
+        """Check that closing the scheduler wakes up the threads waiting for reactions, and refuses new ones."""
+        scheduler = ReactionScheduler()
+        threading.Timer(0.1, scheduler.close).start()
+        start = time.perf_counter()
+        self.assertIsNone(scheduler.next(timeout=None))
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertFalse(scheduler.wait())
+        self.assertFalse(scheduler.submit(Feel.SAD))
+        self.assertFalse(scheduler.pending)
+
+    def test_wait(self):
+        """Check that idle animations waiting on the scheduler are woken up by a reaction."""
+        scheduler = ReactionScheduler()
+        self.assertFalse(scheduler.wait(0.05))
+        threading.Timer(0.1, scheduler.submit, args=(Feel.SAD,)).start()
+        start = time.perf_counter()
+        self.assertTrue(scheduler.wait(5))
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(scheduler.next(timeout=1), Feel.SAD)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+"""Unit test for the recognizer backends."""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import wave
+
+import numpy as np
+
+from readingtorobot.common.recognizers import DeepSpeechBackend, RecognitionMetrics, ReplayBackend
+from readingtorobot.common.voice_recognition import VoiceRecognition
+
+
+class FakeStream:
+    """DeepSpeech stream returning the number of samples fed."""
+
+    def __init__(self):
+        """Initialize stream."""
+        self.samples = 0
+        self.freed = False
+
+    def feedAudioContent(self, frames):
+        """Add audio."""
+        self.samples += len(frames)
+
+    def intermediateDecode(self):
+        """Return partial text."""
+        return "partial {}".format(self.samples)
+
+    def finishStream(self):
+        """Return final text."""
+        return "final {}".format(self.samples)
+
+    def freeStream(self):
+        """Discard stream."""
+        self.freed = True
+
+
+class FakeModel:
+    """DeepSpeech model creating fake streams."""
+
+    def __init__(self):
+        """Initialize model."""
+        self.streams = []
+
+    def createStream(self):
+        """Create a new stream."""
+        self.streams.append(FakeStream())
+        return self.streams[-1]
+
+
+class RecognizerBackendTests(unittest.TestCase):
+    """Test Case for the recognizer backends."""
+
+    def test_deepspeech_stream_per_utterance(self):
+        """Check that a DeepSpeech stream is created for each utterance, and released when discarded."""
+        model = FakeModel()
+        backend = DeepSpeechBackend(model)
+        backend.feed(np.zeros(8000, dtype=np.int16))
+        self.assertEqual(backend.partial(), "partial 8000")
+        backend.feed(np.zeros(8000, dtype=np.int16))
+        self.assertEqual(backend.finish(), "final 16000")
+        self.assertEqual(backend.finish(), "")
+
+        backend.feed(np.zeros(160, dtype=np.int16))
+        backend.close()
+        self.assertEqual(len(model.streams), 2)
+        self.assertTrue(model.streams[1].freed)
+
+    def test_shared_model_lock(self):
+        """Check that backends sharing a model and its lock never use the model at the same time."""
+        model = FakeModel()
+        lock = threading.Lock()
+        active = [0]
+        overlaps = []
+
+        def feed(frames):
+            active[0] += 1
+            overlaps.append(active[0] > 1)
+            time.sleep(0.001)
+            active[0] -= 1
+
+        def decode(backend):
+            for _ in range(20):
+                backend.feed(np.zeros(160, dtype=np.int16))
+
+        backends = [DeepSpeechBackend(model, lock=lock) for _ in range(2)]
+        for backend in backends:
+            backend.feed(np.zeros(160, dtype=np.int16))
+        for stream in model.streams:
+            stream.feedAudioContent = feed
+        threads = [threading.Thread(target=decode, args=(backend,)) for backend in backends]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(overlaps), 40)
+        self.assertFalse(any(overlaps))
+
+    def test_replay_from_file(self):
+        """Check that transcripts are replayed in order, and that the metrics of all backends are accumulated."""
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("molly was very sad\n\nthis is silly\n")
+        try:
+            metrics = RecognitionMetrics()
+            backend = ReplayBackend(f.name, real_time_factor=0.01, metrics=metrics)
+            other = ReplayBackend(["this is silly"], metrics=metrics)
+            texts = [backend.recognize(np.zeros(16000, dtype=np.int16)) for _ in range(3)]
+            other.recognize(np.zeros(8000, dtype=np.int16))
+        finally:
+            os.remove(f.name)
+
+        self.assertEqual(texts, ["molly was very sad", "this is silly", "molly was very sad"])
+        self.assertEqual(metrics.utterances, 4)
+        self.assertAlmostEqual(metrics.audio_seconds, 3.5)
+        self.assertGreaterEqual(metrics.real_time_factor, 0.03 / 3.5)
+        self.assertIn("4 utterances", str(metrics))
+
+
+class IncrementalRecognition(VoiceRecognition):
+    """Voice recognition decoding with a fake DeepSpeech model in 'incremental' mode, keeping the processed texts."""
+
+    def __init__(self, *args, **kwargs):
+        """Initialize IncrementalRecognition."""
+        super().__init__(*args, **kwargs)
+        self._backend = DeepSpeechBackend(FakeModel(), metrics=self.metrics)
+        self._mode = "incremental"
+        self.texts = []
+        self.received = threading.Event()
+        # Any sound is speech.
+        self._audio_proc._vad.is_speech = lambda frame, rate: bool(np.any(np.frombuffer(frame, dtype=np.int16)))
+
+    def _process_text(self, text, trace=None):
+        """Keep a processed text."""
+        self.texts.append(text)
+        self.received.set()
+
+
+class IncrementalRecognitionTests(unittest.TestCase):
+    """Test Case for the 'incremental' recognition mode."""
+
+    def setUp(self):
+        """Write a file with one utterance, long enough for several partial results."""
+        self._dir = tempfile.mkdtemp()
+        self._file = os.path.join(self._dir, "speech.wav")
+        noise = np.random.default_rng(0).integers(-3000, 3000, 32000)
+        with wave.open(self._file, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(16000)
+            wf.writeframes(np.concatenate([np.zeros(8000), noise, np.zeros(16000)]).astype(np.int16).tobytes())
+        replay_file = os.path.join(self._dir, "replay.txt")
+        with open(replay_file, "w") as f:
+            f.write("unused")
+        self._overrides = {
+            "file": self._file,
+            "replay_file": replay_file,
+            "replay_speed": 1,
+            "processing_interval": 0.1,
+            "book_cache": None,
+            "config_poll_interval": 0,
+        }
+
+    def tearDown(self):
+        """Remove the files."""
+        shutil.rmtree(self._dir)
+
+    def test_final_text_only(self):
+        """Check that an utterance is processed once, with its final text, and not with its partial results."""
+        recognition = IncrementalRecognition(interpreter="replay", overrides=self._overrides)
+        recognition.start()
+        try:
+            self.assertTrue(recognition.received.wait(5))
+        finally:
+            recognition.stop()
+        self.assertEqual(len(recognition.texts), 1)
+        self.assertTrue(recognition.texts[0].startswith("final "), recognition.texts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+"""Unit test for the StreamingResampler class."""
+import unittest
+
+import numpy as np
+from scipy import signal
+
+from readingtorobot.common.resampling import StreamingResampler
+
+
+class StreamingResamplerTests(unittest.TestCase):
+    """Test Case for the StreamingResampler class."""
+
+    def test_blocks_match_whole_signal(self):
+        """Check that resampling block by block gives the same result as filtering the whole signal at once."""
+        x = np.random.default_rng(0).normal(size=44100)
+        resampler = StreamingResampler(44100, 16000)
+        out = np.concatenate([resampler.process(x[i : i + 1000]) for i in range(0, len(x), 1000)])
+
+        h = signal.firwin(2 * 4410 + 1, 1.0 / 441, window=("kaiser", 5.0)) * 160
+        reference = signal.upfirdn(h, x, 160, 441)
+
+        self.assertEqual(len(out), 16000)
+        np.testing.assert_allclose(out, reference[: len(out)], atol=1e-9)
+
+    def test_constant_block_output_size(self):
+        """Check that each 20 ms block at 44.1 kHz produces one 20 ms block at 16 kHz."""
+        resampler = StreamingResampler(44100, 16000)
+        for _ in range(5):
+            self.assertEqual(len(resampler.process(np.zeros(882))), 320)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,16 @@
+"""Robots used by the unit tests in place of the real ones."""
+import threading
+
+
+class RecordingRobot:
+    """Robot recording the feelings it is asked to express."""
+
+    def __init__(self):
+        """Initialize RecordingRobot."""
+        self.feelings = []
+        self.felt = threading.Event()
+
+    def do_feel(self, feeling):
+        """Record a feeling."""
+        self.feelings.append(feeling)
+        self.felt.set()
@@ -0,0 +1,106 @@
+"""Unit test for the speech services, replaying WAV files and publishing on an in-process bus."""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import wave
+
+import numpy as np
+
+from readingtorobot.common import LocalBus
+from readingtorobot.common.messages import Command
+from readingtorobot.common.speech_service import MultiSpeechService
+
+
+def energy_vad(frame, rate):
+    """Detect speech as any frame that is not silent."""
+    del rate
+    return bool(np.any(np.frombuffer(frame, dtype=np.int16)))
+
+
+class MultiSpeechServiceTests(unittest.TestCase):
+    """Test Case for the MultiSpeechService class."""
+
+    def setUp(self):
+        """Write a WAV file with one utterance, a transcript per session and a configuration file."""
+        self._dir = tempfile.mkdtemp()
+        audio = os.path.join(self._dir, "speech.wav")
+        rng = np.random.default_rng(0)
+        with wave.open(audio, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(16000)
+            data = [np.zeros(8000), rng.integers(-3000, 3000, 16000), np.zeros(8000)]
+            wf.writeframes(np.concatenate(data).astype(np.int16).tobytes())
+
+        sessions = []
+        for name, transcript in [("station1", "molly was very sad"), ("station2", "this is silly")]:
+            replay_file = os.path.join(self._dir, "{}.txt".format(name))
+            with open(replay_file, "w") as f:
+                f.write(transcript)
+            sessions.append({"name": name, "replay_file": replay_file})
+
+        self._config = os.path.join(self._dir, "config.json")
+        with open(self._config, "w") as f:
+            json.dump(
+                {
+                    "file": audio,
+                    "replay_speed": 0,
+                    "recognition_mode": "window",
+                    "book_cache": None,
+                    "config_poll_interval": 0,
+                    "sessions": sessions,
+                },
+                f,
+            )
+
+        self._bus = LocalBus()
+        self._commands = []
+        self._received = threading.Event()
+        self._listener = self._bus.client("robot")
+        self._listener.message_callback_add("speech/+/cmd", self._on_command)
+        self._listener.loop_start()
+        self._listener.subscribe("speech/+/cmd")
+
+    def tearDown(self):
+        """Disconnect the listener and remove the files."""
+        self._listener.disconnect()
+        self._listener.loop_stop()
+        shutil.rmtree(self._dir)
+
+    def _on_command(self, client, userdata, message):
+        """Record the topic, command and session of a message."""
+        del client, userdata
+        command = Command.decode(message.payload)
+        self._commands.append((message.topic, command.command, command.session))
+        if len(self._commands) >= 2:
+            self._received.set()
+
+    def test_sessions(self):
+        """Check that each session publishes its commands on its own topic, with the shared overrides applied."""
+        service = MultiSpeechService(
+            self._config, "replay", overrides={"recognition_mode": "utterance"}, transport=self._bus
+        )
+        for sender in service._senders:
+            self.assertEqual(sender._mode, "utterance")
+            sender._audio_proc._vad.is_speech = energy_vad
+        start = time.perf_counter()
+        service.start()
+        try:
+            self.assertTrue(self._received.wait(5))
+        finally:
+            service.stop()
+
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertEqual(
+            sorted(self._commands),
+            [("speech/station1/cmd", "sad", "station1"), ("speech/station2/cmd", "groan", "station2")],
+        )
+        self.assertFalse(service.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -17,10 +17,10 @@ class SpeechRecoMock(VoiceRecognition):
         """Initialize mock."""
         super().__init__(config=config, interpreter=interpreter)
 
-    def _process_text(self, text):
+    def _process_text(self, text, trace=None):
         """Process the recognized text."""
         self._logger.debug("\033[93mRecognized: {}\033[0m".format(text))
-        op = self._book.evaluate_static_sentence_validity(text)
+        op = self._book.evaluate(text)
         if op is not None:
             self._logger.debug("\033[93mEvaluate text thinks: {}\033[0m".format(op))
 
@@ -0,0 +1,58 @@
+"""Unit test for the batched voice activity detection."""
+import unittest
+
+import numpy as np
+
+from readingtorobot.common.vad import BatchVad, DecisionBitmap
+
+
+class DecisionBitmapTests(unittest.TestCase):
+    """Test Case for the DecisionBitmap class."""
+
+    def test_decisions_across_wrap(self):
+        """Check that the latest decisions are returned in order after the bitmap wraps around."""
+        bitmap = DecisionBitmap(16)
+        decisions = np.random.default_rng(0).random(40) > 0.5
+        for start in range(0, 40, 7):
+            bitmap.append(decisions[start : start + 7])
+
+        self.assertEqual(bitmap.total, 40)
+        self.assertEqual(bitmap.get(0).tolist(), decisions[24:].tolist())
+        self.assertEqual(bitmap.get(30, 35).tolist(), decisions[30:35].tolist())
+        self.assertEqual(bitmap.packed(24), np.packbits(decisions[24:]).tobytes())
+
+    def test_batch_longer_than_capacity(self):
+        """Check that only the newest decisions of a batch larger than the bitmap are kept, at their position."""
+        bitmap = DecisionBitmap(4)
+        bitmap.append([True])
+        bitmap.append([False, False, True, False, True, True])
+
+        self.assertEqual(bitmap.total, 7)
+        self.assertEqual(bitmap.get(0).tolist(), [True, False, True, True])
+        bitmap.append([False])
+        self.assertEqual(bitmap.get(0).tolist(), [False, True, True, False])
+
+
+class BatchVadTests(unittest.TestCase):
+    """Test Case for the BatchVad class."""
+
+    def test_quiet_frames_skip_detector(self):
+        """Check that only frames above the energy threshold are given to the detector."""
+        vad = BatchVad(energy_threshold=30)
+        checked = []
+
+        def is_speech(frame, rate):
+            checked.append(frame)
+            return True
+
+        vad.is_speech = is_speech
+        levels = [0, 10, 100, 1000, 20]
+        frames = [np.full(320, level, dtype=np.int16).tobytes() for level in levels]
+
+        self.assertEqual(vad.classify(frames), [False, False, True, True, False])
+        self.assertEqual(checked, frames[2:4])
+        self.assertEqual(vad.decisions.get(0).tolist(), [False, False, True, True, False])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+    Measure the time needed to prepare a book, for synthetic books of increasing length.
+
+    Books are built from a random vocabulary with a Zipf-like word distribution, in lines of 4 to 12 words. The
+    script times `Book.extract_keywords` (the per-book preprocessing done at startup) and prints the time per word,
+    which stays roughly constant when the cost grows linearly with the length of the book.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from readingtorobot.common.book_reactions import Book
+
+
+def synthetic_book(words, vocabulary=2000, seed=0):
+    """Generate the lines of a synthetic book with the given number of words."""
+    rng = np.random.default_rng(seed)
+    vocab = ["w{}".format(i) for i in range(vocabulary)]
+    probs = 1.0 / np.arange(1, vocabulary + 1)
+    picks = rng.choice(vocabulary, size=words, p=probs / probs.sum())
+
+    lines = []
+    start = 0
+    while start < words:
+        length = int(rng.integers(4, 13))
+        lines.append(" ".join(vocab[i] for i in picks[start : start + length]))
+        start += length
+    return lines
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 3000, 10000, 30000, 100000],
+        help="Book lengths, in words.",
+    )
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="Number of runs per size (best is reported).")
+    args = parser.parse_args()
+
+    print("{:>8} {:>8} {:>12} {:>14}".format("words", "lines", "time (ms)", "us per word"))
+    for size in args.sizes:
+        lines = synthetic_book(size)
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            Book.extract_keywords(lines)
+            best = min(best, time.perf_counter() - start)
+        print("{:>8} {:>8} {:>12.2f} {:>14.3f}".format(size, len(lines), best * 1e3, best * 1e6 / size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+    Compare the sentence matching of `Book` with the original word-by-word implementation.
+
+    Transcripts are read from a file (one recognised text per line), or generated from the lines of a book with
+    typical recognition errors (dropped, inserted and misspelled words). For each implementation, the script prints
+    the time per transcript and the emotions detected, and reports how often both implementations agree.
+"""
+
+import argparse
+import random
+import time
+
+from readingtorobot.common import load_book, resource_file
+from readingtorobot.common.book_reactions import Book, sentencelist
+
+
+def legacy_match(templates, text, last_emotion, threshold=0.5):
+    """Match a text with a linear scan over all templates, as `Book` used to do.
+
+    :param templates: List of {"sentence": List[str], "emotion": str} entries.
+    :param text: Recognised text.
+    :param last_emotion: Emotion of the last match, whose templates are skipped.
+    :param threshold: Minimum score (excluded) of a valid match.
+    :return: Matched emotion or None.
+    """
+    text_list = text.split(" ")
+    matching_sentences = {}
+    for i, s in enumerate(templates):
+        if s["emotion"] == last_emotion:
+            continue
+        for k, word in enumerate(s["sentence"]):
+            if word not in text_list:
+                continue
+            r = text_list.index(word)
+            first_text, first_sentence = (r - k, 0) if r >= k else (0, k - r)
+            length = min(len(text_list) - first_text, len(s["sentence"]) - first_sentence)
+            if length / len(s["sentence"]) > threshold:
+                matching_sentences.setdefault(i, []).append((first_text, first_sentence, length))
+
+    best_score = threshold
+    best_em = None
+    for i, entries in matching_sentences.items():
+        for first_text, first_sentence, length in entries:
+            recorded = text_list[first_text : first_text + length]
+            template = templates[i]["sentence"][first_sentence : first_sentence + length]
+            score = 0
+            for rec, tem in zip(recorded, template):
+                if rec == tem:
+                    score += 1
+            norm_score = score / len(templates[i]["sentence"])
+            if norm_score > best_score:
+                best_score = norm_score
+                best_em = templates[i]["emotion"]
+    return best_em
+
+
+def generate_transcripts(lines, count, seed=0):
+    """Build recognised texts from consecutive book lines, adding recognition errors."""
+    rng = random.Random(seed)
+    vocabulary = sorted({w for line in lines for w in line.split(" ")})
+    transcripts = []
+    for _ in range(count):
+        start = rng.randrange(len(lines))
+        words = " ".join(lines[start : start + rng.randint(1, 3)]).split(" ")
+        noisy = []
+        for word in words:
+            p = rng.random()
+            if p < 0.05:
+                continue
+            if p < 0.1:
+                noisy.append(rng.choice(vocabulary))
+            if p < 0.15 and len(word) > 3:
+                i = rng.randrange(len(word))
+                word = word[:i] + word[i + 1 :]
+            noisy.append(word)
+        transcripts.append(" ".join(noisy))
+    return transcripts
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-t", "--transcripts", type=str, help="File with one recognised text per line.")
+    parser.add_argument("-b", "--book", type=str, default="the_teeny_tree.txt", help="Book used to generate texts.")
+    parser.add_argument("-n", "--count", type=int, default=2000, help="Number of generated texts.")
+    parser.add_argument("-e", "--max_edit_distance", type=int, default=1, help="Tolerance of the fuzzy matching.")
+    args = parser.parse_args()
+
+    if args.transcripts:
+        with open(args.transcripts, "r") as f:
+            transcripts = [line.strip().lower() for line in f if line.strip()]
+    else:
+        lines = [
+            line.replace(",", "").replace("?", "").replace("!", "").lower()
+            for line in load_book(resource_file(args.book))
+        ]
+        transcripts = generate_transcripts(lines, args.count)
+
+    templates = [{"sentence": sen.split(" "), "emotion": em} for em in sentencelist for sen in sentencelist[em]]
+    legacy = []
+    start = time.perf_counter()
+    for text in transcripts:
+        legacy.append(legacy_match(templates, text, None))
+    legacy_time = (time.perf_counter() - start) / len(transcripts)
+
+    results = {}
+    for distance in sorted({0, args.max_edit_distance}):
+        book = Book(max_edit_distance=distance)
+        matches = []
+        start = time.perf_counter()
+        for text in transcripts:
+            book._last_matched_emotion = None
+            matches.append(book.evaluate_static_sentence_validity(text))
+        results[distance] = (matches, (time.perf_counter() - start) / len(transcripts))
+
+    print("{} transcripts".format(len(transcripts)))
+    print("{:>24}: {:8.1f} us/text, {} matches".format("legacy", legacy_time * 1e6, sum(m is not None for m in legacy)))
+    for distance, (matches, elapsed) in results.items():
+        agreement = sum(a == b for a, b in zip(matches, legacy)) / len(transcripts)
+        print(
+            "{:>24}: {:8.1f} us/text, {} matches, {:.1%} agreement with legacy".format(
+                "index (edit distance {})".format(distance),
+                elapsed * 1e6,
+                sum(m is not None for m in matches),
+                agreement,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
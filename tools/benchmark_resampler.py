@@ -0,0 +1,97 @@
+"""
+    Compare the per-block resampling methods available for the audio input.
+
+    The reference is a 16 kHz signal (a WAV file, or a synthetic voiced/silent pattern), which is upsampled to the
+    microphone rate and then brought back to 16 kHz block by block, as `Audio` does with the microphone stream.
+    For each method, the script reports the CPU time per block and the agreement of the VAD decisions with the ones
+    taken on the reference signal.
+"""
+
+import argparse
+import time
+import wave
+
+import numpy as np
+import webrtcvad
+from scipy import signal
+
+from readingtorobot.common.resampling import StreamingResampler, resample_block
+
+RATE_PROCESS = 16000
+BLOCKS_PER_SECOND = 50
+
+
+def synthetic_speech(seconds, rate=RATE_PROCESS, seed=0):
+    """Generate alternating voiced (harmonic) and silent (low noise) segments."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    pitch = 120 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = (np.sin(2 * np.pi * 0.4 * t) > 0).astype(float)
+    audio = 6000 * envelope * voiced / np.abs(voiced).max() + rng.normal(0, 100, len(t))
+    return np.clip(audio, -32768, 32767).astype(np.int16)
+
+
+def load_wav(path):
+    """Load a 16 kHz mono 16 bit WAV file."""
+    with wave.open(path, "rb") as wf:
+        if wf.getframerate() != RATE_PROCESS or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+            raise ValueError("Expected a 16 kHz, mono, 16 bit WAV file: {}".format(path))
+        return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+
+
+def vad_decisions(vad, audio):
+    """Classify consecutive 20 ms blocks of 16 kHz audio."""
+    block = RATE_PROCESS // BLOCKS_PER_SECOND
+    return np.array(
+        [vad.is_speech(audio[i : i + block].tobytes(), RATE_PROCESS) for i in range(0, len(audio) - block + 1, block)]
+    )
+
+
+def run_method(name, process, blocks, vad, reference):
+    """Resample all blocks with the given method and evaluate the result."""
+    outputs = []
+    times = []
+    for block in blocks:
+        start = time.process_time()
+        out = process(block)
+        times.append(time.process_time() - start)
+        outputs.append(np.clip(np.round(out), -32768, 32767).astype(np.int16))
+
+    decisions = vad_decisions(vad, np.concatenate(outputs))
+    n = min(len(decisions), len(reference))
+    agreement = np.mean(decisions[:n] == reference[:n])
+    times = np.array(times) * 1e3
+    print(
+        "{:>5}: {:.3f} ms/block (p95 {:.3f} ms), VAD agreement {:.1%}".format(
+            name, times.mean(), np.percentile(times, 95), agreement
+        )
+    )
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-w", "--wav", type=str, help="16 kHz mono WAV file used as reference.")
+    parser.add_argument("-r", "--rate", type=int, default=44100, help="Simulated microphone sample rate.")
+    parser.add_argument("-s", "--seconds", type=float, default=60, help="Length of the synthetic signal.")
+    parser.add_argument("-v", "--vad_aggressiveness", type=int, default=1, help="VAD aggressiveness (0-3).")
+    args = parser.parse_args()
+
+    reference_audio = load_wav(args.wav) if args.wav else synthetic_speech(args.seconds)
+    vad = webrtcvad.Vad(args.vad_aggressiveness)
+    reference = vad_decisions(vad, reference_audio)
+
+    mic_audio = signal.resample_poly(reference_audio.astype(float), args.rate, RATE_PROCESS)
+    block_size = int(args.rate / float(BLOCKS_PER_SECOND))
+    blocks = [mic_audio[i : i + block_size] for i in range(0, len(mic_audio) - block_size + 1, block_size)]
+    print("{} blocks of {} samples at {} Hz".format(len(blocks), block_size, args.rate))
+
+    run_method("fft", lambda b: resample_block(b, args.rate, RATE_PROCESS), blocks, vad, reference)
+    resampler = StreamingResampler(args.rate, RATE_PROCESS)
+    run_method("poly", resampler.process, blocks, vad, reference)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+    Replay WAV files through the speech pipeline, faster than real time and without a microphone.
+
+    Each file is segmented into utterances by `ContinuousSpeech`, and every utterance is decoded by a recogniser and
+    matched with a book. Unless a DeepSpeech model is given, the recogniser is a stub returning the labelled
+    transcript of the audio after a simulated decoding time.
+
+    Labels are read from a file next to each WAV file, with the same name and a `.txt` extension, in the format of
+    Audacity label tracks: one `start<TAB>end<TAB>text` line per sentence, with times in seconds. As in the books,
+    the expected reaction is given as a `[emotion]` prefix of the text.
+
+    The script reports the audio frames (20 ms) processed per second, the VAD decisions per second, the percentiles of
+    the latency between the end of an utterance and its reaction, and the precision and recall of the reactions.
+"""
+
+import argparse
+import os
+import re
+import time
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from readingtorobot.common.book_library import DEFAULT_BOOK, BookLibrary
+from readingtorobot.common.continuous_speech import ContinuousSpeech
+from readingtorobot.common.recognizers import RecognitionMetrics, RecognizerBackend, create_backend
+
+
+class Label(NamedTuple):
+    """Labelled sentence of an audio file."""
+
+    start: float
+    end: float
+    text: str
+    emotion: Optional[str]
+
+
+def read_labels(path: str) -> List[Label]:
+    """Read an Audacity label track."""
+    labels = []
+    if not os.path.isfile(path):
+        return labels
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip() or line.startswith("\\"):
+                continue
+            start, end, text = line.rstrip("\n").split("\t", 2)
+            match = re.match(r"^(?:\[(.+?)\])?\s*(.*)$", text)
+            labels.append(Label(float(start), float(end), match.group(2).lower(), match.group(1)))
+    return labels
+
+
+class LabelledRecognizer(RecognizerBackend):
+    """Recogniser stub returning the labelled sentences overlapping the span of the audio."""
+
+    def __init__(self, labels: List[Label], real_time_factor: float, metrics: RecognitionMetrics) -> None:
+        """Initialize LabelledRecognizer.
+
+        :param labels: Labelled sentences of the audio file.
+        :param real_time_factor: Simulated decoding time per second of audio.
+        :param metrics: Object receiving the measurements.
+        """
+        super().__init__(metrics=metrics)
+        self._labels = labels
+        self._real_time_factor = real_time_factor
+        # Start and end (seconds) of the audio being recognised.
+        self.span = (0.0, 0.0)
+
+    def _feed(self, frames: np.ndarray) -> None:
+        time.sleep(self._real_time_factor * len(frames) / self.sample_rate)
+
+    def _finish(self) -> str:
+        start, end = self.span
+        return " ".join(label.text for label in self._labels if label.start < end and label.end > start)
+
+
+def replay(path: str, args: argparse.Namespace, metrics: RecognitionMetrics) -> dict:
+    """Replay a WAV file through the pipeline.
+
+    :return: Number of frames, VAD decisions and duration of the replay, latencies and reaction counts.
+    """
+    labels = read_labels(os.path.splitext(path)[0] + ".txt")
+    speech = ContinuousSpeech(
+        file=path,
+        replay_speed=args.speed,
+        capture_mode="utterance",
+        aggressiveness=args.vad_aggressiveness,
+        max_queued_utterances=args.queue,
+        vad_batch=args.vad_batch,
+        energy_threshold=args.energy_threshold,
+    )
+    seconds_per_frame = 1.0 / speech.BLOCKS_PER_SECOND
+    if args.model:
+        backend = create_backend("ds", {"model": args.model, "scorer": args.scorer}, metrics)
+    else:
+        backend = LabelledRecognizer(labels, args.rtf, metrics)
+    book = BookLibrary(active=args.book, track_position=args.track_position).active
+
+    # Time the VAD separately.
+    vad = {"calls": 0, "time": 0.0}
+    classify = speech._vad.classify
+
+    def timed_classify(frames):
+        start = time.perf_counter()
+        result = classify(frames)
+        vad["time"] += time.perf_counter() - start
+        vad["calls"] += len(frames)
+        return result
+
+    speech._vad.classify = timed_classify
+
+    latencies = []
+    reactions = []
+    start = time.perf_counter()
+    speech.start()
+    while True:
+        utterance = speech.get_utterance()
+        if utterance is None:
+            break
+        span = (utterance.start * seconds_per_frame, utterance.end * seconds_per_frame)
+        backend.span = span
+        text = backend.recognize(utterance.samples)
+        emotion = book.evaluate(text) if text else None
+        latencies.append(time.perf_counter() - utterance.captured_at)
+        if emotion is not None:
+            reactions.append((span, emotion))
+    elapsed = time.perf_counter() - start
+    speech.stop()
+
+    # A reaction is correct if it overlaps an unmatched label of the same emotion.
+    expected = [label for label in labels if label.emotion is not None]
+    matched = set()
+    correct = 0
+    for (first, last), emotion in reactions:
+        for i, label in enumerate(expected):
+            if i not in matched and label.emotion == emotion and label.start < last and label.end > first:
+                matched.add(i)
+                correct += 1
+                break
+
+    return {
+        "frames": speech._frames_read,
+        "vad_calls": vad["calls"],
+        "vad_time": vad["time"],
+        "elapsed": elapsed,
+        "latencies": latencies,
+        "reactions": len(reactions),
+        "correct": correct,
+        "expected": len(expected),
+    }
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="Mono 16 bit WAV files.")
+    parser.add_argument("-b", "--book", type=str, default=DEFAULT_BOOK, help="Book being read.")
+    parser.add_argument("-s", "--speed", type=float, default=0, help="Replay speed (0: as fast as possible).")
+    parser.add_argument("-r", "--rtf", type=float, default=0.1, help="Real-time factor of the recogniser stub.")
+    parser.add_argument("-q", "--queue", type=int, default=2, help="Maximum number of queued utterances.")
+    parser.add_argument("-v", "--vad_aggressiveness", type=int, default=3, help="Aggressiveness of the VAD.")
+    parser.add_argument("--vad_batch", type=int, default=1, help="Frames classified together by the VAD.")
+    parser.add_argument("--energy_threshold", type=float, default=30, help="RMS level of silent frames.")
+    parser.add_argument("-t", "--track_position", action="store_true", help="Track the reading position.")
+    parser.add_argument("-m", "--model", type=str, help="DeepSpeech model, replacing the recogniser stub.")
+    parser.add_argument("--scorer", type=str, help="DeepSpeech scorer.")
+    args = parser.parse_args()
+
+    metrics = RecognitionMetrics()
+    totals = {"frames": 0, "vad_calls": 0, "vad_time": 0.0, "elapsed": 0.0, "reactions": 0, "correct": 0}
+    totals["expected"] = 0
+    latencies = []
+    for path in args.files:
+        result = replay(path, args, metrics)
+        latencies += result.pop("latencies")
+        for key, value in result.items():
+            totals[key] += value
+        print(
+            "{}: {} frames, {} reactions ({} correct, {} expected)".format(
+                path, result["frames"], result["reactions"], result["correct"], result["expected"]
+            )
+        )
+
+    print("{:>24}: {:.0f}".format("frames/s", totals["frames"] / totals["elapsed"]))
+    print("{:>24}: {:.0f}".format("VAD decisions/s", totals["vad_calls"] / max(totals["vad_time"], 1e-9)))
+    print("{:>24}: {:.3f}".format("recogniser RTF", metrics.real_time_factor))
+    if latencies:
+        print(
+            "{:>24}: p50 {:.1f}, p90 {:.1f}, p99 {:.1f}".format(
+                "latency (ms)", *(np.percentile(latencies, [50, 90, 99]) * 1e3)
+            )
+        )
+    if totals["expected"]:
+        print(
+            "{:>24}: precision {:.1%}, recall {:.1%}".format(
+                "reactions",
+                totals["correct"] / max(totals["reactions"], 1),
+                totals["correct"] / totals["expected"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,63 @@
 """
     Attempt to stop the robot process cleanly, if it times out, it will forcefully kill the process.
+
+    The stop command is published with QoS 1, so the broker keeps it for the persistent session of the robot while the
+    robot is disconnected, and delivers it when the robot reconnects. The tool itself uses a clean session, which the
+    broker discards once it disconnects.
 """
 
 import argparse
 import sys
-import time
-
-import paho.mqtt.client as mqtt
-
-
-def s_callback(cli, obj, msg):
-    """Notify the confirmation of the robot stopping cleanly."""
-    print("Recieved message: {} {} {}".format(msg.topic, msg.qos, msg.payload))
-    sys.exit()
+import threading
+
+from readingtorobot.common import MQTTManager
+
+
+def stop_robot(robot, server_ip, server_port=1883, timeout=30.0):
+    """Send the stop command to a robot, and wait for the confirmation of the robot stopping cleanly.
+
+    :param robot: Name of the robot to stop.
+    :param server_ip: IP address of the MQTT server.
+    :param server_port: Port of the MQTT server.
+    :param timeout: Maximum time to wait for the connection and for the confirmation, in seconds.
+    :return: True if the robot stopped cleanly.
+    """
+    stopped = threading.Event()
+    client = MQTTManager(
+        "stop_{}".format(robot),
+        lambda: None,
+        timeout=timeout,
+        server_ip=server_ip,
+        speech_topic=None,
+        server_port=server_port,
+        clean_session=True,
+    )
+    client.add_callback("{}/stopped_clean".format(robot), lambda payload: stopped.set(), qos=1)
+    try:
+        if not client.start(wait=True):
+            return False
+        # QoS of the stop topics (see DEFAULT_QOS).
+        client.publish("{}/stop".format(robot), "stop").wait_for_publish()
+        print("Sent stop command to {}.".format(robot))
+        # Wait some time to see if the robot responds to the command.
+        return stopped.wait(timeout)
+    finally:
+        client.disconnect()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("robot", type=str, help="Name of the robot to stop.")
-    parser.add_argument("--robotIP", type=str, default="127.0.0.1", help="IP address of the robot")
+    parser.add_argument("--serverIP", type=str, default="10.204.38.100", help="IP address of the MQTT server")
+    parser.add_argument("--port", type=int, default=1883, help="Port of the MQTT server")
+    parser.add_argument("--timeout", type=float, default=30, help="Time to wait for the robot, in seconds")
 
     args = parser.parse_args()
-    robot = args.robot.lower()
-    robot_ip = args.robotIP
 
     # First attemp to stop the robot cleanly.
-    mqttc = mqtt.Client()
-    mqttc.message_callback_add("{}/stopped_clean".format(robot), s_callback)
-    mqttc.connect("10.204.38.100")
-    mqttc.subscribe("{}/stopped_clean".format(robot), 0)
-    mqttc.loop_start()
-
-    mqttc.publish("{}/stop".format(robot), "stop")
-
-    # Wait some time to see if the robot responds to the command.
-    time.sleep(30)
+    if stop_robot(args.robot.lower(), args.serverIP, args.port, args.timeout):
+        print("{} stopped cleanly.".format(args.robot))
+        sys.exit()
 
     # TODO: Otherwise, call the kill script
+    sys.exit(1)